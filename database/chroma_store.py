@@ -0,0 +1,188 @@
+# chroma_store.py
+# Process-wide Chroma client/collection handle shared by every fallback query.
+#
+# The sync service writes to the same persistent directory from another process. A long-lived
+# client does not see those HNSW segment changes, so the sync side bumps a version file after
+# each write and readers reopen the client when it changes.
+import json
+import os
+import threading
+import time
+
+from chromadb import PersistentClient
+from chromadb.api.shared_system_client import SharedSystemClient
+
+CHROMA_PATH = os.getenv("CHROMA_PATH", "vector_db")
+COLLECTION_NAME = os.getenv("CHROMA_COLLECTION", "employee_collection")
+RELOAD_CHECK_INTERVAL = float(os.getenv("CHROMA_RELOAD_CHECK_INTERVAL", "5"))
+# Seconds a replaced client stays open for queries that were already running on it
+RETIRE_GRACE = float(os.getenv("CHROMA_RETIRE_GRACE", "60"))
+
+VERSION_FILE = ".sync_version"
+
+# Blue/green rebuilds write versioned collections ("employee_collection__v<timestamp>") and
+# then swap this pointer; COLLECTION_NAME is the stable alias everybody resolves through.
+POINTER_SUFFIX = ".active.json"
+
+
+def _version_path(chroma_path: str) -> str:
+    return os.path.join(chroma_path, VERSION_FILE)
+
+
+def mark_collection_updated(chroma_path: str = CHROMA_PATH):
+    """Called by the sync service after it writes to the collection."""
+    os.makedirs(chroma_path, exist_ok=True)
+    path = _version_path(chroma_path)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp, path)
+
+
+def _pointer_path(chroma_path: str, alias: str) -> str:
+    return os.path.join(chroma_path, alias + POINTER_SUFFIX)
+
+
+def resolve_collection_name(chroma_path: str = CHROMA_PATH, alias: str = COLLECTION_NAME) -> str:
+    """Physical collection behind an alias; the alias itself until the first rebuild swap."""
+    try:
+        with open(_pointer_path(chroma_path, alias), "r") as f:
+            return json.load(f)["collection"]
+    except (FileNotFoundError, KeyError, json.JSONDecodeError):
+        return alias
+
+
+def read_alias_pointer(chroma_path: str = CHROMA_PATH, alias: str = COLLECTION_NAME) -> dict:
+    try:
+        with open(_pointer_path(chroma_path, alias), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"collection": alias, "history": []}
+
+
+def swap_alias(chroma_path: str, alias: str, collection_name: str) -> dict:
+    """Atomically point the alias at collection_name; readers pick it up on their next version check."""
+    pointer = read_alias_pointer(chroma_path, alias)
+    previous = pointer.get("collection", alias)
+    history = [previous] + [c for c in pointer.get("history", []) if c not in (previous, collection_name)]
+    new_pointer = {"collection": collection_name, "history": history, "swapped_at": time.time()}
+
+    path = _pointer_path(chroma_path, alias)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(new_pointer, f, indent=4)
+    os.replace(tmp, path)
+    mark_collection_updated(chroma_path)
+    return new_pointer
+
+
+def read_collection_version(chroma_path: str = CHROMA_PATH):
+    try:
+        with open(_version_path(chroma_path), "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _forget_shared_system(client):
+    """
+    Drop this client's System from Chroma's process-wide cache (keyed by path) without
+    stopping it, so the next PersistentClient starts a fresh one that sees the other
+    process's writes. clear_system_cache() would stop every System, under running queries.
+    """
+    cache = SharedSystemClient._identifier_to_system
+    for key, system in list(cache.items()):
+        if system is client._system:
+            del cache[key]
+
+
+class ChromaStore:
+    def __init__(self, chroma_path: str = CHROMA_PATH, collection_name: str = COLLECTION_NAME):
+        self.chroma_path = chroma_path
+        self.collection_name = collection_name
+        self._client = None
+        self._collection = None
+        self._version = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._retired = []   # (client, retired_at) still serving in-flight queries
+
+    def _stop_retired(self, now: float):
+        keep = []
+        for client, retired_at in self._retired:
+            if now - retired_at < RETIRE_GRACE:
+                keep.append((client, retired_at))
+                continue
+            try:
+                client._system.stop()
+            except Exception as e:
+                print("[CHROMA] Failed to stop a retired client:", e)
+        self._retired = keep
+
+    def _open(self):
+        # Called with the lock held. The new handle is built first and swapped in; threads
+        # still using the old one keep a working client until the grace period ends.
+        previous = self._client
+        if previous is not None:
+            _forget_shared_system(previous)
+        version = read_collection_version(self.chroma_path)
+        client = PersistentClient(path=self.chroma_path)
+        physical = resolve_collection_name(self.chroma_path, self.collection_name)
+        collection = client.get_collection(physical)
+        self._client, self._collection, self._version = client, collection, version
+
+        now = time.monotonic()
+        if previous is not None:
+            self._retired.append((previous, now))
+        self._stop_retired(now)
+        print(f"[CHROMA] Opened '{self.collection_name}' -> '{physical}' at {self.chroma_path} "
+              f"(version {self._version})")
+
+    def collection(self):
+        now = time.monotonic()
+        if self._collection is not None and now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return self._collection
+
+        with self._lock:
+            if self._collection is None:
+                self._open()
+            elif now - self._last_check >= RELOAD_CHECK_INTERVAL:
+                if read_collection_version(self.chroma_path) != self._version:
+                    self._open()
+            self._last_check = now
+            return self._collection
+
+    @property
+    def version(self):
+        """Version marker of the currently open collection (changes on every sync write)."""
+        return self._version
+
+    def reload(self):
+        with self._lock:
+            self._open()
+            self._last_check = time.monotonic()
+            return self._collection
+
+    def warm_up(self):
+        """Open the store and touch the HNSW segment so the first user query doesn't pay for it."""
+        collection = self.collection()
+        sample = collection.get(limit=1, include=["embeddings"])
+        embeddings = sample.get("embeddings")
+        if embeddings is not None and len(embeddings):
+            collection.query(query_embeddings=[list(embeddings[0])], n_results=1, include=[])
+        print(f"[CHROMA] Warm-up done, {collection.count()} vectors")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(chroma_path: str = CHROMA_PATH, collection_name: str = COLLECTION_NAME) -> ChromaStore:
+    key = (chroma_path, collection_name)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = _stores[key] = ChromaStore(chroma_path, collection_name)
+    return store
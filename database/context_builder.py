@@ -0,0 +1,135 @@
+# context_builder.py
+# Picks which retrieved documents go into the fallback summary prompt:
+#   - drops hits past an absolute cosine distance, or too far behind the best hit
+#     (BM25 matches from the hybrid fusion are exempt: they are there for their terms)
+#   - orders the rest by maximal marginal relevance, skipping near-duplicates
+#   - stops when the token budget is spent
+import os
+from typing import List, Optional
+
+import numpy as np
+
+from llm.result_compactor import SUMMARY_CHARS_PER_TOKEN, estimate_tokens
+
+# Cosine distance (0 = same direction). MiniLM puts unrelated employee profiles around 0.8+
+FALLBACK_MAX_DISTANCE = float(os.getenv("FALLBACK_MAX_DISTANCE", "0.75"))
+# Drop hits whose distance exceeds the best hit's by more than this
+FALLBACK_RELATIVE_GAP = float(os.getenv("FALLBACK_RELATIVE_GAP", "0.25"))
+# 1.0 = pure relevance order, lower values favour documents unlike those already picked
+FALLBACK_MMR_LAMBDA = float(os.getenv("FALLBACK_MMR_LAMBDA", "0.7"))
+# Cosine similarity at which two documents count as the same content
+FALLBACK_DUPLICATE_SIMILARITY = float(os.getenv("FALLBACK_DUPLICATE_SIMILARITY", "0.97"))
+FALLBACK_CONTEXT_TOKENS = int(os.getenv("FALLBACK_CONTEXT_TOKENS", "2000"))
+
+
+class ContextHit:
+    __slots__ = ("id", "document", "distance", "score", "embedding", "lexical")
+
+    def __init__(self, id: str, document: str, distance: Optional[float],
+                 score: Optional[float], embedding, lexical: bool = False):
+        self.id = id
+        self.document = (document or "").strip()
+        self.distance = distance
+        self.score = score          # fused score for hybrid results, else None
+        self.embedding = embedding
+        self.lexical = lexical      # matched by BM25 in the hybrid fusion
+
+    @property
+    def row_id(self) -> Optional[str]:
+        # Document ids are "<table>:<primary key>" (sync/pg_extract.py)
+        return self.id.split(":", 1)[1] if ":" in self.id else self.id
+
+
+def _unit(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def hits_from_results(results: dict) -> List[ContextHit]:
+    """ContextHits in result order from a Chroma-shaped result (embeddings included)."""
+    ids = results.get("ids", [[]])[0]
+    docs = results.get("documents", [[]])[0]
+    distances = results.get("distances", [[]])[0]
+    embeddings = results.get("embeddings")
+    embeddings = embeddings[0] if embeddings is not None else [None] * len(ids)
+    scores = results.get("scores", [[None] * len(ids)])[0]
+    lexical = results.get("lexical", [[False] * len(ids)])[0]
+    return [ContextHit(*fields) for fields in zip(ids, docs, distances, scores, embeddings, lexical)]
+
+
+def filter_by_distance(hits: List[ContextHit], max_distance: float = FALLBACK_MAX_DISTANCE,
+                       relative_gap: float = FALLBACK_RELATIVE_GAP) -> List[ContextHit]:
+    known = [h.distance for h in hits if h.distance is not None]
+    if not known:
+        return list(hits)
+    cutoff = min(max_distance, min(known) + relative_gap)
+    # A keyword match (an exact skill or name) can sit far from the query in embedding space;
+    # dropping it by distance would undo what the fusion surfaced
+    return [h for h in hits if h.distance is None or h.distance <= cutoff
+            or (h.lexical and h.score is not None)]
+
+
+def mmr_order(hits: List[ContextHit], lam: float = FALLBACK_MMR_LAMBDA,
+              duplicate_similarity: float = FALLBACK_DUPLICATE_SIMILARITY) -> List[ContextHit]:
+    """Greedy MMR over the hits; near-duplicates of an already picked hit are dropped."""
+    if len(hits) < 2 or any(h.embedding is None for h in hits):
+        return list(hits)
+
+    # Relevance: fused score when present (keeps the hybrid ranking), else 1 - distance
+    if all(h.score is not None for h in hits):
+        top = max(h.score for h in hits) or 1.0
+        relevance = np.array([h.score / top for h in hits])
+    else:
+        relevance = np.array([1.0 - (h.distance if h.distance is not None else 1.0) for h in hits])
+
+    vectors = _unit([h.embedding for h in hits])
+    similarity = vectors @ vectors.T
+
+    picked = [int(np.argmax(relevance))]
+    remaining = [i for i in range(len(hits)) if i != picked[0]]
+    while remaining:
+        redundancy = similarity[np.ix_(remaining, picked)].max(axis=1)
+        keep = redundancy < duplicate_similarity
+        remaining = [i for i, k in zip(remaining, keep) if k]
+        if not remaining:
+            break
+        redundancy = redundancy[keep]
+        gain = lam * relevance[remaining] - (1 - lam) * redundancy
+        best = remaining[int(np.argmax(gain))]
+        picked.append(best)
+        remaining.remove(best)
+    return [hits[i] for i in picked]
+
+
+def _entry(rank: int, hit: ContextHit, document: str) -> str:
+    value = hit.score if hit.score is not None else hit.distance
+    score_text = f"{value:.4f}" if value is not None else "n/a"
+    label = "score" if hit.score is not None else "distance"
+    return f"Rank {rank} — ID: {hit.row_id} — {label}: {score_text}\n{document}"
+
+
+def fit_to_budget(hits: List[ContextHit], budget: int = FALLBACK_CONTEXT_TOKENS) -> List[str]:
+    """Rendered entries in order until the budget is spent; the first is trimmed if it alone overflows."""
+    entries, used = [], 0
+    for hit in hits:
+        entry = _entry(len(entries) + 1, hit, hit.document)
+        tokens = estimate_tokens(entry)
+        if used + tokens > budget:
+            if not entries:
+                chars = int(budget * SUMMARY_CHARS_PER_TOKEN)
+                entries.append(_entry(1, hit, hit.document[:chars].rstrip() + "…"))
+            break
+        entries.append(entry)
+        used += tokens + 1
+    return entries
+
+
+def build_context(results: dict, budget: int = FALLBACK_CONTEXT_TOKENS) -> str:
+    hits = hits_from_results(results)
+    kept = filter_by_distance(hits)
+    ordered = mmr_order(kept)
+    entries = fit_to_budget(ordered, budget)
+    print(f"[CONTEXT] {len(hits)} hits -> {len(kept)} within distance -> "
+          f"{len(ordered)} after dedupe -> {len(entries)} in ~{budget} token budget")
+    return "\n\n".join(entries)
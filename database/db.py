@@ -1,34 +1,52 @@
-import psycopg2
-import os
-from dotenv import load_dotenv
+from database.pool import connection
+from database.executors import run_db
+from database.result_cache import result_cache
+from database.query_guard import QueryRejected, run_guarded
+from llm.sql_validator import check_sql
 
-load_dotenv()
 
-def get_db_connection():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
-        database=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD")
-    )
+def get_db_connection(**kwargs):
+    """Check out a pooled connection; use as a context manager."""
+    return connection(**kwargs)
 
 def run_sql_query(sql: str):
-    conn = get_db_connection()
-    cur = conn.cursor()
-
+    """
+    Runs LLM-written SQL through the query guard. Returns (rows, msg); rows is a
+    ResultRows list that records whether the result was truncated.
+    """
+    verdict = check_sql(sql)
+    # The guard only ever sees validated SELECTs
+    if not verdict.ok:
+        return None, verdict.message
     try:
-        cur.execute(sql)
-        rows = cur.fetchall()
-        colnames = [desc[0] for desc in cur.description]
-
-        result = [dict(zip(colnames, row)) for row in rows]
-
+        result = run_guarded(verdict.ast)
+    except QueryRejected as e:
+        return None, str(e)
     except Exception as e:
-        cur.close()
-        conn.close()
         return None, f"Database execution error: {str(e)}"
 
-    cur.close()
-    conn.close()
     return result, "OK"
+
+def run_sql_query_cached(sql: str, bypass_cache: bool = False):
+    # Memoized: free when the caller already validated this SQL
+    verdict = check_sql(sql)
+    if not verdict.ok:
+        return None, verdict.message
+    if bypass_cache:
+        result_cache.record_bypass()
+        return run_sql_query(verdict.sql)
+
+    # The normalized SQL is both the cache key and what runs, so the key always matches the query
+    key = verdict.sql
+    rows = result_cache.get(key)
+    if rows is not None:
+        return rows, "OK"
+
+    generation = result_cache.generation()
+    rows, msg = run_sql_query(key)
+    if rows is not None:
+        result_cache.put(key, rows, verdict.tables, generation=generation)
+    return rows, msg
+
+async def run_sql_query_async(sql: str, bypass_cache: bool = False):
+    return await run_db(run_sql_query_cached, sql, bypass_cache=bypass_cache)
@@ -0,0 +1,35 @@
+# executors.py
+# Bounded thread pools for blocking drivers (psycopg2, Chroma) called from async code.
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# DB workers match the connection pool so threads never queue on an empty pool
+DB_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DB_EXECUTOR_WORKERS", os.getenv("DB_POOL_MAX_SIZE", "10"))),
+    thread_name_prefix="db",
+)
+
+VECTOR_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("VECTOR_EXECUTOR_WORKERS", "4")),
+    thread_name_prefix="chroma",
+)
+
+
+async def run_in(executor, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_db(fn, *args, **kwargs):
+    return await run_in(DB_EXECUTOR, fn, *args, **kwargs)
+
+
+async def run_vector(fn, *args, **kwargs):
+    return await run_in(VECTOR_EXECUTOR, fn, *args, **kwargs)
+
+
+def shutdown_executors():
+    DB_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+    VECTOR_EXECUTOR.shutdown(wait=False, cancel_futures=True)
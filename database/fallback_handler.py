@@ -1,67 +1,173 @@
 # fallback_integration.py
-from chromadb import PersistentClient
+import os
 import re
+import threading
 from typing import Optional
 
-def vector_search(query_text: str, top_k: int = 20, chroma_path: str = "chroma_store", collection_name: str = "employee_collection"):
-    client = PersistentClient(path=chroma_path)
-    collection = client.get_collection(collection_name)
-    results = collection.query(query_texts=[query_text], n_results=top_k)
-    return results
-
-def rerank_by_distance(results: dict) -> dict:
-    distances = results.get("distances", [[]])[0]
-    ids = results.get("ids", [[]])[0]
-    docs = results.get("documents", [[]])[0]
-    metas = results.get("metadatas", [[]])[0]
-
-    combined = list(zip(distances, ids, docs, metas))
-    combined_sorted = sorted(combined, key=lambda x: x[0] if x[0] is not None else float("inf"))
-
-    reranked = {
-        "ids": [[c[1] for c in combined_sorted]],
-        "documents": [[c[2] for c in combined_sorted]],
-        "metadatas": [[c[3] for c in combined_sorted]],
-        "distances": [[c[0] for c in combined_sorted]],
+import numpy as np
+
+from database.chroma_store import CHROMA_PATH, COLLECTION_NAME, get_store
+from database.context_builder import build_context
+from database.executors import run_vector
+from database.hybrid_search import LexicalIndexCache, build_where, extract_filters, rrf_fuse
+from database.records import EmployeeRecords
+from database.schema import get_schema_catalog
+from llm.embeddings import EMBEDDING_MODEL_NAME, embed_query, get_query_encoder
+
+def _enabled(name, default="true"):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+FALLBACK_TOP_K = int(os.getenv("FALLBACK_TOP_K", "10"))
+# Dense + BM25 fused with reciprocal rank fusion; off = dense only
+HYBRID_SEARCH_ENABLED = _enabled("HYBRID_SEARCH_ENABLED")
+# Push skills/status/location/... named in the question down as Chroma `where` filters
+FALLBACK_PREFILTER_ENABLED = _enabled("FALLBACK_PREFILTER_ENABLED")
+# How deep each retriever goes before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+
+# One BM25 index per (chroma_path, collection_name), like the stores themselves
+_lexical = {}
+_lexical_lock = threading.Lock()
+
+
+def get_lexical_cache(chroma_path: str = CHROMA_PATH, collection_name: str = COLLECTION_NAME) -> LexicalIndexCache:
+    key = (chroma_path, collection_name)
+    cache = _lexical.get(key)
+    if cache is None:
+        with _lexical_lock:
+            cache = _lexical.get(key)
+            if cache is None:
+                cache = _lexical[key] = LexicalIndexCache()
+    return cache
+
+# Everything the context builder reads; metadata is only needed server-side for `where`
+QUERY_INCLUDE = ["documents", "distances", "embeddings"]
+
+def vector_search(query_text: str, top_k: int = 20, chroma_path: str = CHROMA_PATH,
+                  collection_name: str = COLLECTION_NAME, where: Optional[dict] = None,
+                  include: Optional[list] = None):
+    store = get_store(chroma_path, collection_name)
+    # Encoded here, not by Chroma's default embedding function, so the vector comes from the
+    # same model the sync service indexed with (and from the shared batcher/LRU)
+    kwargs = {"query_embeddings": [embed_query(query_text).tolist()], "n_results": top_k,
+              "include": include or QUERY_INCLUDE}
+    if where:
+        kwargs["where"] = where
+    try:
+        return store.collection().query(**kwargs)
+    except Exception as e:
+        # The handle may have been invalidated by a concurrent reload; retry once on a fresh one
+        print("[CHROMA] query failed, reopening:", e)
+        return store.reload().query(**kwargs)
+
+def _cosine_distance(query_vec, embedding) -> float:
+    embedding = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(embedding)) or 1.0
+    return 1.0 - float(np.dot(query_vec, embedding)) / norm
+
+def hybrid_search(query_text: str, top_k: int = FALLBACK_TOP_K, chroma_path: str = CHROMA_PATH,
+                  collection_name: str = COLLECTION_NAME) -> dict:
+    """
+    Dense search (restricted by any filters the question states) fused with BM25 over the
+    same candidate set. Same result shape as a Chroma query, plus fused "scores".
+    """
+    where = None
+    if FALLBACK_PREFILTER_ENABLED:
+        where = build_where(extract_filters(query_text, get_schema_catalog()))
+    depth = max(top_k, HYBRID_CANDIDATES) if HYBRID_SEARCH_ENABLED else top_k
+
+    dense = vector_search(query_text, top_k=depth, chroma_path=chroma_path,
+                          collection_name=collection_name, where=where)
+    if where and not dense["ids"][0]:
+        # Nothing matches, or the collection predates the flattened metadata fields
+        print(f"[HYBRID] No matches for filter {where}; searching without it")
+        where = None
+        dense = vector_search(query_text, top_k=depth, chroma_path=chroma_path,
+                              collection_name=collection_name)
+    if not HYBRID_SEARCH_ENABLED:
+        return dense
+
+    store = get_store(chroma_path, collection_name)
+    collection = store.collection()
+    index = get_lexical_cache(chroma_path, collection_name).get(collection, store.version)
+    # The prefilter is evaluated on the index's own copy of the metadata, no extra Chroma call
+    lexical = index.search(query_text, depth, where=where)
+
+    dense_ids = dense["ids"][0]
+    fused = rrf_fuse([dense_ids, [doc_id for doc_id, _ in lexical]], k=HYBRID_RRF_K, top_k=top_k)
+
+    found = {
+        doc_id: (doc, dist, emb)
+        for doc_id, doc, dist, emb in zip(dense_ids, dense["documents"][0],
+                                          dense["distances"][0], dense["embeddings"][0])
+    }
+    missing = [doc_id for doc_id, _ in fused if doc_id not in found]
+    if missing:
+        # Lexical-only hits: distance computed from the stored vector so every hit reports one
+        query_vec = embed_query(query_text)
+        extra = collection.get(ids=missing, include=["documents", "embeddings"])
+        for doc_id, doc, emb in zip(extra["ids"], extra["documents"], extra["embeddings"]):
+            found[doc_id] = (doc, _cosine_distance(query_vec, emb), emb)
+
+    fused = [(doc_id, score) for doc_id, score in fused if doc_id in found]
+    lexical_ids = {doc_id for doc_id, _ in lexical}
+    return {
+        "ids": [[doc_id for doc_id, _ in fused]],
+        "documents": [[found[doc_id][0] for doc_id, _ in fused]],
+        "distances": [[found[doc_id][1] for doc_id, _ in fused]],
+        "embeddings": [[found[doc_id][2] for doc_id, _ in fused]],
+        "scores": [[score for _, score in fused]],
+        "lexical": [[doc_id in lexical_ids for doc_id, _ in fused]],
+        "where": where,
     }
-    return reranked
 
 def summarize_results(results: dict) -> str:
-    docs = results.get("documents", [[]])[0]
-    metas = results.get("metadatas", [[]])[0]
-    distances = results.get("distances", [[]])[0]
-
-    parts = []
-    for i, doc in enumerate(docs):
-        meta = metas[i] if i < len(metas) else {}
-        dist = distances[i] if i < len(distances) else None
-        row_id = meta.get("row_id") if isinstance(meta, dict) else None
-        # Keep the doc (which is your denormalized employee content) short
-        parts.append(
-            f"Rank {i+1} — ID: {row_id} — score: {dist:.4f}\n{doc.strip()}"
-        )
-    return "\n\n".join(parts)
-
-def semantic_fallback(user_nl_query, top_k: int = 20, chroma_path: str = r"C:\Users\H A R I H A R A N\Desktop\My works\Nectar\Project\vector_db"):
+    # Distance cut-off, MMR dedupe and token budget (database/context_builder.py)
+    return build_context(results)
+
+def semantic_fallback(user_nl_query, top_k: int = FALLBACK_TOP_K, chroma_path: str = CHROMA_PATH):
 
     # 1) choose query
     query_used = user_nl_query.strip()
 
-    # 2) perform vector search
-    raw = vector_search(query_used, top_k=top_k, chroma_path=chroma_path)
-
-    # 3) rerank results
-    reranked = rerank_by_distance(raw)
+    # 2) perform hybrid (prefiltered dense + BM25) search
+    raw = hybrid_search(query_used, top_k=top_k, chroma_path=chroma_path)
 
-    # 4) summarize
-    summary_text = summarize_results(reranked)
+    # 3) prune and summarize (Chroma and the fusion both return results best first)
+    summary_text = summarize_results(raw)
 
     return {
         "query_used": query_used,
         "summary": summary_text,
-        "raw_results": reranked
+        "raw_results": raw,
+        # Full rows, read from Postgres in one batch only if a caller looks them up
+        "records": EmployeeRecords(doc_id.split(":", 1)[-1] for doc_id in raw["ids"][0]),
     }
 
+async def semantic_fallback_async(user_nl_query, top_k: int = FALLBACK_TOP_K, chroma_path: str = CHROMA_PATH):
+    # Chroma is blocking (SQLite + HNSW), keep it on the bounded vector executor
+    return await run_vector(semantic_fallback, user_nl_query, top_k=top_k, chroma_path=chroma_path)
+
+def warm_up_fallback(chroma_path: str = CHROMA_PATH):
+    try:
+        store = get_store(chroma_path)
+        store.warm_up()
+        indexed_with = (store.collection().metadata or {}).get("embedding_model")
+        if indexed_with and indexed_with != EMBEDDING_MODEL_NAME:
+            print(f"[CHROMA] WARNING: collection was indexed with '{indexed_with}', "
+                  f"queries are encoded with '{EMBEDDING_MODEL_NAME}'")
+        if HYBRID_SEARCH_ENABLED:
+            get_lexical_cache(chroma_path).get(store.collection(), store.version)
+    except Exception as e:
+        # The sync service may not have built the collection yet
+        print("[CHROMA] Warm-up skipped:", e)
+    try:
+        # Load the query model and run one encode before the first user request
+        get_query_encoder().warm_up()
+    except Exception as e:
+        print("[EMBEDDING] Query encoder warm-up failed:", e)
+
 if __name__ == "__main__":
     res = semantic_fallback(user_nl_query="list out the employees with javascript skills")
     print(res['query_used'])
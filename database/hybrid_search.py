@@ -0,0 +1,258 @@
+# hybrid_search.py
+# Pieces of the hybrid fallback retrieval:
+#   - structured filters pulled from the question (categorical vocab + "N years"), pushed down
+#     to Chroma as `where` clauses on flattened metadata fields
+#   - an in-memory BM25 index over document content
+#   - reciprocal rank fusion of the dense and lexical rankings
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# Flattened, filterable metadata written by the ingest (sync/pg_extract.py).
+# label in database.schema.CATEGORICAL_COLUMNS -> metadata field
+FILTER_FIELDS = {
+    "statuses": "status",
+    "employment types": "employment_type",
+    "locations": "location",
+    "role names": "role",
+    "department names": "department",
+}
+SKILL_PREFIX = "skill_"
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it of on or the to with who which what
+show list find give me all any employees employee people person persons staff their them
+""".split())
+
+YEARS_PATTERN = re.compile(
+    r"\b(more than|over|above|at least|minimum of|min|greater than|>=|>)\s*(\d+)\s*\+?\s*(?:years?|yrs?)\b"
+)
+
+
+def skill_field(skill_name: str) -> str:
+    return SKILL_PREFIX + re.sub(r"[^a-z0-9]+", "_", skill_name.lower()).strip("_")
+
+
+def flatten_metadata(emp: dict, skills: list) -> dict:
+    """Scalar, lower-cased fields Chroma can filter on; one boolean flag per skill."""
+    fields = {
+        "status": emp.get("status"),
+        "employment_type": emp.get("employment_type"),
+        "location": emp.get("location"),
+        "role": emp.get("role_name"),
+        "department": emp.get("department_name"),
+    }
+    flat = {k: str(v).strip().lower() for k, v in fields.items() if v not in (None, "")}
+    if emp.get("years_experience") is not None:
+        flat["years_experience"] = float(emp["years_experience"])
+    for skill in skills or []:
+        if skill.get("skill_name"):
+            flat[skill_field(skill["skill_name"])] = True
+    return flat
+
+
+def clear_stale_fields(metadata: dict, stored: Optional[dict]) -> dict:
+    """
+    Chroma merges metadata on upsert/update, so a skill flag or field the row no longer has
+    would survive from the stored record. Write an explicit cleared value for each of them
+    (False / "" / -1), which no `where` prefilter matches.
+    """
+    if not stored:
+        return metadata
+    cleared = dict(metadata)
+    for key, old in stored.items():
+        if key in cleared or old is None:
+            continue
+        if isinstance(old, bool):
+            cleared[key] = False
+        elif isinstance(old, (int, float)):
+            cleared[key] = -1
+        else:
+            cleared[key] = ""
+    return cleared
+
+
+def extract_filters(question: str, catalog) -> Dict[str, object]:
+    """
+    {metadata field: value or [values]} for constraints the question states explicitly.
+    Values come from the same introspected vocab the SQL prompt uses, matched longest first
+    across all groups (catalog.vocabulary), so "data engineers" is a role, not department "data".
+    """
+    filters = {}
+    for value, labels in catalog.vocabulary.mentions(question):
+        if len(labels) > 1:
+            # Both e.g. a skill and a department: a hard filter on either could be wrong
+            continue
+        label = labels[0]
+        if label == "skills":
+            filters[skill_field(value)] = True
+        elif label in FILTER_FIELDS:
+            filters.setdefault(FILTER_FIELDS[label], []).append(value)
+    years = parse_min_years(question)
+    if years:
+        op, value = years
+        filters["years_experience"] = {op: value}
+    return filters
+
+
+def parse_min_years(question: str) -> Optional[Tuple[str, float]]:
+    """("$gt" | "$gte", N) for "more than N years", "at least N yrs", ..., or None."""
+    match = YEARS_PATTERN.search(question.lower())
+    if not match:
+        return None
+    op = "$gte" if match.group(1) in ("at least", "minimum of", "min", ">=") else "$gt"
+    return op, float(match.group(2))
+
+
+def build_where(filters: Dict[str, object]) -> Optional[dict]:
+    clauses = []
+    for field, value in filters.items():
+        if isinstance(value, dict):
+            clauses.append({field: value})
+        elif isinstance(value, list):
+            clauses.append({field: value[0]} if len(value) == 1 else {field: {"$in": value}})
+        else:
+            clauses.append({field: value})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def tokenize(text: str) -> List[str]:
+    # Keeps "node.js", "ci/cd" and "full-time" as single tokens
+    tokens = re.findall(r"[a-z0-9]+(?:[.+#/-][a-z0-9]+)*", text.lower())
+    return [t for t in tokens if t not in STOPWORDS]
+
+
+def matches_where(metadata: Optional[dict], where: Optional[dict]) -> bool:
+    """Evaluates the `where` clauses build_where produces against one record's metadata."""
+    if not where:
+        return True
+    metadata = metadata or {}
+    if "$and" in where:
+        return all(matches_where(metadata, clause) for clause in where["$and"])
+    for field, condition in where.items():
+        value = metadata.get(field)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == "$in" and value not in operand:
+                    return False
+                if op in ("$gt", "$gte") and not isinstance(value, (int, float)):
+                    return False
+                if op == "$gt" and not value > operand:
+                    return False
+                if op == "$gte" and not value >= operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class BM25Index:
+    def __init__(self, ids: List[str], documents: List[str], metadatas: Optional[List[dict]] = None,
+                 k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = list(ids)
+        self.documents = list(documents)
+        # Kept so prefilters are evaluated here instead of asking Chroma for the matching ids
+        self.metadatas = list(metadatas) if metadatas is not None else [None] * len(self.ids)
+        self._pos = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._postings = defaultdict(list)   # term -> [(doc index, term frequency)]
+        self._lengths = []
+        for i, doc in enumerate(self.documents):
+            counts = Counter(tokenize(doc or ""))
+            self._lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings[term].append((i, tf))
+        n = len(self.ids)
+        self._avg_length = (sum(self._lengths) / n) if n else 0.0
+        self._idf = {
+            term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in self._postings.items()
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def document(self, doc_id: str) -> Optional[str]:
+        i = self._pos.get(doc_id)
+        return self.documents[i] if i is not None else None
+
+    def search(self, query: str, top_k: int, where: Optional[dict] = None):
+        """[(id, score)] best first; where restricts scoring to records matching the prefilter."""
+        scores = defaultdict(float)
+        allowed = {}
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self._postings[term]:
+                if where:
+                    if i not in allowed:
+                        allowed[i] = matches_where(self.metadatas[i], where)
+                    if not allowed[i]:
+                        continue
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / (self._avg_length or 1))
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda x: -x[1])[:top_k]
+        return [(self.ids[i], score) for i, score in best]
+
+
+def rrf_fuse(rankings: List[List[str]], k: int = 60, top_k: Optional[int] = None) -> List[tuple]:
+    """Reciprocal rank fusion: [(id, fused score)] best first."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    fused = sorted(scores.items(), key=lambda x: -x[1])
+    return fused[:top_k] if top_k else fused
+
+
+class LexicalIndexCache:
+    """
+    One BM25 index per collection version. After the sync writes, the next search keeps
+    using the previous index while a background thread rebuilds it; only the very
+    first build blocks.
+    """
+
+    def __init__(self):
+        self._index: Optional[BM25Index] = None
+        self._version = None
+        self._building = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _build(collection) -> BM25Index:
+        data = collection.get(include=["documents", "metadatas"])
+        index = BM25Index(data["ids"], data["documents"], data["metadatas"])
+        print(f"[HYBRID] BM25 index built over {len(index)} documents")
+        return index
+
+    def _rebuild(self, collection, version):
+        try:
+            index = self._build(collection)
+            with self._lock:
+                self._index, self._version = index, version
+        except Exception as e:
+            print("[HYBRID] BM25 rebuild failed:", e)
+        finally:
+            with self._lock:
+                self._building = False
+
+    def get(self, collection, version) -> BM25Index:
+        with self._lock:
+            if self._index is not None and (self._version == version or self._building):
+                return self._index
+            if self._index is not None:
+                self._building = True
+                threading.Thread(target=self._rebuild, args=(collection, version),
+                                 name="bm25-rebuild", daemon=True).start()
+                return self._index
+        index = self._build(collection)
+        with self._lock:
+            if self._index is None:
+                self._index, self._version = index, version
+            return self._index
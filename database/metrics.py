@@ -0,0 +1,17 @@
+# metrics.py
+# Tiny Prometheus text-format renderer for the /metrics endpoints.
+from typing import Dict
+
+
+def render_metrics(namespace: str, values: Dict[str, float]) -> str:
+    lines = []
+    for name, value in sorted(values.items()):
+        if isinstance(value, bool):
+            value = int(value)
+        if not isinstance(value, (int, float)):
+            continue
+        metric = f"{namespace}_{name}"
+        kind = "counter" if name.endswith("_total") else "gauge"
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n" if lines else ""
@@ -0,0 +1,293 @@
+# pool.py
+# Shared, long-lived PostgreSQL connection pool used by the main server and the sync service.
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the acquire timeout."""
+
+
+def connect_kwargs():
+    return {
+        "host": os.getenv("DB_HOST"),
+        "port": os.getenv("DB_PORT"),
+        "database": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+    }
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used", "last_checked", "statement_timeout_ms")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+        self.last_checked = now
+        self.statement_timeout_ms = None
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        min_size: int = 1,
+        max_size: int = 10,
+        idle_timeout: float = 300.0,
+        acquire_timeout: float = 10.0,
+        health_check_interval: float = 30.0,
+        statement_timeout_ms: int = 15000,
+        readonly: bool = True,
+    ):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.statement_timeout_ms = statement_timeout_ms
+        self.readonly = readonly
+
+        self._idle = []          # LIFO stack of _PooledConnection
+        self._open = 0           # idle + checked out
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._stats = {
+            "checkouts_total": 0,
+            "checkout_wait_seconds_total": 0.0,
+            "checkout_wait_seconds_max": 0.0,
+            "checkout_timeouts_total": 0,
+            "connections_created_total": 0,
+            "connections_closed_total": 0,
+            "health_check_failures_total": 0,
+        }
+
+        for _ in range(min_size):
+            self._idle.append(self._create())
+
+    # ---------------- internals ----------------
+
+    def _create(self) -> _PooledConnection:
+        conn = psycopg2.connect(**connect_kwargs())
+        with self._cond:
+            self._open += 1
+            self._stats["connections_created_total"] += 1
+        return _PooledConnection(conn)
+
+    def _discard(self, pc: _PooledConnection):
+        try:
+            pc.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._open -= 1
+            self._stats["connections_closed_total"] += 1
+            self._cond.notify()
+
+    def _is_healthy(self, pc: _PooledConnection) -> bool:
+        if pc.conn.closed:
+            return False
+        if time.monotonic() - pc.last_checked < self.health_check_interval:
+            return True
+        try:
+            with pc.conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            pc.conn.rollback()
+            pc.last_checked = time.monotonic()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats["health_check_failures_total"] += 1
+            return False
+
+    def _take_idle(self) -> Optional[_PooledConnection]:
+        # Caller holds self._cond. Expired connections are handed back for closing.
+        while self._idle:
+            pc = self._idle.pop()
+            if time.monotonic() - pc.last_used > self.idle_timeout and self._open > self.min_size:
+                self._open -= 1
+                self._stats["connections_closed_total"] += 1
+                try:
+                    pc.conn.close()
+                except Exception:
+                    pass
+                continue
+            return pc
+        return None
+
+    def _acquire(self) -> _PooledConnection:
+        start = time.monotonic()
+        deadline = start + self.acquire_timeout
+
+        while True:
+            create = False
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                pc = self._take_idle()
+                if pc is None:
+                    if self._open < self.max_size:
+                        # Reserve the slot before connecting outside the lock
+                        self._open += 1
+                        create = True
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats["checkout_timeouts_total"] += 1
+                            raise PoolTimeout(
+                                f"Timed out after {self.acquire_timeout}s waiting for a database connection"
+                            )
+                        self._cond.wait(remaining)
+                        continue
+
+            if create:
+                try:
+                    pc = _PooledConnection(psycopg2.connect(**connect_kwargs()))
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats["connections_created_total"] += 1
+            elif not self._is_healthy(pc):
+                self._discard(pc)
+                continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._in_use += 1
+                self._stats["checkouts_total"] += 1
+                self._stats["checkout_wait_seconds_total"] += waited
+                self._stats["checkout_wait_seconds_max"] = max(self._stats["checkout_wait_seconds_max"], waited)
+            return pc
+
+    def _release(self, pc: _PooledConnection, broken: bool = False):
+        with self._cond:
+            self._in_use -= 1
+
+        if not broken and not pc.conn.closed:
+            try:
+                pc.conn.rollback()
+            except Exception:
+                broken = True
+
+        if broken or pc.conn.closed or self._closed:
+            self._discard(pc)
+            return
+
+        pc.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(pc)
+            self._cond.notify()
+
+    def _prepare(self, pc: _PooledConnection, readonly: bool, autocommit: bool, statement_timeout_ms: int):
+        conn = pc.conn
+        # set_session is client side; it only takes effect on the next BEGIN
+        conn.set_session(readonly=readonly, autocommit=autocommit)
+        if pc.statement_timeout_ms != statement_timeout_ms:
+            with conn.cursor() as cur:
+                cur.execute("SET statement_timeout = %s", (int(statement_timeout_ms),))
+            if not autocommit:
+                conn.commit()
+            pc.statement_timeout_ms = statement_timeout_ms
+
+    # ---------------- public API ----------------
+
+    @contextmanager
+    def connection(
+        self,
+        readonly: Optional[bool] = None,
+        autocommit: bool = False,
+        statement_timeout_ms: Optional[int] = None,
+    ):
+        """
+        Check a connection out of the pool for the duration of the with-block.
+        Sessions are read-only unless readonly=False is passed explicitly.
+        """
+        if readonly is None:
+            readonly = self.readonly
+        if statement_timeout_ms is None:
+            statement_timeout_ms = self.statement_timeout_ms
+
+        pc = self._acquire()
+        broken = False
+        try:
+            self._prepare(pc, readonly, autocommit, statement_timeout_ms)
+            yield pc.conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self._release(pc, broken=broken)
+
+    def metrics(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "connections_open": self._open,
+                "connections_in_use": self._in_use,
+                "connections_idle": len(self._idle),
+                "max_size": self.max_size,
+                "saturation": self._in_use / self.max_size if self.max_size else 0.0,
+            })
+        return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for pc in idle:
+            self._discard(pc)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Process-wide pool, created lazily from DB_POOL_* environment settings."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+                    max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+                    idle_timeout=float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300")),
+                    acquire_timeout=float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "10")),
+                    health_check_interval=float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30")),
+                    statement_timeout_ms=int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000")),
+                    readonly=os.getenv("DB_POOL_READONLY", "true").lower() in ("1", "true", "yes"),
+                )
+    return _pool
+
+
+def connection(**kwargs):
+    return get_pool().connection(**kwargs)
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def pool_metrics() -> dict:
+    if _pool is None:
+        return {}
+    return _pool.metrics()
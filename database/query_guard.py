@@ -0,0 +1,199 @@
+# query_guard.py
+# Guard stage between the validator and Postgres for LLM-written SQL:
+#   1. inject/clamp a LIMIT
+#   2. EXPLAIN, and reject (or tighten the LIMIT) when the plan is too expensive
+#   3. run under a per-query statement_timeout
+#   4. fetch in bounded batches from a server-side cursor, stopping at a byte cap
+import json
+import os
+from typing import Optional
+
+from sqlglot import expressions as exp
+
+from database.pool import connection
+from database.result_cache import estimate_size
+
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "500"))
+QUERY_MAX_BYTES = int(os.getenv("QUERY_MAX_BYTES", str(8 * 1024 * 1024)))
+QUERY_FETCH_BATCH = int(os.getenv("QUERY_FETCH_BATCH", "100"))
+QUERY_STATEMENT_TIMEOUT_MS = int(os.getenv("QUERY_STATEMENT_TIMEOUT_MS", "5000"))
+
+QUERY_EXPLAIN_ENABLED = os.getenv("QUERY_EXPLAIN_ENABLED", "true").lower() in ("1", "true", "yes")
+QUERY_MAX_COST = float(os.getenv("QUERY_MAX_COST", "1000000"))
+# Largest row estimate allowed on any plan node (catches cartesian joins under a LIMIT)
+QUERY_MAX_PLAN_ROWS = float(os.getenv("QUERY_MAX_PLAN_ROWS", "5000000"))
+# LIMIT tried once when the plan is over QUERY_MAX_COST, before rejecting
+QUERY_REWRITE_LIMIT = int(os.getenv("QUERY_REWRITE_LIMIT", "50"))
+
+
+_stats = {
+    "queries_total": 0,
+    "rejected_total": 0,
+    "limit_tightened_total": 0,
+    "truncated_rows_total": 0,
+    "truncated_bytes_total": 0,
+}
+
+
+class QueryRejected(Exception):
+    """The plan is over the configured cost or row estimate."""
+
+
+class ResultRows(list):
+    """List of row dicts, plus what the guard did to produce it."""
+
+    def __init__(self, rows=(), truncated: bool = False, reason: Optional[str] = None,
+                 limit: Optional[int] = None, cost: Optional[float] = None):
+        super().__init__(rows)
+        self.truncated = truncated
+        self.reason = reason
+        self.limit = limit
+        self.cost = cost
+
+    def notice(self) -> Optional[str]:
+        if not self.truncated:
+            return None
+        if self.reason == "max_bytes":
+            return f"Showing the first {len(self)} rows; the result was cut off at {QUERY_MAX_BYTES} bytes."
+        return f"Showing the first {len(self)} rows; more rows matched (limit {self.limit})."
+
+
+def _literal_int(node) -> Optional[int]:
+    """Row cap of a LIMIT n or FETCH FIRST n ROWS ONLY clause; None if it isn't a plain count."""
+    if isinstance(node, exp.Fetch):
+        options = node.args.get("limit_options") or node
+        if options.args.get("percent") or options.args.get("with_ties"):
+            return None
+        expression = node.args.get("count")
+        if expression is None:
+            return 1    # FETCH FIRST ROW ONLY
+    else:
+        expression = node.expression if node is not None else None
+    if isinstance(expression, exp.Literal) and expression.is_int:
+        return int(expression.this)
+    return None
+
+
+def apply_limit(ast: exp.Expression, max_rows: int = QUERY_MAX_ROWS):
+    """
+    Returns (sql, limit). A LIMIT the query already has is kept when it is within max_rows.
+    Otherwise the query is asked for max_rows + 1 rows, so the fetch can tell a result that
+    fits from one that was cut off.
+    """
+    current = _literal_int(ast.args.get("limit"))
+    if current is not None and current <= max_rows:
+        return ast.sql(dialect="postgres"), current
+    guarded = ast.limit(max_rows + 1)
+    return guarded.sql(dialect="postgres"), max_rows
+
+
+def _plan_stats(plan: dict):
+    """(root total cost, max row estimate over all nodes)"""
+    max_rows = 0.0
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        max_rows = max(max_rows, float(node.get("Plan Rows", 0)))
+        stack.extend(node.get("Plans", []))
+    return float(plan.get("Total Cost", 0)), max_rows
+
+
+def explain(cur, sql: str):
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql)
+    raw = cur.fetchone()[0]
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+    return _plan_stats(plan)
+
+
+def _check_plan(cur, ast: exp.Expression, sql: str, limit: int):
+    """Returns the (possibly rewritten) (sql, limit, cost) or raises QueryRejected."""
+    cost, plan_rows = explain(cur, sql)
+    if plan_rows > QUERY_MAX_PLAN_ROWS:
+        _stats["rejected_total"] += 1
+        raise QueryRejected(f"Query rejected: the plan estimates {plan_rows:,.0f} rows "
+                            f"(max {QUERY_MAX_PLAN_ROWS:,.0f}). Try a more specific question.")
+    if cost <= QUERY_MAX_COST:
+        return sql, limit, cost
+
+    if limit > QUERY_REWRITE_LIMIT:
+        # A smaller LIMIT lets Postgres stop early (nested loops, index scans) on many plans
+        sql, limit = apply_limit(ast, QUERY_REWRITE_LIMIT)
+        cost, _ = explain(cur, sql)
+        if cost <= QUERY_MAX_COST:
+            _stats["limit_tightened_total"] += 1
+            print(f"[QUERY GUARD] Tightened LIMIT to {limit} (cost {cost:,.0f})")
+            return sql, limit, cost
+
+    _stats["rejected_total"] += 1
+    raise QueryRejected(f"Query rejected: estimated cost {cost:,.0f} is over {QUERY_MAX_COST:,.0f}. "
+                        f"Try a more specific question.")
+
+
+def run_guarded(ast: exp.Expression, max_rows: int = QUERY_MAX_ROWS,
+                max_bytes: int = QUERY_MAX_BYTES) -> ResultRows:
+    """Execute a validated SELECT under the guard. Raises QueryRejected or a database error."""
+    _stats["queries_total"] += 1
+    sql, limit = apply_limit(ast, max_rows)
+
+    with connection(statement_timeout_ms=QUERY_STATEMENT_TIMEOUT_MS) as conn:
+        cost = None
+        if QUERY_EXPLAIN_ENABLED:
+            with conn.cursor() as cur:
+                sql, limit, cost = _check_plan(cur, ast, sql, limit)
+
+        rows = []
+        size = 0
+        truncated, reason = False, None
+        # Server-side cursor: the client never holds more than one batch it didn't ask for
+        with conn.cursor(name="guarded_query") as cur:
+            cur.execute(sql)
+            colnames = None
+            while not truncated:
+                batch = cur.fetchmany(QUERY_FETCH_BATCH)
+                if not batch:
+                    break
+                if colnames is None:
+                    colnames = [desc[0] for desc in cur.description]
+                for values in batch:
+                    if len(rows) >= limit:
+                        truncated, reason = True, "max_rows"
+                        break
+                    row = dict(zip(colnames, values))
+                    size += estimate_size([row])
+                    if size > max_bytes:
+                        truncated, reason = True, "max_bytes"
+                        break
+                    rows.append(row)
+
+    result = ResultRows(rows, truncated, reason, limit, cost)
+    if truncated:
+        _stats["truncated_rows_total" if reason == "max_rows" else "truncated_bytes_total"] += 1
+        print(f"[QUERY GUARD] Truncated at {len(result)} rows ({reason})")
+    return result
+
+
+def run_parameterized(sql: str, params: dict, max_rows: int = QUERY_MAX_ROWS) -> ResultRows:
+    """
+    Execute a vetted SQL template with bind parameters (never string formatting). The template
+    takes its row cap as %(limit)s; it is asked for max_rows + 1 to detect truncation.
+    The executed statement, as psycopg2 bound it, is kept on the result as .sql.
+    """
+    _stats["queries_total"] += 1
+    params = {**params, "limit": max_rows + 1}
+    with connection(statement_timeout_ms=QUERY_STATEMENT_TIMEOUT_MS) as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            colnames = [desc[0] for desc in cur.description]
+            rows = [dict(zip(colnames, values)) for values in cur.fetchall()]
+            executed = cur.query.decode() if isinstance(cur.query, bytes) else cur.query
+
+    truncated = len(rows) > max_rows
+    result = ResultRows(rows[:max_rows], truncated, "max_rows" if truncated else None, max_rows)
+    result.sql = executed
+    if truncated:
+        _stats["truncated_rows_total"] += 1
+    return result
+
+
+def guard_metrics() -> dict:
+    return dict(_stats)
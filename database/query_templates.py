@@ -0,0 +1,94 @@
+# query_templates.py
+# Vetted SQL for the query shapes the intent router (llm/intent_router.py) answers without
+# the LLM. Every value from the question is a bind parameter; the only identifiers spliced
+# in are the fixed group-by expressions below. Each template takes its row cap as %(limit)s
+# (database.query_guard.run_parameterized).
+
+# One WHERE fragment shared by every template. A NULL slot disables its condition.
+EMPLOYEE_FILTERS = """
+    (%(roles)s::text[] IS NULL OR LOWER(r.name) = ANY(%(roles)s::text[]))
+    AND (%(departments)s::text[] IS NULL OR LOWER(d.name) = ANY(%(departments)s::text[]))
+    AND (%(statuses)s::text[] IS NULL OR LOWER(e.status) = ANY(%(statuses)s::text[]))
+    AND (%(employment_types)s::text[] IS NULL
+         OR LOWER(e.employment_type) = ANY(%(employment_types)s::text[]))
+    AND (%(locations)s::text[] IS NULL OR LOWER(e.location) = ANY(%(locations)s::text[]))
+    AND (%(min_years)s::numeric IS NULL
+         OR e.years_experience > %(min_years)s::numeric
+         OR (%(years_inclusive)s AND e.years_experience = %(min_years)s::numeric))
+    AND (%(skills)s::text[] IS NULL OR e.employee_id IN (
+        SELECT es.employee_id
+        FROM employee_skills es
+        JOIN skills s ON s.skill_id = es.skill_id
+        WHERE LOWER(s.name) = ANY(%(skills)s::text[])
+        GROUP BY es.employee_id
+        HAVING COUNT(DISTINCT LOWER(s.name)) >= %(skills_required)s
+    ))
+"""
+
+EMPLOYEE_JOINS = """
+    FROM employees e
+    LEFT JOIN roles r ON r.role_id = e.role_id
+    LEFT JOIN departments d ON d.department_id = e.department_id
+"""
+
+LIST_EMPLOYEES_SQL = f"""
+    SELECT e.employee_id,
+           e.first_name || ' ' || e.last_name AS name,
+           r.name AS role,
+           d.name AS department,
+           e.years_experience,
+           e.location,
+           e.status
+    {EMPLOYEE_JOINS}
+    WHERE {EMPLOYEE_FILTERS}
+    ORDER BY e.years_experience DESC NULLS LAST, e.employee_id
+    LIMIT %(limit)s
+"""
+
+COUNT_EMPLOYEES_SQL = f"""
+    SELECT COUNT(*) AS employee_count
+    {EMPLOYEE_JOINS}
+    WHERE {EMPLOYEE_FILTERS}
+    LIMIT %(limit)s
+"""
+
+# dimension -> (SQL expression, extra join)
+GROUP_DIMENSIONS = {
+    "department": ("d.name", ""),
+    "role": ("r.name", ""),
+    "location": ("e.location", ""),
+    "status": ("e.status", ""),
+    "employment type": ("e.employment_type", ""),
+    "skill": ("gs.name", """
+    JOIN employee_skills ges ON ges.employee_id = e.employee_id
+    JOIN skills gs ON gs.skill_id = ges.skill_id"""),
+}
+
+
+def _count_by_sql(expression: str, join: str) -> str:
+    return f"""
+    SELECT COALESCE({expression}, 'Unknown') AS group_name,
+           COUNT(DISTINCT e.employee_id) AS employee_count
+    {EMPLOYEE_JOINS}{join}
+    WHERE {EMPLOYEE_FILTERS}
+    GROUP BY 1
+    ORDER BY employee_count DESC, group_name
+    LIMIT %(limit)s
+"""
+
+
+COUNT_BY_SQL = {dim: _count_by_sql(expr, join) for dim, (expr, join) in GROUP_DIMENSIONS.items()}
+
+SLOT_PARAMS = ("roles", "departments", "statuses", "employment_types", "locations", "skills")
+
+
+def template_params(slots: dict) -> dict:
+    """Bind parameters for EMPLOYEE_FILTERS; every slot the question didn't fill is NULL."""
+    params = {name: (list(slots[name]) if slots.get(name) else None) for name in SLOT_PARAMS}
+    years = slots.get("min_years")
+    params["min_years"] = years[1] if years else None
+    params["years_inclusive"] = bool(years and years[0] == "$gte")
+    skills = params["skills"] or []
+    # "python and java" needs every skill; "python or java" any of them
+    params["skills_required"] = 1 if slots.get("any_skill") else len(skills)
+    return params
@@ -0,0 +1,84 @@
+# records.py
+# Full employee records for callers that need more than the vector store keeps.
+# Chroma metadata only holds the flat filter fields (see sync/pg_extract.py); the complete
+# row and skills list are read from Postgres on demand, one = ANY(...) query per batch.
+import os
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional
+
+import psycopg2.extras
+
+from database.pool import connection
+
+RECORD_BATCH_SIZE = int(os.getenv("RECORD_BATCH_SIZE", "500"))
+
+EMPLOYEE_RECORD_SQL = """
+    SELECT e.*,
+           COALESCE(sk.skills, '[]'::json) AS skills
+    FROM employees e
+    LEFT JOIN (
+        SELECT es.employee_id,
+               json_agg(json_build_object(
+                   'skill_id', es.skill_id,
+                   'updated_at', es.updated_at,
+                   'proficiency', es.proficiency,
+                   'skill_name', s.name,
+                   'skill_updated_at', s.updated_at
+               ) ORDER BY s.name) AS skills
+        FROM employee_skills es
+        JOIN skills s ON s.skill_id = es.skill_id
+        WHERE es.employee_id = ANY(%(ids)s)
+        GROUP BY es.employee_id
+    ) sk ON sk.employee_id = e.employee_id
+    WHERE e.employee_id = ANY(%(ids)s)
+"""
+
+
+def row_key(row_id):
+    # Ids come back from Chroma as strings ("employee:42" -> "42"); the column is an integer
+    text = str(row_id)
+    return int(text) if text.isdigit() else text
+
+
+def fetch_employee_records(row_ids: Iterable, batch_size: int = RECORD_BATCH_SIZE) -> Dict[object, dict]:
+    """{employee_id: row with a 'skills' list}; ids without a row are left out."""
+    ids = list(dict.fromkeys(row_key(r) for r in row_ids))
+    records = {}
+    if not ids:
+        return records
+    with connection() as conn:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            for start in range(0, len(ids), batch_size):
+                cur.execute(EMPLOYEE_RECORD_SQL, {"ids": ids[start:start + batch_size]})
+                for row in cur.fetchall():
+                    records[row["employee_id"]] = dict(row)
+    return records
+
+
+class EmployeeRecords(Mapping):
+    """
+    Lazy {employee_id: record} for a result set. Nothing is read until the first lookup,
+    which resolves every id at once.
+    """
+
+    def __init__(self, row_ids: Iterable):
+        self.row_ids: List = list(dict.fromkeys(row_key(r) for r in row_ids))
+        self._records: Optional[Dict[object, dict]] = None
+
+    def _load(self) -> Dict[object, dict]:
+        if self._records is None:
+            self._records = fetch_employee_records(self.row_ids)
+        return self._records
+
+    @property
+    def loaded(self) -> bool:
+        return self._records is not None
+
+    def __getitem__(self, row_id) -> dict:
+        return self._load()[row_key(row_id)]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
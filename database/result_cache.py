@@ -0,0 +1,158 @@
+# result_cache.py
+# Caches run_sql_query results by canonical SQL. Entries are dropped per table when that
+# table's max(updated_at) watermark moves; tables without a watermark rely on the TTL.
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from database.watermarks import TRACKED_TABLES
+
+
+def estimate_size(rows: list) -> int:
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for key, value in row.items():
+            size += sys.getsizeof(key) + sys.getsizeof(value)
+    return size
+
+
+class _Entry:
+    __slots__ = ("rows", "tables", "size", "created_at")
+
+    def __init__(self, rows, tables, size):
+        self.rows = rows
+        self.tables = tables
+        self.size = size
+        self.created_at = time.monotonic()
+
+
+class ResultCache:
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 600.0,
+        watermark_interval: float = 5.0,
+        fetch_watermarks: Optional[Callable[[], Dict[str, object]]] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.watermark_interval = watermark_interval
+        self.fetch_watermarks = fetch_watermarks
+
+        self._entries = OrderedDict()    # canonical sql -> _Entry, oldest first
+        self._bytes = 0
+        self._watermarks = {}
+        self._last_check = 0.0
+        self._generation = 0             # bumped on every invalidation
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits_total": 0,
+            "misses_total": 0,
+            "bypass_total": 0,
+            "evictions_total": 0,
+            "invalidations_total": 0,
+        }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def invalidate_tables(self, tables):
+        tables = set(tables)
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if e.tables & tables]
+            for key in stale:
+                self._remove(key)
+            self._generation += 1
+            self._stats["invalidations_total"] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._generation += 1
+
+    def generation(self) -> int:
+        return self._generation
+
+    def refresh_watermarks(self, force: bool = False):
+        if self.fetch_watermarks is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_check < self.watermark_interval:
+            return
+        self._last_check = now
+
+        try:
+            current = self.fetch_watermarks()
+        except Exception as e:
+            # Can't tell what changed; serving stale rows is worse than a miss
+            print("[RESULT CACHE] watermark check failed:", e)
+            self.clear()
+            return
+
+        changed = [t for t in TRACKED_TABLES if current.get(t) != self._watermarks.get(t)]
+        self._watermarks = current
+        if changed:
+            self.invalidate_tables(changed)
+
+    def get(self, key: str) -> Optional[list]:
+        self.refresh_watermarks()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry.created_at > self.ttl:
+                if entry is not None:
+                    self._remove(key)
+                self._stats["misses_total"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits_total"] += 1
+            return entry.rows
+
+    def put(self, key: str, rows: list, tables, generation: Optional[int] = None):
+        size = estimate_size(rows)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # Rows read before an invalidation may already be stale
+            if generation is not None and generation != self._generation:
+                return
+            self._remove(key)
+            self._entries[key] = _Entry(rows, set(tables), size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions_total"] += 1
+
+    def record_bypass(self):
+        with self._lock:
+            self._stats["bypass_total"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        return stats
+
+
+def _fetch_watermarks():
+    from database.pool import connection
+    from database.watermarks import fetch_table_watermarks
+
+    with connection() as conn:
+        return fetch_table_watermarks(conn)
+
+
+result_cache = ResultCache(
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl=float(os.getenv("RESULT_CACHE_TTL", "600")),
+    watermark_interval=float(os.getenv("RESULT_CACHE_WATERMARK_INTERVAL", "5")),
+    fetch_watermarks=_fetch_watermarks,
+)
@@ -0,0 +1,231 @@
+# schema.py
+# Live schema catalog, introspected from information_schema and cached with a refresh interval.
+# Drives both the SQL prompt (llm/schema_context.py) and the validator, so they can't drift apart.
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from database.pool import connection
+
+SCHEMA_REFRESH_INTERVAL = float(os.getenv("SCHEMA_REFRESH_INTERVAL", "600"))
+SCHEMA_MAX_CATEGORICAL_VALUES = int(os.getenv("SCHEMA_MAX_CATEGORICAL_VALUES", "200"))
+
+# Tables exposed to the LLM; anything else in the database (sync state etc.) stays hidden
+SCHEMA_TABLES = [t.strip() for t in os.getenv(
+    "SCHEMA_TABLES",
+    "employees,departments,roles,skills,employee_skills,projects,employee_projects",
+).split(",") if t.strip()]
+
+# label -> (table, column) whose distinct values are listed in the prompt
+CATEGORICAL_COLUMNS = {
+    "role names": ("roles", "name"),
+    "skills": ("skills", "name"),
+    "department names": ("departments", "name"),
+    "employment types": ("employees", "employment_type"),
+    "statuses": ("employees", "status"),
+    "locations": ("employees", "location"),
+}
+
+# Used only until the first successful introspection (e.g. database down at startup)
+STATIC_SCHEMA = {
+    "employees": ["employee_id", "first_name", "last_name", "email", "phone", "date_of_birth",
+                  "gender", "hire_date", "employment_type", "status", "department_id", "role_id",
+                  "domain", "years_experience", "salary", "location"],
+    "departments": ["department_id", "name"],
+    "roles": ["role_id", "name", "description"],
+    "skills": ["skill_id", "name"],
+    "employee_skills": ["employee_id", "skill_id", "proficiency"],
+    "projects": ["project_id", "name", "domain", "description"],
+    "employee_projects": ["employee_id", "project_id", "role", "contribution"],
+}
+STATIC_FOREIGN_KEYS = [
+    ("employee_projects", "employee_id", "employees", "employee_id"),
+    ("employee_projects", "project_id", "projects", "project_id"),
+    ("employee_skills", "employee_id", "employees", "employee_id"),
+    ("employee_skills", "skill_id", "skills", "skill_id"),
+    ("employees", "department_id", "departments", "department_id"),
+    ("employees", "role_id", "roles", "role_id"),
+]
+
+
+class SchemaCatalog:
+    def __init__(
+        self,
+        tables: Dict[str, List[str]],
+        foreign_keys: Optional[List[Tuple[str, str, str, str]]] = None,
+        categorical: Optional[Dict[str, List[str]]] = None,
+    ):
+        self.tables = tables
+        # (table, column, referenced_table, referenced_column)
+        self.foreign_keys = foreign_keys or []
+        self.categorical = categorical or {}
+        self.version = hashlib.sha256(
+            json.dumps([tables, self.foreign_keys, self.categorical], sort_keys=True, default=str).encode()
+        ).hexdigest()[:16]
+        self._vocabulary = None
+
+    @property
+    def vocabulary(self) -> "VocabularyMatcher":
+        # Built on first use; a catalog never changes, a refresh makes a new one
+        if self._vocabulary is None:
+            self._vocabulary = VocabularyMatcher(self.categorical)
+        return self._vocabulary
+
+    def columns(self, table: str) -> List[str]:
+        return self.tables.get(table, [])
+
+    def references(self, table: str) -> Dict[str, str]:
+        """column -> referenced table, for the compact `col -> table` notation."""
+        return {col: ref for t, col, ref, _ in self.foreign_keys if t == table}
+
+    def neighbours(self, table: str) -> set:
+        out = set()
+        for t, _, ref, _ in self.foreign_keys:
+            if t == table:
+                out.add(ref)
+            elif ref == table:
+                out.add(t)
+        return out
+
+
+def introspect_schema(conn, tables: List[str] = SCHEMA_TABLES) -> SchemaCatalog:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT table_name, column_name
+            FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = ANY(%s)
+            ORDER BY table_name, ordinal_position
+        """, (list(tables),))
+        columns = {}
+        for table, column in cur.fetchall():
+            columns.setdefault(table, []).append(column)
+
+        cur.execute("""
+            SELECT kcu.table_name, kcu.column_name, ccu.table_name, ccu.column_name
+            FROM information_schema.table_constraints tc
+            JOIN information_schema.key_column_usage kcu
+              ON kcu.constraint_name = tc.constraint_name AND kcu.table_schema = tc.table_schema
+            JOIN information_schema.constraint_column_usage ccu
+              ON ccu.constraint_name = tc.constraint_name AND ccu.table_schema = tc.table_schema
+            WHERE tc.constraint_type = 'FOREIGN KEY'
+              AND tc.table_schema = current_schema()
+              AND kcu.table_name = ANY(%s)
+            ORDER BY kcu.table_name, kcu.column_name
+        """, (list(tables),))
+        foreign_keys = [tuple(r) for r in cur.fetchall() if r[2] in columns]
+
+        categorical = {}
+        for label, (table, column) in CATEGORICAL_COLUMNS.items():
+            if column not in columns.get(table, []):
+                continue
+            # Identifiers come from the fixed mapping above, checked against information_schema
+            cur.execute(
+                f'SELECT DISTINCT lower("{column}"::text) FROM "{table}" '
+                f'WHERE "{column}" IS NOT NULL ORDER BY 1 LIMIT %s',
+                (SCHEMA_MAX_CATEGORICAL_VALUES,),
+            )
+            categorical[label] = [r[0] for r in cur.fetchall()]
+
+    # Keep the configured order so prompts are stable
+    ordered = {t: columns[t] for t in tables if t in columns}
+    return SchemaCatalog(ordered, foreign_keys, categorical)
+
+
+def find_mentions(text: str, values: List[str]) -> List[str]:
+    """Categorical values that appear in text as whole words (case-insensitive)."""
+    lowered = text.lower()
+    return [v for v in values if re.search(rf"(?<!\w){re.escape(v)}(?!\w)", lowered)]
+
+
+class VocabularyMatcher:
+    """
+    One alternation over every categorical value, longest first, so "data engineer" wins
+    over "data" and each span is taken once. A trailing plural "s"/"es" is allowed.
+    """
+
+    def __init__(self, categorical: Dict[str, List[str]]):
+        self.labels: Dict[str, List[str]] = {}
+        for label, values in categorical.items():
+            for value in values:
+                self.labels.setdefault(value, []).append(label)
+        values = sorted(self.labels, key=len, reverse=True)
+        self.pattern = re.compile(
+            r"(?<!\w)(" + "|".join(re.escape(v) for v in values) + r")(?:e?s)?(?!\w)"
+        ) if values else None
+
+    def mentions(self, text: str) -> List[Tuple[str, List[str]]]:
+        """[(value, [labels it belongs to])] in order of appearance, each value once."""
+        if self.pattern is None:
+            return []
+        found = {}
+        for match in self.pattern.finditer(text.lower()):
+            found.setdefault(match.group(1), self.labels[match.group(1)])
+        return list(found.items())
+
+    def blank(self, text: str, token: str = " ") -> str:
+        """text (lower-cased) with every mention replaced by token."""
+        if self.pattern is None:
+            return text.lower()
+        return self.pattern.sub(f" {token} ", text.lower())
+
+
+class SchemaProvider:
+    def __init__(self, refresh_interval: float = SCHEMA_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._catalog: Optional[SchemaCatalog] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.refreshes_total = 0
+        self.refresh_errors_total = 0
+
+    def _fresh(self) -> bool:
+        return self._catalog is not None and time.monotonic() - self._loaded_at < self.refresh_interval
+
+    def get(self) -> SchemaCatalog:
+        if self._fresh():
+            return self._catalog
+        with self._lock:
+            if not self._fresh():
+                self._refresh()
+            return self._catalog
+
+    def refresh(self) -> SchemaCatalog:
+        with self._lock:
+            self._refresh()
+            return self._catalog
+
+    def _refresh(self):
+        try:
+            with connection() as conn:
+                catalog = introspect_schema(conn)
+            if not catalog.tables:
+                raise RuntimeError("none of SCHEMA_TABLES found")
+            if self._catalog is None or catalog.version != self._catalog.version:
+                print(f"[SCHEMA] Loaded {len(catalog.tables)} tables (version {catalog.version})")
+            self._catalog = catalog
+            self.refreshes_total += 1
+        except Exception as e:
+            self.refresh_errors_total += 1
+            print("[SCHEMA] Introspection failed, keeping previous schema:", e)
+            if self._catalog is None:
+                self._catalog = SchemaCatalog(STATIC_SCHEMA, STATIC_FOREIGN_KEYS)
+        # Also after a failure, so a database outage doesn't turn every request into a retry
+        self._loaded_at = time.monotonic()
+
+    def metrics(self) -> dict:
+        return {
+            "tables": len(self._catalog.tables) if self._catalog else 0,
+            "refreshes_total": self.refreshes_total,
+            "refresh_errors_total": self.refresh_errors_total,
+        }
+
+
+schema_provider = SchemaProvider()
+
+
+def get_schema_catalog() -> SchemaCatalog:
+    return schema_provider.get()
@@ -0,0 +1,49 @@
+# watermarks.py
+# Per-table max(updated_at) values. The sync service uses them to find changed rows,
+# the main server uses them to invalidate cached query results.
+import threading
+from typing import Dict, Optional, Tuple
+
+# Every table that feeds the employee documents (sync/pg_extract.py)
+TRACKED_TABLES = (
+    "employees", "employee_skills", "skills",
+    "roles", "departments", "projects", "employee_projects",
+)
+
+_watermarked: Optional[Tuple[str, ...]] = None
+_watermarked_lock = threading.Lock()
+
+
+def watermarked_tables(conn) -> Tuple[str, ...]:
+    """
+    The tracked tables that have an updated_at column. Tables without one can't be polled;
+    their changes only arrive through change capture (sync/change_capture.py) or the TTL.
+    """
+    global _watermarked
+    with _watermarked_lock:
+        if _watermarked is None:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT table_name FROM information_schema.columns
+                    WHERE table_schema = ANY(current_schemas(false))
+                      AND column_name = 'updated_at'
+                      AND table_name = ANY(%s)
+                    """,
+                    (list(TRACKED_TABLES),),
+                )
+                found = {row[0] for row in cur.fetchall()}
+            _watermarked = tuple(t for t in TRACKED_TABLES if t in found)
+        return _watermarked
+
+
+def fetch_table_watermarks(conn) -> Dict[str, object]:
+    tables = watermarked_tables(conn)
+    if not tables:
+        return {}
+    sql = " UNION ALL ".join(
+        f"SELECT '{table}', MAX(updated_at) FROM {table}" for table in tables
+    )
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        return {table: value for table, value in cur.fetchall()}
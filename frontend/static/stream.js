@@ -0,0 +1,101 @@
+// Streams the answer from /query/stream instead of waiting for the full page from /query.
+// Without EventSource the form falls back to the normal POST.
+(function () {
+    const form = document.querySelector("form[action='/query']");
+    if (!form || !window.EventSource) {
+        return;
+    }
+
+    const live = document.getElementById("live");
+    const status = document.getElementById("live-status");
+    const answerBox = document.getElementById("live-answer");
+    const sqlSection = document.getElementById("live-sql-section");
+    const sqlCode = document.getElementById("live-sql");
+    const notice = document.getElementById("live-notice");
+    const error = document.getElementById("live-error");
+
+    const STAGES = {
+        started: "Generating SQL…",
+        sql_generated: "SQL generated, running it…",
+        rows_fetched: "Rows fetched, writing the answer…",
+        fallback: "Using semantic search, writing the answer…",
+    };
+
+    let source = null;
+
+    form.addEventListener("submit", function (event) {
+        const query = form.querySelector("textarea[name='user_query']").value.trim();
+        if (!query) {
+            return;
+        }
+        event.preventDefault();
+        if (source) {
+            source.close();
+        }
+
+        // Hide the server-rendered result of any previous POST
+        document.querySelectorAll(".server-result").forEach((el) => el.remove());
+        live.hidden = false;
+        sqlSection.hidden = true;
+        notice.hidden = true;
+        error.hidden = true;
+        answerBox.innerHTML = "";
+        status.textContent = STAGES.started;
+
+        let markdown = "";
+        let pending = false;
+        function render() {
+            // Re-parse at most once per frame, however fast tokens arrive
+            if (pending) {
+                return;
+            }
+            pending = true;
+            requestAnimationFrame(function () {
+                pending = false;
+                answerBox.innerHTML = marked.parse(markdown);
+            });
+        }
+
+        source = new EventSource("/query/stream?user_query=" + encodeURIComponent(query));
+
+        source.addEventListener("stage", function (e) {
+            const data = JSON.parse(e.data);
+            status.textContent = STAGES[data.stage] || data.stage;
+            if (data.sql) {
+                sqlSection.hidden = false;
+                sqlCode.textContent = data.sql;
+                Prism.highlightElement(sqlCode);
+            }
+            if (data.notice) {
+                notice.hidden = false;
+                notice.textContent = data.notice;
+            }
+        });
+
+        source.addEventListener("token", function (e) {
+            markdown += JSON.parse(e.data).text;
+            render();
+        });
+
+        source.addEventListener("error", function (e) {
+            // Also fired by EventSource itself when the connection drops (no data then)
+            if (e.data) {
+                const data = JSON.parse(e.data);
+                error.hidden = false;
+                error.textContent = data.error;
+                if (data.sql) {
+                    sqlSection.hidden = false;
+                    sqlCode.textContent = data.sql;
+                    Prism.highlightElement(sqlCode);
+                }
+            }
+            status.textContent = "";
+            source.close();
+        });
+
+        source.addEventListener("done", function () {
+            status.textContent = "";
+            source.close();
+        });
+    });
+})();
@@ -0,0 +1,174 @@
+# embeddings.py
+# Query-side sentence embeddings. Uses the same model the sync service indexes with.
+#
+# Questions are encoded by one resident QueryEncoder: concurrent requests arriving within a
+# few milliseconds are encoded as one batch, and repeat questions come from an LRU.
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional
+
+import numpy as np
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_EMBED_BATCH_WINDOW_MS", "3"))
+QUERY_MAX_BATCH = int(os.getenv("QUERY_EMBED_MAX_BATCH", "32"))
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "2048"))
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_query_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _model
+
+
+def normalize_question(text: str) -> str:
+    # The tokenizer lower-cases and splits on whitespace, so this leaves the vector unchanged
+    # and only widens LRU hits. Punctuation is kept: it is tokenized and moves the vector.
+    return " ".join(text.lower().split())
+
+
+class QueryEncoder:
+    def __init__(
+        self,
+        window_ms: float = QUERY_BATCH_WINDOW_MS,
+        max_batch: int = QUERY_MAX_BATCH,
+        cache_size: int = QUERY_EMBED_CACHE_SIZE,
+    ):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+
+        self._cache = OrderedDict()
+        self._pending = []             # [(text, Future)] waiting for the next batch
+        self._inflight = {}            # text -> Future, so a question is encoded once at a time
+        self._collecting = False       # a leader thread is holding the window open
+        self._full = threading.Event()
+        self._lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+
+        self._stats = {
+            "requests_total": 0,
+            "cache_hits_total": 0,
+            "batches_total": 0,
+            "encoded_total": 0,
+            "max_batch_size": 0,
+        }
+
+    def _cached(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            self._stats["requests_total"] += 1
+            vec = self._cache.get(key)
+            if vec is not None:
+                self._cache.move_to_end(key)
+                self._stats["cache_hits_total"] += 1
+            return vec
+
+    def _remember(self, key: str, vec: np.ndarray):
+        with self._lock:
+            self._cache[key] = vec
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _run_batch(self, batch):
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            with self._encode_lock:
+                vectors = get_query_model().encode(texts, normalize_embeddings=True,
+                                                   batch_size=len(texts))
+            vectors = np.asarray(vectors, dtype=np.float32)
+        except Exception as e:
+            with self._lock:
+                for text, _ in batch:
+                    self._inflight.pop(text, None)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, vectors))
+        for text, vec in by_text.items():
+            vec.setflags(write=False)
+            self._remember(text, vec)
+        with self._lock:
+            for text in texts:
+                self._inflight.pop(text, None)
+            self._stats["batches_total"] += 1
+            self._stats["encoded_total"] += len(texts)
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(texts))
+        for text, future in batch:
+            future.set_result(by_text[text])
+
+    def encode(self, text: str) -> np.ndarray:
+        """Unit-length float32 vector (read-only, shared with the cache)."""
+        key = normalize_question(text)
+        vec = self._cached(key)
+        if vec is not None:
+            return vec
+
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                wait_only = True
+            else:
+                wait_only = False
+                future = self._inflight[key] = Future()
+                self._pending.append((key, future))
+        if wait_only:
+            return future.result()
+
+        with self._lock:
+            leader = not self._collecting
+            if leader:
+                self._collecting = True
+            elif len(self._pending) >= self.max_batch:
+                self._full.set()
+
+        if leader:
+            # First caller in the window waits for company, then encodes for everyone
+            self._full.wait(self.window)
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._collecting = False
+                self._full.clear()
+            # Empty when the previous leader already took our item; its result is on the future
+            if batch:
+                self._run_batch(batch)
+
+        return future.result()
+
+    def warm_up(self):
+        self.encode("warm up")
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cache_entries"] = len(self._cache)
+        return stats
+
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_query_encoder() -> QueryEncoder:
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                _encoder = QueryEncoder()
+    return _encoder
+
+
+def embed_query(text: str) -> np.ndarray:
+    """Unit-length float32 vector, so cosine similarity is a dot product."""
+    return get_query_encoder().encode(text)
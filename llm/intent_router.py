@@ -0,0 +1,359 @@
+# intent_router.py
+# LLM-free fast path in front of generate_sql. Questions of a few common shapes
+#   - "list data engineers in pune with more than 5 years"        -> list
+#   - "how many employees know python and aws"                    -> count
+#   - "headcount by department for full-time staff"               -> count_by
+# are matched locally: slots (skills, roles, departments, statuses, employment types,
+# locations, minimum years) come from the introspected vocab, the shape from keyword rules,
+# or from a small nearest-exemplar embedding classifier when the rules can't tell. A match
+# runs a vetted template from database/query_templates.py with bind parameters and is answered
+# deterministically. Anything else (or anything the router isn't sure about) goes to the LLM.
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from database.hybrid_search import YEARS_PATTERN, parse_min_years
+from database.query_guard import run_parameterized
+from database.query_templates import (
+    COUNT_BY_SQL,
+    COUNT_EMPLOYEES_SQL,
+    GROUP_DIMENSIONS,
+    LIST_EMPLOYEES_SQL,
+    template_params,
+)
+from database.schema import SchemaCatalog, get_schema_catalog
+from llm.embeddings import embed_query, get_query_model
+from llm.result_compactor import render_markdown_table
+
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() in ("1", "true", "yes")
+ROUTER_CLASSIFIER_ENABLED = os.getenv("ROUTER_CLASSIFIER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Cosine similarity to the nearest exemplar needed to accept the classifier's shape
+ROUTER_MIN_SIMILARITY = float(os.getenv("ROUTER_MIN_SIMILARITY", "0.6"))
+# Rows shown in a list answer (the count in the header covers all of them)
+ROUTER_MAX_LIST_ROWS = int(os.getenv("ROUTER_MAX_LIST_ROWS", "25"))
+
+# label in database.schema.CATEGORICAL_COLUMNS -> slot / template parameter
+SLOT_LABELS = {
+    "skills": "skills",
+    "role names": "roles",
+    "department names": "departments",
+    "statuses": "statuses",
+    "employment types": "employment_types",
+    "locations": "locations",
+}
+
+# Stands in for a vocab mention once it has been taken as a slot
+SLOT_TOKEN = "_slot_"
+EMPLOYEE_NOUNS = {"employees", "employee", "people", "persons", "staff", "members", "workers", SLOT_TOKEN}
+
+COUNT_WORDS = re.compile(r"\b(how many|count|number of|headcount)\b")
+# What is being counted: "how many _slot_ ...", "number of employees", "employee count"
+COUNT_SUBJECT = re.compile(r"\b(?:how many|count of|number of)\s+(?:(?:of|the|all|our)\s+)*(\S+)")
+COUNT_EMPLOYEES = re.compile(r"\b(?:headcount|(?:employee|staff|people)\s+count)\b")
+GROUP_WORDS = re.compile(
+    r"\b(?:by|per|each|across)\s+(" + "|".join(GROUP_DIMENSIONS) + r")(?:e?s)?\b"
+)
+# "which department ...", "what skills ...": asks for a dimension, not for employees
+ASKS_FOR_DIMENSION = re.compile(r"\b(?:which|what)\s+(?:" + "|".join(GROUP_DIMENSIONS) + r")(?:e?s)?\b")
+# The years phrase with its usual tail, so "of experience" isn't left over
+YEARS_PHRASE = re.compile(YEARS_PATTERN.pattern + r"(?:\s+of)?(?:\s+(?:work\s+)?experience)?")
+LIST_WORDS = re.compile(r"\b(list|show|find|who|which|get|give|display|fetch|employees|people|staff)\b")
+ANY_WORDS = re.compile(r"\b(or|either|any of)\b")
+# Anything the templates can't express; such questions always go to the LLM
+UNSUPPORTED = re.compile(
+    r"\b(average|avg|mean|sum|salary|salaries|paid|pay|highest|lowest|top|most|least|max|maximum|"
+    r"minimum|project|projects|hired|hire|joined|since|before|after|between|email|phone|born|age|"
+    r"older|younger|gender|except|excluding|percent|percentage|ratio|compare|"
+    r"versus|vs|proficiency|proficient|expert|beginner|intermediate|advanced|named|called|"
+    r"ids?|rank|sorted|order|years?|yrs|experience|tenure)\b|'s\b"
+)
+# Negations flip the meaning of a slot ("people who don't know python"); never routed
+NEGATION = re.compile(r"\b(not|no|none|never|without|lacks?|lacking|missing|don'?t|doesn'?t|didn'?t|isn'?t|aren'?t)\b")
+TOKEN = re.compile(r"[a-z_][a-z_'-]*")
+# Everything a routed question may contain besides slots, the years phrase and shape words.
+# Any other word ("left", "company", a person's name) may change the meaning: LLM path.
+# Role nouns ("developers", "engineers") are not filler: unless the role vocab consumed them
+# they are an unresolved role filter.
+FILLER_WORDS = frozenset("""
+a an the all any of in at on from for to with who whom which that what are is be been have has
+having do does know knows knowing skill skills skilled department departments role roles
+location locations status statuses employment type types based located working work works
+employees employee people persons staff members workers
+how many count number headcount total by per each across grouped group and or either me us our
+we i you can could please show list find get give display fetch tell want see there currently
+""".split()) | {SLOT_TOKEN}
+
+INTENTS = ("list", "count", "count_by")
+
+# Nearest-exemplar classifier: settles the shape when the keyword rules can't, and vetoes
+# questions that sit close to something the templates can't answer
+EXEMPLARS = {
+    "list": [
+        "list employees who know python",
+        "data engineers in bangalore",
+        "people with react and node.js skills",
+        "backend developers with more than 5 years of experience",
+        "active full-time staff in the engineering department",
+    ],
+    "count": [
+        "how many employees know python",
+        "number of data engineers",
+        "count of active contractors in pune",
+        "total headcount of the sales department",
+    ],
+    "count_by": [
+        "how many employees per department",
+        "headcount by location",
+        "number of people in each role",
+        "employee count grouped by status",
+    ],
+    "other": [
+        "what is the average salary of data engineers",
+        "which projects has sneha reddy worked on",
+        "who was hired most recently",
+        "show the top 5 highest paid employees",
+        "tell me everything about rahul sharma",
+        "compare salaries across departments",
+    ],
+}
+
+
+class RouteMatch:
+    __slots__ = ("intent", "slots", "group", "method")
+
+    def __init__(self, intent: str, slots: Dict[str, object], group: Optional[str], method: str):
+        self.intent = intent
+        self.slots = slots
+        self.group = group          # count_by dimension
+        self.method = method        # "rules" or "classifier"
+
+    @property
+    def sql(self) -> str:
+        if self.intent == "list":
+            return LIST_EMPLOYEES_SQL
+        if self.intent == "count":
+            return COUNT_EMPLOYEES_SQL
+        return COUNT_BY_SQL[self.group]
+
+    @property
+    def params(self) -> dict:
+        return template_params(self.slots)
+
+    def describe(self) -> str:
+        """The filters in words, e.g. "with Python and AWS skills in Pune"."""
+        slots, parts = self.slots, []
+        joiner = " or " if slots.get("any_skill") else " and "
+        if slots.get("roles"):
+            parts.append("with role " + " or ".join(v.title() for v in slots["roles"]))
+        if slots.get("skills"):
+            parts.append("with " + joiner.join(v.title() for v in slots["skills"]) + " skills")
+        if slots.get("departments"):
+            parts.append("in the " + " or ".join(v.title() for v in slots["departments"]) + " department")
+        if slots.get("locations"):
+            parts.append("in " + " or ".join(v.title() for v in slots["locations"]))
+        if slots.get("statuses"):
+            parts.append("with status " + " or ".join(slots["statuses"]))
+        if slots.get("employment_types"):
+            parts.append("employed " + " or ".join(slots["employment_types"]))
+        if slots.get("min_years"):
+            op, years = slots["min_years"]
+            parts.append(f"with {'at least' if op == '$gte' else 'more than'} {years:g} years of experience")
+        return " ".join(parts)
+
+
+class RoutedAnswer:
+    __slots__ = ("match", "rows", "sql", "answer")
+
+    def __init__(self, match: RouteMatch, rows, sql: str, answer: str):
+        self.match = match
+        self.rows = rows
+        self.sql = sql
+        self.answer = answer
+
+
+def extract_slots(text: str, catalog: SchemaCatalog):
+    """({slot: [values]}, text with the mentions replaced by SLOT_TOKEN, ambiguous?)"""
+    vocabulary = catalog.vocabulary
+    slots: Dict[str, List[str]] = {}
+    ambiguous = False
+    for value, labels in vocabulary.mentions(text):
+        if len(labels) > 1:
+            # e.g. a value that is both a department and a skill; let the LLM decide
+            ambiguous = True
+        slot = SLOT_LABELS.get(labels[0])
+        if slot:
+            slots.setdefault(slot, []).append(value)
+    return slots, vocabulary.blank(text, SLOT_TOKEN), ambiguous
+
+
+class _Classifier:
+    def __init__(self):
+        labels, texts = [], []
+        for label, examples in EXEMPLARS.items():
+            labels.extend([label] * len(examples))
+            texts.extend(examples)
+        self.labels = labels
+        self.vectors = np.asarray(get_query_model().encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    def classify(self, question: str) -> Tuple[str, float]:
+        scores = self.vectors @ embed_query(question)
+        best = int(np.argmax(scores))
+        return self.labels[best], float(scores[best])
+
+
+class IntentRouter:
+    def __init__(self):
+        self._classifier: Optional[_Classifier] = None
+        self._lock = threading.Lock()
+        self._classifier_lock = threading.Lock()
+        self._stats = {
+            "questions_total": 0,
+            "routed_total": 0,
+            "routed_rules_total": 0,
+            "routed_classifier_total": 0,
+            "unsupported_total": 0,
+            "unmatched_total": 0,
+            "template_errors_total": 0,
+            **{f"routed_{intent}_total": 0 for intent in INTENTS},
+        }
+
+    def _count(self, *names):
+        with self._lock:
+            for name in names:
+                self._stats[name] += 1
+
+    def _get_classifier(self) -> _Classifier:
+        # Separate lock: the first call loads the model, counters shouldn't wait for it
+        with self._classifier_lock:
+            if self._classifier is None:
+                self._classifier = _Classifier()
+            return self._classifier
+
+    @staticmethod
+    def _explained(rest: str) -> bool:
+        """True when nothing but filler is left once slots and the years phrase are removed."""
+        return all(token in FILLER_WORDS for token in TOKEN.findall(rest))
+
+    @staticmethod
+    def _counts_employees(rest: str) -> bool:
+        if COUNT_EMPLOYEES.search(rest):
+            return True
+        subject = COUNT_SUBJECT.search(rest)
+        return bool(subject) and subject.group(1) in EMPLOYEE_NOUNS
+
+    def _rules(self, rest: str, slots: dict):
+        """(intent, group) from keywords, None when they don't settle it."""
+        group = GROUP_WORDS.search(rest)
+        counting = COUNT_WORDS.search(rest)
+        if counting and not self._counts_employees(rest):
+            # "how many skills does ...", "count of projects ..."
+            return None
+        if group:
+            # "employees by department" could be a list or a count; only route the count
+            return ("count_by", group.group(1)) if counting else None
+        if counting:
+            return "count", None
+        if slots and (LIST_WORDS.search(rest) or SLOT_TOKEN in rest or "min_years" in slots):
+            # "data engineers in pune": nothing but slots and filler is a list of the matches
+            return "list", None
+        return None
+
+    def _shape(self, question: str, rest: str, slots: dict):
+        """(intent, group, method) or None."""
+        shape = self._rules(rest, slots)
+        label, score = None, 0.0
+        if ROUTER_CLASSIFIER_ENABLED:
+            label, score = self._get_classifier().classify(question)
+            if label == "other" and score >= ROUTER_MIN_SIMILARITY:
+                # Veto: close to a question the templates can't answer
+                return None
+        if shape is not None:
+            return shape[0], shape[1], "rules"
+        # Listing everyone is not a fast-path question, and count_by needs a dimension
+        if slots and label in ("list", "count") and score >= ROUTER_MIN_SIMILARITY:
+            return label, None, "classifier"
+        return None
+
+    def route(self, question: str, catalog: Optional[SchemaCatalog] = None) -> Optional[RouteMatch]:
+        self._count("questions_total")
+        if not ROUTER_ENABLED:
+            return None
+        catalog = catalog or get_schema_catalog()
+        lowered = " ".join(question.lower().replace("\u2019", "'").split())
+
+        slots, rest, ambiguous = extract_slots(lowered, catalog)
+        years = parse_min_years(lowered)
+        if years:
+            slots["min_years"] = years
+            rest = YEARS_PHRASE.sub(" ", rest)
+        if (ambiguous or UNSUPPORTED.search(rest) or NEGATION.search(rest) or ASKS_FOR_DIMENSION.search(rest)
+                or re.search(r"\d", rest) or not self._explained(rest)):
+            self._count("unsupported_total")
+            return None
+
+        shape = self._shape(lowered, rest, slots)
+        if shape is None:
+            self._count("unmatched_total")
+            return None
+        intent, group, method = shape
+        if len(slots.get("skills", [])) > 1 and ANY_WORDS.search(rest):
+            slots["any_skill"] = True
+        return RouteMatch(intent, slots, group, method)
+
+    def answer(self, question: str) -> Optional[RoutedAnswer]:
+        """Route, run the template and render the answer; None sends the question to the LLM."""
+        match = self.route(question)
+        if match is None:
+            return None
+        try:
+            rows = run_parameterized(match.sql, match.params)
+        except Exception as e:
+            self._count("template_errors_total")
+            print(f"[ROUTER] Template '{match.intent}' failed, using the LLM path:", e)
+            return None
+        # Counted only once the template has actually answered
+        self._count("routed_total", f"routed_{match.method}_total", f"routed_{match.intent}_total")
+        print(f"[ROUTER] '{question}' -> {match.intent} ({match.method}) {match.params}")
+        return RoutedAnswer(match, rows, rows.sql, render_answer(match, rows))
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["coverage"] = stats["routed_total"] / stats["questions_total"] if stats["questions_total"] else 0.0
+        return stats
+
+
+def render_answer(match: RouteMatch, rows) -> str:
+    described = match.describe()
+    suffix = f" {described}" if described else ""
+    notice = rows.notice() if hasattr(rows, "notice") else None
+
+    if match.intent == "count":
+        count = rows[0]["employee_count"] if rows else 0
+        answer = f"**{count}** employee{'s' if count != 1 else ''}{suffix}."
+
+    elif match.intent == "count_by":
+        if not rows:
+            return f"No employees found{suffix}."
+        table = [{match.group: r["group_name"], "employees": r["employee_count"]} for r in rows]
+        answer = f"Employees{suffix} by {match.group}:\n\n" + render_markdown_table(table, [match.group, "employees"])
+
+    else:
+        if not rows:
+            return f"No employees found{suffix}."
+        shown = rows[:ROUTER_MAX_LIST_ROWS]
+        columns = [c for c in shown[0] if c != "employee_id"]
+        answer = (f"Found **{len(rows)}** employee{'s' if len(rows) != 1 else ''}{suffix}.\n\n"
+                  + render_markdown_table(shown, columns))
+        if len(rows) > len(shown):
+            answer += f"\n\n_Showing the first {len(shown)}, ordered by experience._"
+
+    if notice:
+        answer += f"\n\n_{notice}_"
+    return answer
+
+
+intent_router = IntentRouter()
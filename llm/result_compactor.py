@@ -0,0 +1,197 @@
+# result_compactor.py
+# Turns SQL result rows into the smallest prompt text that still answers the question:
+#   - tiny, simple results: a deterministic markdown answer, no LLM call at all
+#   - results within the token budget: compact TSV of the columns that matter
+#   - larger results: locally computed statistics plus a representative sample
+import os
+import re
+import statistics
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List, Optional
+
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "3000"))
+# No tokenizer for the Groq-hosted model ships with the app; ~4 characters per token is close
+# enough for budgeting English/TSV text
+SUMMARY_CHARS_PER_TOKEN = float(os.getenv("SUMMARY_CHARS_PER_TOKEN", "4"))
+SUMMARY_MAX_CELL_CHARS = int(os.getenv("SUMMARY_MAX_CELL_CHARS", "80"))
+SUMMARY_DIRECT_ENABLED = os.getenv("SUMMARY_DIRECT_ENABLED", "true").lower() in ("1", "true", "yes")
+SUMMARY_DIRECT_MAX_ROWS = int(os.getenv("SUMMARY_DIRECT_MAX_ROWS", "10"))
+SUMMARY_DIRECT_MAX_COLUMNS = int(os.getenv("SUMMARY_DIRECT_MAX_COLUMNS", "6"))
+
+# Columns with at most this many distinct values get value counts in the statistics view
+CATEGORICAL_MAX_DISTINCT = 20
+TOP_VALUES = 10
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / SUMMARY_CHARS_PER_TOKEN) + 1
+
+
+def _format(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    if isinstance(value, Decimal):
+        return _format(float(value)) if value != value.to_integral_value() else str(int(value))
+    text = " ".join(str(value).split())
+    if len(text) > SUMMARY_MAX_CELL_CHARS:
+        text = text[:SUMMARY_MAX_CELL_CHARS - 1] + "…"
+    return text
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def select_columns(rows: List[dict], question: str = ""):
+    """
+    (columns to show, {column: value} shared by every row). Drops all-empty columns,
+    factors out constant ones and drops *_id keys unless the question asks for ids.
+    """
+    if not rows:
+        return [], {}
+    columns = list(rows[0].keys())
+    wants_ids = bool(re.search(r"\bids?\b", question.lower()))
+    asked = {c for c in columns if c.lower().replace("_", " ") in question.lower()}
+
+    keep, constant = [], {}
+    for col in columns:
+        values = [row.get(col) for row in rows]
+        if all(v is None or v == "" for v in values):
+            continue
+        if col.lower().endswith("_id") and not wants_ids and col not in asked and len(columns) > 1:
+            continue
+        if len(rows) > 1 and all(v == values[0] for v in values) and col not in asked:
+            constant[col] = values[0]
+            continue
+        keep.append(col)
+    if not keep and constant:
+        # Every column is constant (e.g. one row repeated); show them as the table
+        keep, constant = list(constant), {}
+    return keep, constant
+
+
+def render_tsv(rows: List[dict], columns: List[str]) -> str:
+    lines = ["\t".join(columns)]
+    lines.extend("\t".join(_format(row.get(c)) for c in columns) for row in rows)
+    return "\n".join(lines)
+
+
+def render_markdown_table(rows: List[dict], columns: List[str]) -> str:
+    def cell(value):
+        return _format(value).replace("|", "\\|")
+
+    header = "| " + " | ".join(c.replace("_", " ").title() for c in columns) + " |"
+    divider = "|" + "|".join("---" for _ in columns) + "|"
+    body = ["| " + " | ".join(cell(row.get(c)) for c in columns) + " |" for row in rows]
+    return "\n".join([header, divider] + body)
+
+
+def _constant_line(constant: dict) -> str:
+    if not constant:
+        return ""
+    return "All rows share: " + ", ".join(f"{k}={_format(v)}" for k, v in constant.items())
+
+
+def column_statistics(rows: List[dict], columns: List[str]) -> str:
+    lines = []
+    for col in columns:
+        values = [row.get(col) for row in rows if row.get(col) is not None]
+        if not values:
+            continue
+        if all(_is_number(v) for v in values):
+            numbers = [float(v) for v in values]
+            lines.append(f"{col}: min {_format(min(numbers))}, max {_format(max(numbers))}, "
+                         f"mean {_format(statistics.fmean(numbers))}, median {_format(statistics.median(numbers))}")
+        elif all(isinstance(v, (date, datetime)) for v in values):
+            lines.append(f"{col}: earliest {_format(min(values))}, latest {_format(max(values))}")
+        else:
+            counts = Counter(_format(v) for v in values)
+            if len(counts) <= CATEGORICAL_MAX_DISTINCT or len(counts) < len(values) / 2:
+                top = ", ".join(f"{v} ({n})" for v, n in counts.most_common(TOP_VALUES))
+                more = f", +{len(counts) - TOP_VALUES} more" if len(counts) > TOP_VALUES else ""
+                lines.append(f"{col}: {len(counts)} distinct: {top}{more}")
+            else:
+                lines.append(f"{col}: {len(counts)} distinct values")
+    return "\n".join(lines)
+
+
+def sample_rows(rows: List[dict], k: int) -> List[dict]:
+    """The first rows (they carry any ORDER BY) plus rows spread evenly over the rest."""
+    if k >= len(rows):
+        return list(rows)
+    head = max(1, k // 2)
+    rest = rows[head:]
+    spread = k - head
+    step = len(rest) / spread if spread else 0
+    return list(rows[:head]) + [rest[int(i * step)] for i in range(spread)]
+
+
+class CompactResult:
+    __slots__ = ("text", "mode", "tokens")
+
+    def __init__(self, text: str, mode: str, tokens: int):
+        self.text = text
+        self.mode = mode      # "table" or "statistics"
+        self.tokens = tokens
+
+
+def compact_rows(rows: List[dict], question: str = "", budget: int = SUMMARY_TOKEN_BUDGET) -> CompactResult:
+    if not rows:
+        return CompactResult("(no rows)", "table", 1)
+
+    columns, constant = select_columns(rows, question)
+    header = _constant_line(constant)
+    table = render_tsv(rows, columns)
+    text = f"{header}\n{table}" if header else table
+    tokens = estimate_tokens(text)
+    if tokens <= budget:
+        return CompactResult(text, "table", tokens)
+
+    parts = [f"{len(rows)} rows in total; statistics over all of them, then a sample."]
+    if header:
+        parts.append(header)
+    parts.append(column_statistics(rows, columns))
+    used = estimate_tokens("\n".join(parts))
+
+    per_row = max(1.0, (tokens - estimate_tokens(header)) / len(rows))
+    k = max(1, int((budget - used) / per_row))
+    while True:
+        sample = render_tsv(sample_rows(rows, k), columns)
+        if estimate_tokens(sample) + used <= budget or k == 1:
+            break
+        k = max(1, int(k * 0.8))
+    parts.append(f"Sample of {min(k, len(rows))} rows (first rows in result order, then evenly spread):")
+    parts.append(sample)
+    text = "\n".join(parts)
+    return CompactResult(text, "statistics", estimate_tokens(text))
+
+
+def direct_answer(rows: List[dict], question: str = "") -> Optional[str]:
+    """Markdown answer for small, simple results, or None when the LLM should summarize."""
+    if not SUMMARY_DIRECT_ENABLED:
+        return None
+    notice = rows.notice() if hasattr(rows, "notice") else None
+    if not rows:
+        return "No matching records found."
+    if len(rows) > SUMMARY_DIRECT_MAX_ROWS:
+        return None
+
+    columns, constant = select_columns(rows, question)
+    if len(columns) + len(constant) > SUMMARY_DIRECT_MAX_COLUMNS:
+        return None
+
+    if len(rows) == 1 and len(rows[0]) == 1:
+        (col, value), = rows[0].items()
+        answer = f"**{col.replace('_', ' ').title()}:** {_format(value)}"
+    else:
+        answer = render_markdown_table(rows, columns + list(constant))
+        answer = f"Found **{len(rows)}** matching record{'s' if len(rows) != 1 else ''}.\n\n{answer}"
+    if notice:
+        answer += f"\n\n_{notice}_"
+    return answer
@@ -0,0 +1,120 @@
+# schema_context.py
+# Per-question schema section for the SQL prompt: only the tables and categorical values that
+# look relevant to the question (by embedding similarity), instead of the whole catalog.
+import os
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from database.schema import CATEGORICAL_COLUMNS, SchemaCatalog, find_mentions, get_schema_catalog
+from llm.embeddings import embed_query, get_query_model
+
+SCHEMA_PRUNING_ENABLED = os.getenv("SCHEMA_PRUNING_ENABLED", "true").lower() in ("1", "true", "yes")
+SCHEMA_PROMPT_TOP_TABLES = int(os.getenv("SCHEMA_PROMPT_TOP_TABLES", "3"))
+SCHEMA_PROMPT_MIN_SIMILARITY = float(os.getenv("SCHEMA_PROMPT_MIN_SIMILARITY", "0.35"))
+SCHEMA_PROMPT_VALUES_PER_GROUP = int(os.getenv("SCHEMA_PROMPT_VALUES_PER_GROUP", "8"))
+
+# Every question is about employees; this table is always in the prompt
+ROOT_TABLE = "employees"
+
+
+def _table_text(catalog: SchemaCatalog, table: str) -> str:
+    return f"{table.replace('_', ' ')}: {', '.join(c.replace('_', ' ') for c in catalog.columns(table))}"
+
+
+def _encode(texts: List[str]) -> np.ndarray:
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.asarray(get_query_model().encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+
+class SchemaIndex:
+    """Embeddings of table descriptions and categorical values for one catalog version."""
+
+    def __init__(self, catalog: SchemaCatalog):
+        self.catalog = catalog
+        self.table_names = list(catalog.tables)
+        self.table_vectors = _encode([_table_text(catalog, t) for t in self.table_names])
+        self.value_vectors = {label: _encode(values) for label, values in catalog.categorical.items()}
+
+    def select(self, question: str):
+        """Returns (tables, {label: values}) to show for this question."""
+        catalog = self.catalog
+        q_vec = embed_query(question)
+
+        scores = self.table_vectors @ q_vec if len(self.table_names) else np.zeros(0)
+        ranked = [self.table_names[i] for i in np.argsort(-scores)]
+        tables = {t for t in ranked[:SCHEMA_PROMPT_TOP_TABLES]}
+        tables.update(t for t, s in zip(self.table_names, scores) if s >= SCHEMA_PROMPT_MIN_SIMILARITY)
+        if ROOT_TABLE in catalog.tables:
+            tables.add(ROOT_TABLE)
+
+        values = {}
+        for label, group in catalog.categorical.items():
+            table = CATEGORICAL_COLUMNS[label][0]
+            mentioned = find_mentions(question, group)
+            if mentioned:
+                tables.add(table)
+            if table not in tables or not group:
+                continue
+            similar = np.argsort(-(self.value_vectors[label] @ q_vec))[:SCHEMA_PROMPT_VALUES_PER_GROUP]
+            picked = mentioned + [group[i] for i in sorted(similar) if group[i] not in mentioned]
+            values[label] = picked
+
+        tables = self._join_closure(tables)
+        return [t for t in self.table_names if t in tables], values
+
+    def _join_closure(self, tables: set) -> set:
+        """Add bridge tables (e.g. employee_skills) so every selected table can be joined to employees."""
+        if ROOT_TABLE not in self.catalog.tables:
+            return tables
+        out = set(tables)
+        for table in tables:
+            if table == ROOT_TABLE or ROOT_TABLE in self.catalog.neighbours(table):
+                continue
+            for bridge in self.catalog.neighbours(table):
+                if ROOT_TABLE in self.catalog.neighbours(bridge):
+                    out.add(bridge)
+                    break
+        return out
+
+
+_index: Optional[SchemaIndex] = None
+_index_lock = threading.Lock()
+
+
+def _get_index(catalog: SchemaCatalog) -> SchemaIndex:
+    global _index
+    with _index_lock:
+        if _index is None or _index.catalog.version != catalog.version:
+            _index = SchemaIndex(catalog)
+        return _index
+
+
+def render_schema(catalog: SchemaCatalog, tables: List[str]) -> str:
+    lines = []
+    for table in tables:
+        refs = catalog.references(table)
+        cols = [f"{c} -> {refs[c]}" if c in refs else c for c in catalog.columns(table)]
+        lines.append(f"{table}({', '.join(cols)})")
+    return "\n".join(lines)
+
+
+def render_values(values: dict) -> str:
+    return "\n".join(f"valid {label}: {', '.join(v)}" for label, v in values.items() if v)
+
+
+def build_schema_context(question: str, catalog: Optional[SchemaCatalog] = None):
+    """(schema_text, categorical_text) for the SQL prompt."""
+    catalog = catalog or get_schema_catalog()
+    if not SCHEMA_PRUNING_ENABLED:
+        return render_schema(catalog, list(catalog.tables)), render_values(catalog.categorical)
+
+    try:
+        tables, values = _get_index(catalog).select(question)
+    except Exception as e:
+        # Pruning is an optimisation; never fail SQL generation over it
+        print("[SCHEMA] Pruning failed, using full schema:", e)
+        return render_schema(catalog, list(catalog.tables)), render_values(catalog.categorical)
+    return render_schema(catalog, tables), render_values(values)
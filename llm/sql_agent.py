@@ -1,10 +1,20 @@
-from groq import Groq
+from groq import Groq, AsyncGroq
+import asyncio
+import hashlib
 import os
 from dotenv import load_dotenv
+
+from database.schema import get_schema_catalog
+from llm.schema_context import build_schema_context
+from llm.sql_cache import sql_cache
+from llm.sql_validator import validate_sql
 load_dotenv()
 
 # Load your Groq key from ENV
 client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+async_client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"))
+
+SQL_MODEL = "llama-3.3-70b-versatile"
 
 SQL_AGENT_PROMPT = """
 You are an expert SQL query generator for a PostgreSQL database.
@@ -26,50 +36,11 @@ IMPORTANT RULES:
 
 ======== DATABASE SCHEMA =========
 
-employees(employee_id, first_name, last_name, email, phone, date_of_birth,
-          gender, hire_date, employment_type, status, department_id, role_id,
-          years_experience, salary, location)
-
-departments(department_id, name)
-
-roles(role_id, name, description)
-
-skills(skill_id, name)
-
-employee_skills(employee_id, skill_id, proficiency)
-
-projects(project_id, name, domain, description)
-
-employee_projects(employee_id, project_id, role, contribution)
+{schema}
 
 ======== CATEGORICAL VALUES =========
 
-these are the valid role names:
-software engineer,
-senior software engineer,
-full stack developer,
-data engineer,
-data scientist,
-machine learning engineer,
-genai engineer,
-cloud architect,
-devops engineer,
-security engineer,
-product manager,
-ai research scientist,
-business analyst,
-finance analyst,
-people operations specialist
-
-these are the valid skills:
-python, sql,java,javascript,react,node.js,docker,kubernetes,aws,gcp,azure,machine learning,deep learning,genai,langchain,prompt engineering,
-data modeling,ci/cd,terraform,cybersecurity
-
-these are the valid employment types:
-full-time,contract,internship
-
-these are the  statuses:
-active,resigned,terminated,on-leave
+{categorical}
 
 
 ======== USER QUESTION =========
@@ -94,18 +65,68 @@ The output must be a single SQL statement.
 Give a executable ready SQL query
 """
 
-def generate_sql(user_query: str):
-    prompt = SQL_AGENT_PROMPT.format(query=user_query)
+SQL_CACHE_ENABLED = os.getenv("SQL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+_PROMPT_VERSION = hashlib.sha256(SQL_AGENT_PROMPT.encode()).hexdigest()[:16]
+
+def _current_schema():
+    catalog = get_schema_catalog()
+    # Cached SQL is tied to the prompt template and schema that produced it
+    sql_cache.set_schema_version(f"{_PROMPT_VERSION}:{catalog.version}")
+    return catalog
+
+def _build_prompt(user_query: str, catalog) -> str:
+    schema, categorical = build_schema_context(user_query, catalog)
+    return SQL_AGENT_PROMPT.format(schema=schema, categorical=categorical, query=user_query)
 
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=[
+def _remember(user_query: str, sql_output: str):
+    # Only validated SQL is worth replaying for other phrasings
+    ok, _ = validate_sql(sql_output)
+    if ok:
+        sql_cache.put(user_query, sql_output)
+
+def _sql_request(prompt: str) -> dict:
+    return {
+        "model": SQL_MODEL,
+        "messages": [
             {"role": "user", "content": prompt}
         ],
-        temperature=0.1,
-        max_tokens=512
-    )
+        "temperature": 0.1,
+        "max_tokens": 512,
+    }
+
+def generate_sql(user_query: str):
+    catalog = _current_schema()
+    if SQL_CACHE_ENABLED:
+        cached = sql_cache.get(user_query)
+        if cached:
+            return cached
+
+    prompt = _build_prompt(user_query, catalog)
+
+    response = client.chat.completions.create(**_sql_request(prompt))
+
+    sql_output = response.choices[0].message.content.strip()
+    print(sql_output)
+    if SQL_CACHE_ENABLED:
+        _remember(user_query, sql_output)
+    return sql_output
+
+async def generate_sql_async(user_query: str):
+    # May introspect the database on refresh
+    catalog = await asyncio.to_thread(_current_schema)
+    if SQL_CACHE_ENABLED:
+        # The similarity tier runs the embedding model; keep it off the event loop
+        cached = await asyncio.to_thread(sql_cache.get, user_query)
+        if cached:
+            return cached
+
+    prompt = await asyncio.to_thread(_build_prompt, user_query, catalog)
+
+    response = await async_client.chat.completions.create(**_sql_request(prompt))
 
     sql_output = response.choices[0].message.content.strip()
     print(sql_output)
-    return sql_output
\ No newline at end of file
+    if SQL_CACHE_ENABLED:
+        await asyncio.to_thread(_remember, user_query, sql_output)
+    return sql_output
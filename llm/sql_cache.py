@@ -0,0 +1,176 @@
+# sql_cache.py
+# Two-tier NL -> SQL cache: exact match on normalized text, then embedding similarity.
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, FrozenSet, Optional
+
+import numpy as np
+
+from database.schema import get_schema_catalog
+from llm.embeddings import embed_query
+
+_SPACES = re.compile(r"\s+")
+
+# Comparisons, spelled out or as symbols, and the numbers they apply to
+_COMPARISONS = {
+    "more than": ">", "greater than": ">", "over": ">", "above": ">", "older than": ">",
+    "less than": "<", "fewer than": "<", "under": "<", "below": "<", "younger than": "<",
+    "at least": ">=", "minimum of": ">=", "no less than": ">=",
+    "at most": "<=", "maximum of": "<=", "no more than": "<=", "up to": "<=",
+    "exactly": "=", "not": "!=",
+}
+_CONSTRAINT = re.compile(
+    r"(?<!\w)(?:" + "|".join(sorted(map(re.escape, _COMPARISONS), key=len, reverse=True)) + r")(?!\w)"
+    r"|[<>!]=|[<>=]|\d+(?:\.\d+)?"
+)
+
+
+def normalize_query(text: str) -> str:
+    # Case, spacing and trailing ?/. only: "> 5" vs "< 5" or "c++" vs "c#" are different questions
+    return _SPACES.sub(" ", text.lower()).strip().rstrip("?. ")
+
+
+def constraints(key: str) -> tuple:
+    """Comparison operators (canonical symbols) and numbers, in order of appearance."""
+    return tuple(_COMPARISONS.get(m, m) for m in _CONSTRAINT.findall(key))
+
+
+def vocabulary_mentions(text: str) -> FrozenSet[str]:
+    """Schema values the question names: skills, locations, roles, departments, statuses."""
+    return frozenset(value for value, _ in get_schema_catalog().vocabulary.mentions(text))
+
+
+class _Entry:
+    __slots__ = ("sql", "created_at", "embedding", "constraints", "mentions")
+
+    def __init__(self, sql, embedding, constraints, mentions):
+        self.sql = sql
+        self.created_at = time.monotonic()
+        self.embedding = embedding
+        self.constraints = constraints
+        self.mentions = mentions
+
+
+class SemanticSQLCache:
+    def __init__(
+        self,
+        max_size: int = 1000,
+        ttl: float = 3600.0,
+        similarity_threshold: float = 0.93,
+        embed_fn: Callable[[str], np.ndarray] = embed_query,
+        mentions_fn: Callable[[str], FrozenSet[str]] = vocabulary_mentions,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embed_fn = embed_fn
+        self.mentions_fn = mentions_fn
+        self.schema_version = None
+
+        self._entries = OrderedDict()   # normalized query -> _Entry, oldest first
+        self._matrix = None             # stacked embeddings, rebuilt lazily
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+        self._stats = {
+            "exact_hits_total": 0,
+            "similar_hits_total": 0,
+            "misses_total": 0,
+            "stores_total": 0,
+            "evictions_total": 0,
+            "invalidations_total": 0,
+        }
+
+    def _expired(self, entry: _Entry) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    def _similar(self, embedding: np.ndarray, constraints, mentions) -> Optional[str]:
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries.keys())
+            if not self._matrix_keys:
+                return None
+            self._matrix = np.stack([self._entries[k].embedding for k in self._matrix_keys])
+
+        scores = self._matrix @ embedding
+        for idx in np.argsort(-scores):
+            if scores[idx] < self.similarity_threshold:
+                break
+            key = self._matrix_keys[idx]
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry):
+                continue
+            # "more than 5 years", "less than 5 years" and "more than 10 years" embed almost identically
+            if entry.constraints != constraints:
+                continue
+            # ...and so do "python developers in pune" and "java developers in pune"
+            if entry.mentions != mentions:
+                continue
+            self._entries.move_to_end(key)
+            return entry.sql
+        return None
+
+    def get(self, user_query: str) -> Optional[str]:
+        key = normalize_query(user_query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry):
+                    self._entries.move_to_end(key)
+                    self._stats["exact_hits_total"] += 1
+                    return entry.sql
+                self._drop(key)
+            if not self._entries:
+                self._stats["misses_total"] += 1
+                return None
+
+        embedding = self.embed_fn(key)
+        mentions = self.mentions_fn(key)
+        with self._lock:
+            sql = self._similar(embedding, constraints(key), mentions)
+            self._stats["similar_hits_total" if sql else "misses_total"] += 1
+        return sql
+
+    def put(self, user_query: str, sql: str):
+        key = normalize_query(user_query)
+        embedding = self.embed_fn(key)
+        mentions = self.mentions_fn(key)
+        with self._lock:
+            self._entries[key] = _Entry(sql, embedding, constraints(key), mentions)
+            self._entries.move_to_end(key)
+            self._matrix = None
+            self._stats["stores_total"] += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions_total"] += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._stats["invalidations_total"] += 1
+
+    def set_schema_version(self, version: str):
+        """Cached SQL is only valid for the schema prompt that produced it."""
+        if version != self.schema_version:
+            if self.schema_version is not None:
+                self.invalidate()
+            self.schema_version = version
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        return stats
+
+
+sql_cache = SemanticSQLCache(
+    max_size=int(os.getenv("SQL_CACHE_MAX_SIZE", "1000")),
+    ttl=float(os.getenv("SQL_CACHE_TTL", "3600")),
+    similarity_threshold=float(os.getenv("SQL_CACHE_SIMILARITY", "0.93")),
+)
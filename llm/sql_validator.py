@@ -1,67 +1,229 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import FrozenSet, Optional
+
 import sqlglot
 from sqlglot import expressions as exp
 
-SCHEMA = {
-    "employees": ["employee_id", "first_name", "last_name", "email", "phone", "date_of_birth",
-                  "gender", "hire_date", "employment_type", "status", "department_id", "role_id",
-                  "domain", "years_experience", "salary", "location"],
-    "departments": ["department_id", "name"],
-    "roles": ["role_id", "name", "description"],
-    "skills": ["skill_id", "name"],
-    "employee_skills": ["employee_id", "skill_id", "proficiency"],
-    "projects": ["project_id", "name", "domain", "description"],
-    "employee_projects": ["employee_id", "project_id", "role", "contribution"],
+from database.schema import SchemaCatalog, get_schema_catalog
+
+SQL_VALIDATOR_CACHE_SIZE = int(os.getenv("SQL_VALIDATOR_CACHE_SIZE", "2048"))
+
+# Statements that must not appear anywhere in the tree (also inside CTEs and subqueries)
+FORBIDDEN_NODES = {
+    exp.Insert: "INSERT",
+    exp.Update: "UPDATE",
+    exp.Delete: "DELETE",
+    exp.Merge: "MERGE",
+    exp.Drop: "DROP",
+    exp.Create: "CREATE",
+    exp.Alter: "ALTER",
+    exp.TruncateTable: "TRUNCATE",
+    exp.Copy: "COPY",
+    exp.Grant: "GRANT",
+    exp.Lock: "LOCK",
+    exp.Set: "SET",
+    exp.Transaction: "BEGIN",
+    exp.Commit: "COMMIT",
+    exp.Into: "SELECT INTO",
+    exp.Command: "COMMAND",
 }
+_FORBIDDEN_TYPES = tuple(FORBIDDEN_NODES)
 
-ALLOWED_TABLES = set(SCHEMA.keys())
+# Functions with side effects or access outside the employee tables
+FORBIDDEN_FUNCTIONS = frozenset({
+    "pg_sleep", "pg_read_file", "pg_read_binary_file", "pg_ls_dir", "pg_stat_file",
+    "lo_import", "lo_export", "dblink", "dblink_exec", "pg_terminate_backend",
+    "pg_cancel_backend", "set_config", "pg_reload_conf", "current_setting", "query_to_xml",
+})
 
-FORBIDDEN_KEYWORDS = ["DELETE", "UPDATE", "INSERT", "DROP", "ALTER", "TRUNCATE", "CREATE"]
+ALLOWED_ROOTS = (exp.Select, exp.SetOperation)
 
-def validate_sql(sql: str):
-    sql_upper = sql.upper()
-
-    # 1. Block dangerous keywords
-    for keyword in FORBIDDEN_KEYWORDS:
-        if keyword in sql_upper:
-            return False, f"Forbidden operation detected: {keyword}"
-    
-    # 2. Parse SQL
+
+class SQLVerdict:
+    """
+    Outcome of validating one SQL string. `sql` is the normalized Postgres rendering of the
+    parsed statement (None if parsing failed) and is what gets cached and executed.
+    `ast` is shared between callers: copy it before transforming.
+    """
+    __slots__ = ("ok", "message", "tables", "ast", "_sql")
+
+    def __init__(self, ok: bool, message: str, tables: FrozenSet[str] = frozenset(),
+                 ast: Optional[exp.Expression] = None):
+        self.ok = ok
+        self.message = message
+        self.tables = tables
+        self.ast = ast
+        self._sql = None
+
+    @property
+    def sql(self) -> Optional[str]:
+        # Rendering costs about as much as parsing; only pay for it when someone needs it
+        if self._sql is None and self.ast is not None:
+            self._sql = self.ast.sql(dialect="postgres", normalize=True)
+        return self._sql
+
+    def __iter__(self):
+        # Unpacks like the old (ok, msg) tuple
+        return iter((self.ok, self.message))
+
+    def __repr__(self):
+        return f"SQLVerdict(ok={self.ok}, message={self.message!r})"
+
+
+def _check(ast: exp.Expression, schema: dict):
+    """Every rule in one walk over the tree; returns (error message or None, referenced tables)."""
+    if not isinstance(ast, ALLOWED_ROOTS):
+        return f"Only SELECT queries are allowed, got {ast.key.upper()}", frozenset()
+
+    tables = []          # exp.Table nodes
+    columns = []         # exp.Column nodes
+    cte_names = set()
+    derived = {}         # alias -> output column names of a CTE/subquery (None = unknown)
+    select_aliases = set()
+
+    for node in ast.walk():
+        if isinstance(node, _FORBIDDEN_TYPES):
+            return f"Forbidden operation detected: {FORBIDDEN_NODES[type(node)]}", frozenset()
+        if isinstance(node, exp.Table):
+            tables.append(node)
+        elif isinstance(node, exp.Column):
+            columns.append(node)
+        elif isinstance(node, exp.CTE):
+            cte_names.add(node.alias_or_name.lower())
+            derived[node.alias_or_name.lower()] = _output_names(node.this)
+        elif isinstance(node, exp.Subquery) and node.alias:
+            derived[node.alias.lower()] = _output_names(node.this)
+        elif isinstance(node, (exp.Unnest, exp.Lateral)) and node.alias:
+            derived[node.alias.lower()] = None
+        elif isinstance(node, exp.Alias):
+            select_aliases.add(node.alias.lower())
+        elif isinstance(node, exp.Func):
+            name = (node.name if isinstance(node, exp.Anonymous) else node.sql_name()).lower()
+            if name in FORBIDDEN_FUNCTIONS:
+                return f"Forbidden function: {name}", frozenset()
+
+    # Resolve table references: real tables by alias, CTE references are not tables
+    alias_to_table = {}
+    for t in tables:
+        name = t.name.lower()
+        if not t.db and name in cte_names:
+            derived.setdefault((t.alias or name).lower(), derived.get(name))
+            continue
+        if t.db and t.db.lower() != "public" or name not in schema:
+            return f"Unknown table: {t.sql(dialect='postgres')}", frozenset()
+        alias_to_table[(t.alias or name).lower()] = name
+    referenced = frozenset(alias_to_table.values())
+
+    unqualified = set()
+    for table in referenced:
+        unqualified.update(c.lower() for c in schema[table])
+    opaque = False
+    for names in derived.values():
+        if names is None:
+            opaque = True
+        else:
+            unqualified.update(names)
+
+    for col in columns:
+        if isinstance(col.this, exp.Star):
+            continue
+        name = col.name.lower()
+        qualifier = col.table.lower()
+        if qualifier:
+            if qualifier in alias_to_table:
+                if name not in (c.lower() for c in schema[alias_to_table[qualifier]]):
+                    return f"Unknown column: {qualifier}.{name}", referenced
+            elif qualifier in derived:
+                names = derived[qualifier]
+                if names is not None and name not in names:
+                    return f"Unknown column: {qualifier}.{name}", referenced
+            else:
+                return f"Unknown table alias: {qualifier}", referenced
+        elif name not in unqualified and name not in select_aliases and not opaque:
+            return f"Unknown column: {name}", referenced
+
+    return None, referenced
+
+
+def _output_names(query: exp.Expression):
+    """Column names a CTE/subquery exposes, or None if it selects * (not resolved)."""
+    if not isinstance(query, exp.Query):
+        return None
+    names = set()
+    for projection in query.selects:
+        if isinstance(projection, exp.Star) or isinstance(getattr(projection, "this", None), exp.Star):
+            return None
+        names.add(projection.alias_or_name.lower())
+    return names
+
+
+def _analyze(sql: str, catalog: SchemaCatalog) -> SQLVerdict:
     try:
-        ast = sqlglot.parse_one(sql)
+        statements = [s for s in sqlglot.parse(sql, read="postgres") if s is not None]
     except Exception as e:
-        return False, f"SQL parsing error: {str(e)}"
-    
-     # Helper
-    def safe_name(x):
-        if x is None:
-            return None
-        if isinstance(x, str):
-            return x.lower()
-        if hasattr(x, "this"):
-            return str(x.this).lower()
-        return str(x).lower()
-
-    # 3. Validate tables 
-    real_tables = set()
-
-    for t in ast.find_all(exp.Table):
-        table_name = safe_name(t.this)
-        if table_name in ALLOWED_TABLES:
-            real_tables.add(table_name)
-
-    for t in real_tables:
-        if t not in ALLOWED_TABLES:
-            return False, f"Unknown table: {t}"
-    
-    # 4. Validate columns 
-    valid_columns = set()
-    for table in real_tables:
-        valid_columns.update([c.lower() for c in SCHEMA[table]])
-
-    for col in ast.find_all(exp.Column):
-        column_name = col.name.lower()  # ignore alias/table prefix
-
-        if column_name not in valid_columns and column_name != '*':
-            return False, f"Unknown column: {column_name}"
-    
-    return True, "OK"
+        return SQLVerdict(False, f"SQL parsing error: {str(e)}")
+    if len(statements) != 1:
+        return SQLVerdict(False, "Exactly one SQL statement is allowed")
+
+    ast = statements[0]
+    error, tables = _check(ast, catalog.tables)
+    if error:
+        return SQLVerdict(False, error, tables, ast)
+    return SQLVerdict(True, "OK", tables, ast)
+
+
+class _VerdictCache:
+    def __init__(self, max_size: int = SQL_VALIDATOR_CACHE_SIZE):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            verdict = self._data.get(key)
+            if verdict is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return verdict
+
+    def put(self, key, verdict: SQLVerdict):
+        with self._lock:
+            self._data[key] = verdict
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+verdict_cache = _VerdictCache()
+
+
+def check_sql(sql: str, catalog: Optional[SchemaCatalog] = None) -> SQLVerdict:
+    """Parse once (Postgres dialect), validate, and memoize the verdict per SQL + schema version."""
+    catalog = catalog or get_schema_catalog()
+    key = (hashlib.sha256(sql.encode()).digest(), catalog.version)
+    verdict = verdict_cache.get(key)
+    if verdict is None:
+        verdict = _analyze(sql, catalog)
+        verdict_cache.put(key, verdict)
+    return verdict
+
+
+def validate_sql(sql: str):
+    verdict = check_sql(sql)
+    return verdict.ok, verdict.message
+
@@ -1,9 +1,14 @@
-from groq import Groq
+from groq import Groq, AsyncGroq
 import os
 from dotenv import load_dotenv
+
+from llm.result_compactor import compact_rows, direct_answer, estimate_tokens
 load_dotenv()
 
 client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+async_client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"))
+
+SUMMARY_MODEL = "llama-3.3-70b-versatile"
 
 SUMMARY_PROMPT_SQL = """
 You are an AI assistant that summarizes database query results for HR or analytics purposes.
@@ -33,7 +38,7 @@ USER QUESTION:
 SQL EXECUTED:
 {sql}
 
-DATABASE ROWS:
+DATABASE ROWS (tab-separated; large results are given as statistics plus a sample):
 {rows}
 
 Now summarize the results in a natural readable way:
@@ -69,35 +74,86 @@ VECTOR DB EXTRACTED CONTENT:
 Now summarize the results in a natural readable way:
 """
 
-def summarize_answer_sql(user_query: str, sql: str, rows: list):
-    
+def _sql_summary_prompt(user_query: str, sql: str, rows: list) -> str:
+    compact = compact_rows(rows, user_query)
+    rows_text = compact.text
+    notice = rows.notice() if hasattr(rows, "notice") else None
+    if notice:
+        # Don't let the model present a partial result as the full answer
+        rows_text += f"\n\nNOTE: {notice} Say so in the answer."
     prompt = SUMMARY_PROMPT_SQL.format(
         query=user_query,
         sql=sql,
-        rows=str(rows)
+        rows=rows_text
     )
-    print(prompt)
+    print(f"[SUMMARY] {len(rows)} rows -> {compact.mode}, ~{estimate_tokens(prompt)} prompt tokens")
+    return prompt
 
+def _vector_summary_prompt(user_query: str, summary: str) -> str:
+    # summary was already pruned to FALLBACK_CONTEXT_TOKENS by database/context_builder.py
+    prompt = SUMMARY_PROMPT_VECTOR.format(
+        query=user_query,
+        summary=summary or "(no sufficiently similar records were found; say so)"
+    )
+    print(f"[SUMMARY] vector context -> ~{estimate_tokens(prompt)} prompt tokens")
+    return prompt
+
+def _complete(prompt: str) -> str:
     response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile", 
+        model=SUMMARY_MODEL,
         messages=[{"role": "user", "content": prompt}],
         temperature=0.5,
     )
-
     return response.choices[0].message.content.strip()
 
-def summarize_answer_vector(user_query: str, summary: str):
-    
-    prompt = SUMMARY_PROMPT_VECTOR.format(
-        query=user_query,
-        summary = summary
+async def _complete_async(prompt: str) -> str:
+    response = await async_client.chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.5,
     )
-    print(prompt)
+    return response.choices[0].message.content.strip()
 
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile", 
+async def _stream_async(prompt: str):
+    stream = await async_client.chat.completions.create(
+        model=SUMMARY_MODEL,
         messages=[{"role": "user", "content": prompt}],
         temperature=0.5,
+        stream=True,
     )
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            yield delta
+
+def summarize_answer_sql(user_query: str, sql: str, rows: list):
+    # Small, simple results are rendered directly; no second LLM call
+    direct = direct_answer(rows, user_query)
+    if direct is not None:
+        return direct
+    return _complete(_sql_summary_prompt(user_query, sql, rows))
 
-    return response.choices[0].message.content.strip()
\ No newline at end of file
+def summarize_answer_vector(user_query: str, summary: str):
+    return _complete(_vector_summary_prompt(user_query, summary))
+
+async def summarize_answer_sql_async(user_query: str, sql: str, rows: list):
+    direct = direct_answer(rows, user_query)
+    if direct is not None:
+        return direct
+    return await _complete_async(_sql_summary_prompt(user_query, sql, rows))
+
+async def summarize_answer_vector_async(user_query: str, summary: str):
+    return await _complete_async(_vector_summary_prompt(user_query, summary))
+
+async def stream_answer_sql_async(user_query: str, sql: str, rows: list):
+    """Yields the answer in pieces as the model produces them."""
+    direct = direct_answer(rows, user_query)
+    if direct is not None:
+        yield direct
+        return
+    async for delta in _stream_async(_sql_summary_prompt(user_query, sql, rows)):
+        yield delta
+
+async def stream_answer_vector_async(user_query: str, summary: str):
+    async for delta in _stream_async(_vector_summary_prompt(user_query, summary)):
+        yield delta
@@ -0,0 +1,136 @@
+# validator_benchmark.py
+# Micro-benchmark for llm/sql_validator.py over a generated corpus of queries.
+# Runs against the static schema, so no database is needed.
+#
+#   python -m llm.validator_benchmark --queries 2000 --repeat 5
+import argparse
+import random
+import time
+
+import sqlglot
+from sqlglot import expressions as exp
+
+from database.schema import STATIC_FOREIGN_KEYS, STATIC_SCHEMA, SchemaCatalog
+from llm.sql_validator import _analyze, check_sql, verdict_cache
+
+
+def _legacy_validate(sql: str, schema: dict):
+    """The previous validator (substring keyword scan + dialect-less parse), as a baseline."""
+    sql_upper = sql.upper()
+    for keyword in ["DELETE", "UPDATE", "INSERT", "DROP", "ALTER", "TRUNCATE", "CREATE"]:
+        if keyword in sql_upper:
+            return False
+    try:
+        ast = sqlglot.parse_one(sql)
+    except Exception:
+        return False
+    real_tables = {t.name.lower() for t in ast.find_all(exp.Table) if t.name.lower() in schema}
+    valid_columns = set()
+    for table in real_tables:
+        valid_columns.update(schema[table])
+    for col in ast.find_all(exp.Column):
+        if col.name.lower() not in valid_columns and col.name != "*":
+            return False
+    return True
+
+
+def generate_corpus(n: int, seed: int = 7):
+    """(sql, expected_ok) pairs: joins, aliases, CTEs, subqueries and a share of bad queries."""
+    rng = random.Random(seed)
+    emp_cols = [c for c in STATIC_SCHEMA["employees"] if c not in ("employee_id",)]
+    numbers = ["years_experience", "salary"]
+    corpus = []
+
+    def simple():
+        cols = ", ".join(f"e.{c}" for c in rng.sample(emp_cols, 3))
+        return (f"SELECT {cols} FROM employees e WHERE e.{rng.choice(numbers)} > {rng.randint(1, 20)} "
+                f"LIMIT {rng.randint(5, 50)}", True)
+
+    def skills_join():
+        return (f"SELECT e.first_name, e.last_name, s.name AS skill FROM employees e "
+                f"JOIN employee_skills es ON es.employee_id = e.employee_id "
+                f"JOIN skills s ON s.skill_id = es.skill_id "
+                f"WHERE LOWER(s.name) = '{rng.choice(['python', 'sql', 'aws', 'react'])}' "
+                f"ORDER BY e.{rng.choice(numbers)} DESC", True)
+
+    def cte():
+        return (f"WITH senior AS (SELECT employee_id, salary FROM employees "
+                f"WHERE years_experience >= {rng.randint(3, 15)}) "
+                f"SELECT d.name, COUNT(*) AS headcount, AVG(s.salary) AS avg_salary FROM senior s "
+                f"JOIN employees e ON e.employee_id = s.employee_id "
+                f"JOIN departments d ON d.department_id = e.department_id "
+                f"GROUP BY d.name ORDER BY headcount DESC", True)
+
+    def subquery():
+        return (f"SELECT x.role_name, x.n FROM (SELECT r.name AS role_name, COUNT(*) AS n "
+                f"FROM employees e JOIN roles r ON r.role_id = e.role_id GROUP BY r.name) x "
+                f"WHERE x.n > {rng.randint(1, 10)}", True)
+
+    def keyword_in_name():
+        # Rejected by the old substring scan; valid SQL
+        return (f"SELECT e.first_name FROM employees e WHERE e.status = 'active' "
+                f"AND LOWER(e.location) LIKE '%update%' LIMIT {rng.randint(5, 50)}", True)
+
+    def bad_column():
+        return (f"SELECT e.first_name, e.nickname FROM employees e LIMIT {rng.randint(5, 50)}", False)
+
+    def bad_table():
+        return (f"SELECT * FROM payroll WHERE amount > {rng.randint(1, 9)}", False)
+
+    def dml():
+        return (f"DELETE FROM employees WHERE employee_id = {rng.randint(1, 999)}", False)
+
+    def stacked():
+        return (f"SELECT 1; DROP TABLE employees", False)
+
+    generators = [simple, skills_join, cte, subquery, keyword_in_name,
+                  simple, skills_join, bad_column, bad_table, dml, stacked]
+    for _ in range(n):
+        corpus.append(rng.choice(generators)())
+    return corpus
+
+
+def _time(fn, corpus, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for sql, _ok in corpus:
+            fn(sql)
+    return (time.perf_counter() - start) / (repeat * len(corpus)) * 1e6
+
+
+def run(queries: int, repeat: int):
+    catalog = SchemaCatalog(STATIC_SCHEMA, STATIC_FOREIGN_KEYS)
+    corpus = generate_corpus(queries)
+
+    legacy_us = _time(lambda sql: _legacy_validate(sql, STATIC_SCHEMA), corpus, repeat)
+    parse_us = _time(lambda sql: _analyze(sql, catalog), corpus, repeat)
+    verdict_cache.clear()
+    cold_start = time.perf_counter()
+    for sql, _ok in corpus:
+        check_sql(sql, catalog)
+    memo_cold_us = (time.perf_counter() - cold_start) / len(corpus) * 1e6
+    memo_warm_us = _time(lambda sql: check_sql(sql, catalog), corpus, repeat)
+
+    legacy_wrong = sum(_legacy_validate(sql, STATIC_SCHEMA) != ok for sql, ok in corpus)
+    new_wrong = sum(check_sql(sql, catalog).ok != ok for sql, ok in corpus)
+    distinct = len({sql for sql, _ in corpus})
+
+    print(f"{len(corpus)} queries ({distinct} distinct), {repeat} repetitions")
+    print(f"{'validator':<26}{'us/query':>10}")
+    print(f"{'legacy':<26}{legacy_us:>10.1f}")
+    print(f"{'single-parse, no memo':<26}{parse_us:>10.1f}")
+    print(f"{'memoized, first pass':<26}{memo_cold_us:>10.1f}")
+    print(f"{'memoized, warm':<26}{memo_warm_us:>10.1f}")
+    print(f"wrong verdicts: legacy {legacy_wrong}, new {new_wrong}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SQL validator")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.queries, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,30 @@
 from fastapi import FastAPI, Request, Form
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
 from pydantic import BaseModel
 from groq import Groq
+import asyncio
+import json
 import os
 from dotenv import load_dotenv
 
-from llm.sql_agent import generate_sql
-from llm.sql_validator import validate_sql
-from llm.summarizer import summarize_answer_sql, summarize_answer_vector
-from database.fallback_handler import semantic_fallback
-from database.db import run_sql_query
+from llm.sql_agent import generate_sql, generate_sql_async
+from llm.sql_validator import validate_sql, verdict_cache
+from llm.summarizer import summarize_answer_sql, summarize_answer_vector, summarize_answer_sql_async, summarize_answer_vector_async
+from llm.summarizer import stream_answer_sql_async, stream_answer_vector_async
+from database.fallback_handler import semantic_fallback, semantic_fallback_async, warm_up_fallback
+from database.db import run_sql_query, run_sql_query_async
+from database.executors import run_db, run_vector, shutdown_executors
+from database.pool import close_pool, pool_metrics
+from database.metrics import render_metrics
+from llm.sql_cache import sql_cache
+from database.result_cache import result_cache
+from database.schema import schema_provider
+from database.query_guard import guard_metrics
+from llm.embeddings import get_query_encoder
+from llm.intent_router import intent_router
 
 load_dotenv()
 
@@ -21,41 +34,161 @@ app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
 
 client = Groq(api_key = os.getenv("GROQ_API_KEY"))
 
+# Send "X-Bypass-Cache: 1" to force a fresh database read when debugging
+BYPASS_CACHE_HEADER = "x-bypass-cache"
+
+# Start the vector search while SQL is being generated so the fallback branch costs no extra round-trip
+SPECULATIVE_FALLBACK = os.getenv("SPECULATIVE_FALLBACK", "true").lower() in ("1", "true", "yes")
+
+# Debugging aid: treat every generated query as invalid so answers come from the semantic fallback
+FORCE_SEMANTIC_FALLBACK = os.getenv("FORCE_SEMANTIC_FALLBACK", "false").lower() in ("1", "true", "yes")
+
 class QueryRequest(BaseModel):
     query: str
 
+@app.on_event("startup")
+async def startup():
+    # Open Chroma and load the HNSW segment before the first request needs it
+    await run_vector(warm_up_fallback)
+
+@app.on_event("shutdown")
+def shutdown():
+    shutdown_executors()
+    close_pool()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return (
+        render_metrics("nl2sql_db_pool", pool_metrics())
+        + render_metrics("nl2sql_sql_cache", sql_cache.stats())
+        + render_metrics("nl2sql_result_cache", result_cache.stats())
+        + render_metrics("nl2sql_schema", schema_provider.metrics())
+        + render_metrics("nl2sql_sql_validator", verdict_cache.stats())
+        + render_metrics("nl2sql_query_guard", guard_metrics())
+        + render_metrics("nl2sql_query_encoder", get_query_encoder().metrics())
+        + render_metrics("nl2sql_intent_router", intent_router.metrics())
+    )
+
 @app.get("/")
 def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
-@app.post("/query")
-def query(request: Request, user_query: str = Form(...)):
-    sql_query = generate_sql(user_query)
+def _discard(task: asyncio.Task):
+    # The executor thread cannot be interrupted; just make sure nobody waits on it or logs its error
+    task.cancel()
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+async def _answer_events(user_query: str, bypass: bool = False, stream: bool = False):
+    """
+    The query pipeline as (event, data) pairs: "stage" events as it progresses, then the
+    answer as "token" events (a single one unless stream=True), or an "error".
+    """
+    # Common question shapes are answered from a vetted SQL template, with no LLM call
+    routed = await run_db(intent_router.answer, user_query)
+    if routed is not None:
+        yield "stage", {"stage": "sql_generated", "sql": routed.sql, "valid": True,
+                        "message": f"Answered by the '{routed.match.intent}' template"}
+        yield "stage", {"stage": "rows_fetched", "rows": len(routed.rows), "notice": routed.rows.notice()}
+        yield "token", {"text": routed.answer}
+        return
+
+    fallback_task = None
+    if SPECULATIVE_FALLBACK:
+        fallback_task = asyncio.create_task(semantic_fallback_async(user_nl_query = user_query))
+
+    try:
+        sql_query = await generate_sql_async(user_query)
+
+        # sqlglot parsing, and a schema catalog refresh from Postgres, would block the event loop
+        ok, msg = await run_db(validate_sql, sql_query)
+        if ok and FORCE_SEMANTIC_FALLBACK:
+            ok, msg = False, "FORCE_SEMANTIC_FALLBACK is set"
+        yield "stage", {"stage": "sql_generated", "sql": sql_query, "valid": ok, "message": msg}
+
+        if ok:
+            rows, db_msg = await run_sql_query_async(sql_query, bypass_cache=bypass)
+            if rows is None:
+                yield "error", {"error": db_msg, "sql": sql_query}
+                return
+            notice = rows.notice() if hasattr(rows, "notice") else None
+            yield "stage", {"stage": "rows_fetched", "rows": len(rows), "notice": notice}
+            if stream:
+                async for delta in stream_answer_sql_async(user_query, sql_query, rows):
+                    yield "token", {"text": delta}
+            else:
+                yield "token", {"text": await summarize_answer_sql_async(user_query, sql_query, rows)}
+
+        else:
+            if fallback_task is None:
+                fallback_task = asyncio.create_task(semantic_fallback_async(user_nl_query = user_query))
+            relevant_docs = await fallback_task
+            summary = relevant_docs['summary']
+            yield "stage", {"stage": "fallback", "sql": "Failed to generate SQL query!!!"}
+            if stream:
+                async for delta in stream_answer_vector_async(user_query, summary):
+                    yield "token", {"text": delta}
+            else:
+                yield "token", {"text": await summarize_answer_vector_async(user_query, summary)}
+
+    finally:
+        if fallback_task is not None and not fallback_task.done():
+            _discard(fallback_task)
+
+def _bypass(request: Request) -> bool:
+    return request.headers.get(BYPASS_CACHE_HEADER, "").lower() in ("1", "true", "yes")
 
-    ok, msg = validate_sql(sql_query)
-    ok = False
-
-    if ok:
-        rows, db_msg = run_sql_query(sql_query)
-        if rows is None:
-            return templates.TemplateResponse("index.html", {
-                "request": request,
-                "error": db_msg,
-                "sql": sql_query,
-                "answer": None
-            })
-        answer = summarize_answer_sql(user_query, sql_query, rows)
-
-    else:
-        relevant_docs = semantic_fallback(user_nl_query = user_query)
-        summary = relevant_docs['summary']
-        answer = summarize_answer_vector(user_query, summary)
-        sql_query = "Failed to generate SQL query!!!"
+@app.post("/query")
+async def query(request: Request, user_query: str = Form(...)):
+    sql_query, answer, notice, error = None, "", None, None
+    async for event, data in _answer_events(user_query, bypass=_bypass(request)):
+        if event == "stage":
+            sql_query = data.get("sql", sql_query)
+            notice = data.get("notice", notice)
+        elif event == "token":
+            answer += data["text"]
+        elif event == "error":
+            error = data["error"]
+
+    if error is not None:
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "error": error,
+            "sql": sql_query,
+            "answer": None
+        })
 
     return templates.TemplateResponse("index.html", {
         "request": request,
         "sql": sql_query,
-        "answer": answer
+        "answer": answer,
+        "notice": notice
+    })
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.get("/query/stream")
+async def query_stream(request: Request, user_query: str):
+    """Server-sent events: stage updates, then the answer token by token, then "done"."""
+    async def events():
+        # Sent straight away so the browser has its first byte before any model call
+        yield _sse("stage", {"stage": "started"})
+        pipeline = _answer_events(user_query, bypass=_bypass(request), stream=True)
+        try:
+            async for event, data in pipeline:
+                if await request.is_disconnected():
+                    return
+                yield _sse(event, data)
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+        finally:
+            # Cancels the speculative fallback if the client went away mid-answer
+            await pipeline.aclose()
+        yield _sse("done", {})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
     })
 
 '''
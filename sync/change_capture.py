@@ -0,0 +1,244 @@
+# change_capture.py
+# Optional push-based change capture. Triggers on the source tables publish changed keys over
+# NOTIFY; a listener thread debounces them and hands batches to the incremental sync.
+# The updated_at polling sync keeps running as a (slower) reconciliation pass.
+import os
+import select
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+import psycopg2
+
+from database.pool import connect_kwargs, connection
+
+NOTIFY_CHANNEL = os.getenv("SYNC_NOTIFY_CHANNEL", "vector_sync")
+
+# table -> key column published in the payload
+CAPTURED_TABLES = {
+    "employees": "employee_id",
+    "employee_skills": "employee_id",
+    "employee_projects": "employee_id",
+    "skills": "skill_id",
+    "roles": "role_id",
+    "departments": "department_id",
+    "projects": "project_id",
+}
+# Tables whose key is an employee id; the rest are resolved to employees at sync time
+EMPLOYEE_KEYED = {table for table, key in CAPTURED_TABLES.items() if key == "employee_id"}
+
+TRIGGER_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION vector_sync_notify() RETURNS trigger AS $$
+DECLARE
+    row_data jsonb;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        row_data := to_jsonb(OLD);
+    ELSE
+        row_data := to_jsonb(NEW);
+    END IF;
+    PERFORM pg_notify(TG_ARGV[1], TG_TABLE_NAME || ':' || (row_data ->> TG_ARGV[0]));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS vector_sync_notify ON {table};
+CREATE TRIGGER vector_sync_notify
+    AFTER INSERT OR UPDATE OR DELETE ON {table}
+    FOR EACH ROW EXECUTE FUNCTION vector_sync_notify('{key}', '{channel}');
+"""
+
+
+def install_triggers(channel: str = NOTIFY_CHANNEL):
+    """Idempotent; needs a role allowed to create functions and triggers."""
+    with connection(readonly=False) as conn:
+        with conn.cursor() as cur:
+            cur.execute(TRIGGER_FUNCTION_SQL)
+            for table, key in CAPTURED_TABLES.items():
+                cur.execute(TRIGGER_SQL.format(table=table, key=key, channel=channel))
+        conn.commit()
+    print(f"[CDC] Triggers installed on {', '.join(CAPTURED_TABLES)} (channel '{channel}')")
+
+
+def parse_payload(payload: str) -> Optional[Tuple[str, int]]:
+    table, _, key = payload.partition(":")
+    if table not in CAPTURED_TABLES or not key:
+        return None
+    try:
+        return table, int(key)
+    except ValueError:
+        return None
+
+
+class ChangeListener:
+    def __init__(
+        self,
+        on_ready: Callable[[], None],
+        channel: str = NOTIFY_CHANNEL,
+        debounce: float = 1.0,
+        max_delay: float = 10.0,
+        max_batch: int = 5000,
+    ):
+        self.on_ready = on_ready
+        self.channel = channel
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+
+        self._employee_ids: Set[int] = set()
+        self._related: Dict[str, Set[int]] = {}
+        self._first_at = None
+        self._last_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.notifications_total = 0
+        self.reconnects_total = 0
+
+    # ---------------- buffer ----------------
+
+    def _add(self, table: str, key: int):
+        now = time.monotonic()
+        with self._lock:
+            if table in EMPLOYEE_KEYED:
+                self._employee_ids.add(key)
+            else:
+                self._related.setdefault(table, set()).add(key)
+            self._first_at = self._first_at or now
+            self._last_at = now
+            self.notifications_total += 1
+
+    def _size(self) -> int:
+        return len(self._employee_ids) + sum(len(keys) for keys in self._related.values())
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._size()
+
+    def drain(self) -> Tuple[Set[int], Dict[str, Set[int]]]:
+        """(employee ids, {lookup table: keys})"""
+        with self._lock:
+            employee_ids, self._employee_ids = self._employee_ids, set()
+            related, self._related = self._related, {}
+            self._first_at = self._last_at = None
+        return employee_ids, related
+
+    def requeue(self, employee_ids: Set[int], related: Dict[str, Set[int]]):
+        """Put drained keys back after a failed sync; the next run picks them up."""
+        now = time.monotonic()
+        with self._lock:
+            self._employee_ids |= employee_ids
+            for table, keys in related.items():
+                self._related.setdefault(table, set()).update(keys)
+            self._first_at = self._first_at or now
+            self._last_at = self._last_at or now
+
+    def _due(self) -> bool:
+        with self._lock:
+            if self._first_at is None:
+                return False
+            now = time.monotonic()
+            size = self._size()
+            return (
+                now - self._last_at >= self.debounce
+                or now - self._first_at >= self.max_delay
+                or size >= self.max_batch
+            )
+
+    # ---------------- listener thread ----------------
+
+    def _listen_once(self):
+        conn = psycopg2.connect(**connect_kwargs())
+        try:
+            conn.set_session(autocommit=True)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {self.channel}")
+            print(f"[CDC] Listening on '{self.channel}'")
+            # Anything changed while we were disconnected is picked up by the polling reconcile
+            signalled = False
+            while not self._stop.is_set():
+                if select.select([conn], [], [], min(self.debounce, 1.0)) != ([], [], []):
+                    conn.poll()
+                    while conn.notifies:
+                        parsed = parse_payload(conn.notifies.pop(0).payload)
+                        if parsed:
+                            self._add(*parsed)
+                            signalled = False
+                if self._due() and not signalled:
+                    # Signal once per quiet window; the sync run drains the buffer
+                    signalled = True
+                    self.on_ready()
+        finally:
+            conn.close()
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                self._listen_once()
+                backoff = 1.0
+            except Exception as e:
+                self.reconnects_total += 1
+                print(f"[CDC] Listener error, reconnecting in {backoff:.0f}s:", e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="cdc-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def metrics(self) -> dict:
+        return {
+            "pending_keys": self.pending(),
+            "notifications_total": self.notifications_total,
+            "reconnects_total": self.reconnects_total,
+        }
+
+
+def listener_from_env(on_ready) -> ChangeListener:
+    return ChangeListener(
+        on_ready,
+        debounce=float(os.getenv("SYNC_CDC_DEBOUNCE", "1")),
+        max_delay=float(os.getenv("SYNC_CDC_MAX_DELAY", "10")),
+        max_batch=int(os.getenv("SYNC_CDC_MAX_BATCH", "5000")),
+    )
+
+
+def make_sync_runner(listener: Optional[ChangeListener], poll_fn, changes_fn, reconcile_interval: float):
+    """
+    Build the scheduler's run function. Pending notified keys are applied first; the
+    polling sync still runs, but only every reconcile_interval seconds when CDC is on.
+    """
+    state = {"last_poll": 0.0}
+
+    def run():
+        if listener is None:
+            return poll_fn()
+
+        processed = 0
+        statuses = []
+        employee_ids, related = listener.drain()
+        if employee_ids or related:
+            try:
+                result = changes_fn(employee_ids, related)
+            except Exception:
+                # Otherwise the keys would wait for the next reconcile poll
+                listener.requeue(employee_ids, related)
+                raise
+            processed += result.get("rows_processed", 0)
+            statuses.append(result["status"])
+
+        if time.monotonic() - state["last_poll"] >= reconcile_interval:
+            result = poll_fn()
+            state["last_poll"] = time.monotonic()
+            processed += result.get("rows_processed", 0)
+            statuses.append(result["status"])
+
+        return {"status": "+".join(statuses) or "NO_UPDATES", "rows_processed": processed}
+
+    return run
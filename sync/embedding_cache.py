@@ -0,0 +1,144 @@
+# embedding_cache.py
+# Local SQLite store of document vectors keyed by (model, content hash), so re-ingests and
+# syncs only encode text the model has not seen before. Bounded to EMBEDDING_CACHE_MAX_ENTRIES
+# vectors; the least recently used are evicted first.
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from llm.embeddings import EMBEDDING_MODEL_NAME
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite")
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# ~1.5 KB per MiniLM vector; 0 = unbounded
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# SQLite caps the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, model_name: str = EMBEDDING_MODEL_NAME,
+                 max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.evictions_total = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                used_at REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (model, content_hash)
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if "used_at" not in columns:
+            # Caches created before eviction existed; their rows count as least recently used
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_used_at ON embeddings (used_at)")
+        self._conn.commit()
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        with self._lock:
+            for i in range(0, len(hashes), _LOOKUP_BATCH):
+                part = hashes[i:i + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT content_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND content_hash IN ({placeholders})",
+                    [self.model_name, *part],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    hit = [h for h, _ in rows]
+                    self._conn.execute(
+                        f"UPDATE embeddings SET used_at = ? "
+                        f"WHERE model = ? AND content_hash IN ({','.join('?' * len(hit))})",
+                        [time.time(), self.model_name, *hit],
+                    )
+            self._conn.commit()
+        return found
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        if not vectors:
+            return
+        now = time.time()
+        rows = [
+            (self.model_name, h, np.asarray(v, dtype=np.float32).tobytes(), now)
+            for h, v in vectors.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, content_hash, vector, used_at) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Called with the lock held. Vectors of a previous model are never read again and go first
+        if self.max_entries <= 0:
+            return
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN ("
+                "SELECT rowid FROM embeddings ORDER BY model = ?, used_at LIMIT ?)",
+                (self.model_name, excess),
+            )
+            self.evictions_total += excess
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    global _cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
+
+
+def encode_with_cache(embedder, contents, hashes, cache: Optional[EmbeddingCache] = None) -> np.ndarray:
+    """Encode only contents whose hash is not cached yet; returns vectors in input order."""
+    if cache is None:
+        return embedder.encode(contents)
+
+    cached = cache.get_many(hashes)
+    missing = [i for i, h in enumerate(hashes) if h not in cached]
+    if missing:
+        fresh = embedder.encode([contents[i] for i in missing])
+        new = {hashes[i]: vec for i, vec in zip(missing, fresh)}
+        cache.put_many(new)
+        cached.update(new)
+
+    return np.stack([cached[h] for h in hashes]) if hashes else embedder.encode([])
@@ -0,0 +1,98 @@
+# embedding_service.py
+# One resident embedding model for the sync service, shared by the incremental and full paths.
+import os
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from llm.embeddings import EMBEDDING_MODEL_NAME
+
+
+class EmbeddingService:
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL_NAME,
+        batch_size: int = 64,
+        device: Optional[str] = None,
+        num_threads: Optional[int] = None,
+        backend: str = "torch",
+        onnx_file: Optional[str] = None,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.backend = backend
+
+        if num_threads:
+            # onnxruntime reads this when the session is created
+            os.environ.setdefault("OMP_NUM_THREADS", str(num_threads))
+            import torch
+            torch.set_num_threads(num_threads)
+
+        from sentence_transformers import SentenceTransformer
+
+        kwargs = {"device": device}
+        if backend == "onnx":
+            kwargs["backend"] = "onnx"
+            if onnx_file:
+                # e.g. "onnx/model_qint8_avx512_vnni.onnx" for the int8-quantized export
+                kwargs["model_kwargs"] = {"file_name": onnx_file}
+
+        start = time.perf_counter()
+        self.model = SentenceTransformer(model_name, **kwargs)
+        # encode() may be reached from the scheduler thread and a manual trigger at once
+        self._lock = threading.Lock()
+        print(f"[EMBEDDING] Loaded {model_name} ({backend}) on {self.model.device} "
+              f"in {time.perf_counter() - start:.2f}s")
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        with self._lock:
+            return self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            ).astype(np.float32, copy=False)
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def benchmark(self, num_docs: int = 256) -> float:
+        sample = [
+            f"Employee Sample {i} (ID: {i}). Works in engineering. Experience: {i % 20} years. "
+            f"Skills: python (expert), sql (intermediate), docker (beginner). "
+            f"Employment Type: full-time. Status: active. Location: Bangalore."
+            for i in range(num_docs)
+        ]
+        self.encode(sample[: self.batch_size])   # warm-up
+        start = time.perf_counter()
+        self.encode(sample)
+        elapsed = time.perf_counter() - start
+        rate = num_docs / elapsed if elapsed else float("inf")
+        print(f"[EMBEDDING] Benchmark: {num_docs} docs in {elapsed:.2f}s -> {rate:.1f} docs/sec "
+              f"(batch_size={self.batch_size})")
+        return rate
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                threads = os.getenv("EMBEDDING_THREADS")
+                _service = EmbeddingService(
+                    batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "64")),
+                    device=os.getenv("EMBEDDING_DEVICE") or None,
+                    num_threads=int(threads) if threads else None,
+                    backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+                    onnx_file=os.getenv("EMBEDDING_ONNX_FILE") or None,
+                )
+    return _service
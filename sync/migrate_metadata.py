@@ -0,0 +1,164 @@
+# migrate_metadata.py
+# One-shot migration of a collection written with the old metadata schema (full raw_json /
+# skills_json blobs on every vector) to the slim one: flat filter fields, row_id, updated_at
+# and content_hash. Documents and vectors are copied as they are, nothing is re-embedded.
+#
+# Legacy raw_json blobs predate the role/department joins, so those two fields are filled
+# from Postgres (one = ANY(...) query per batch) for vectors that lack them.
+#
+# Slimming in place is not possible (Chroma merges metadata on update), so the copy goes into
+# a fresh versioned collection and the alias is swapped, like a blue/green rebuild.
+#
+#   python -m sync.migrate_metadata --dry-run
+#   python -m sync.migrate_metadata --keep 1
+import argparse
+import json
+import os
+
+from chromadb import PersistentClient
+
+from database.chroma_store import CHROMA_PATH, COLLECTION_NAME, resolve_collection_name, swap_alias
+from database.hybrid_search import FILTER_FIELDS, SKILL_PREFIX, flatten_metadata
+from database.pool import connection
+from database.records import row_key
+from database.watermarks import fetch_table_watermarks
+from sync.rebuild import REBUILD_KEEP_VERSIONS, garbage_collect, versioned_name
+from sync.sync_state import get_state_store
+
+MIGRATE_BATCH_SIZE = int(os.getenv("MIGRATE_BATCH_SIZE", "1000"))
+
+SLIM_FIELDS = {"table", "row_id", "updated_at", "content_hash", "years_experience", *FILTER_FIELDS.values()}
+LEGACY_FIELDS = ("raw_json", "skills_json")
+LOOKUP_FIELDS = ("role", "department")
+
+LOOKUP_NAMES_SQL = """
+    SELECT e.employee_id, r.name AS role_name, d.name AS department_name
+    FROM employees e
+    LEFT JOIN roles r ON r.role_id = e.role_id
+    LEFT JOIN departments d ON d.department_id = e.department_id
+    WHERE e.employee_id = ANY(%s)
+"""
+
+
+def is_slim_field(key: str) -> bool:
+    return key in SLIM_FIELDS or key.startswith(SKILL_PREFIX)
+
+
+def slim_metadata(meta: dict) -> dict:
+    """Keep the slim fields; derive the flat filter fields from the blobs if they are missing."""
+    meta = meta or {}
+    slim = {k: v for k, v in meta.items() if is_slim_field(k) and v is not None}
+    if "raw_json" in meta and not any(f in slim for f in FILTER_FIELDS.values()):
+        # Written before the flat fields existed
+        try:
+            emp = json.loads(meta["raw_json"])
+            skills = json.loads(meta.get("skills_json") or "[]")
+            slim.update(flatten_metadata(emp, skills))
+        except (TypeError, ValueError):
+            pass
+    return slim
+
+
+def fill_lookup_fields(conn, metadatas: list) -> int:
+    """Fill role/department in place for employee vectors missing them; returns how many changed."""
+    missing = {}
+    for meta in metadatas:
+        if meta.get("table", "employee") == "employee" and meta.get("row_id") is not None \
+                and not all(f in meta for f in LOOKUP_FIELDS):
+            missing.setdefault(row_key(meta["row_id"]), []).append(meta)
+    if not missing:
+        return 0
+
+    filled = 0
+    with conn.cursor() as cur:
+        cur.execute(LOOKUP_NAMES_SQL, (list(missing),))
+        for employee_id, role_name, department_name in cur.fetchall():
+            names = flatten_metadata({"role_name": role_name, "department_name": department_name}, [])
+            for meta in missing.get(employee_id, []):
+                before = len(meta)
+                for field in LOOKUP_FIELDS:
+                    if field in names:
+                        meta.setdefault(field, names[field])
+                filled += len(meta) > before
+    return filled
+
+
+def _batches(collection, include, batch_size):
+    offset = 0
+    while True:
+        batch = collection.get(include=include, limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            return
+        yield batch
+        offset += len(batch["ids"])
+
+
+def scan_legacy(collection, batch_size: int = MIGRATE_BATCH_SIZE) -> dict:
+    total, legacy, legacy_bytes = 0, 0, 0
+    for batch in _batches(collection, ["metadatas"], batch_size):
+        for meta in batch["metadatas"]:
+            total += 1
+            dropped = {k: v for k, v in (meta or {}).items() if not is_slim_field(k)}
+            if dropped:
+                legacy += 1
+                legacy_bytes += sum(len(str(v)) for v in dropped.values())
+    return {"vectors": total, "legacy_vectors": legacy, "legacy_bytes": legacy_bytes}
+
+
+def migrate_collection(chroma_path: str = CHROMA_PATH, alias: str = COLLECTION_NAME,
+                       dry_run: bool = False, keep: int = REBUILD_KEEP_VERSIONS,
+                       batch_size: int = MIGRATE_BATCH_SIZE) -> dict:
+    client = PersistentClient(path=chroma_path)
+    live_name = resolve_collection_name(chroma_path, alias)
+    live = client.get_collection(live_name)
+
+    report = scan_legacy(live, batch_size)
+    print(f"[MIGRATE] {live_name}: {report}")
+    if dry_run or not report["legacy_vectors"]:
+        status = "DRY_RUN" if dry_run else "ALREADY_SLIM"
+        return {"status": status, "collection": live_name, **report}
+
+    # Incremental syncs into the live collection during the copy are replayed after the swap
+    with connection() as conn:
+        start_watermarks = fetch_table_watermarks(conn)
+
+    new_name = versioned_name(alias)
+    new = client.create_collection(new_name, metadata=dict(live.metadata or {}))
+    copied, filled = 0, 0
+    for batch in _batches(live, ["documents", "metadatas", "embeddings"], batch_size):
+        metadatas = [slim_metadata(m) for m in batch["metadatas"]]
+        with connection() as conn:
+            filled += fill_lookup_fields(conn, metadatas)
+        new.add(
+            ids=batch["ids"],
+            documents=batch["documents"],
+            metadatas=metadatas,
+            embeddings=batch["embeddings"],
+        )
+        copied += len(batch["ids"])
+        print(f"[MIGRATE] Copied {copied}/{report['vectors']}")
+
+    if new.count() != live.count():
+        client.delete_collection(new_name)
+        raise RuntimeError(f"{new_name} has {new.count()} vectors, {live_name} has {live.count()}; "
+                           f"keeping {live_name} live")
+
+    swap_alias(chroma_path, alias, new_name)
+    get_state_store().save(start_watermarks, rewind=True)
+    print(f"[MIGRATE] '{alias}' now points at {new_name}")
+    dropped = garbage_collect(client, chroma_path, alias, keep)
+    return {"status": "MIGRATED", "collection": new_name, "copied": copied,
+            "lookup_fields_filled": filled, "dropped": dropped, **report}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move the vector collection to the slim metadata schema")
+    parser.add_argument("--dry-run", action="store_true", help="only report how much would be dropped")
+    parser.add_argument("--keep", type=int, default=REBUILD_KEEP_VERSIONS,
+                        help="previous versions to keep for rollback")
+    args = parser.parse_args()
+    print(migrate_collection(dry_run=args.dry_run, keep=args.keep))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# parallel_ingest.py
+# Sharded full re-ingest: employee_id ranges are extracted and embedded by a process pool,
+# a single writer (the parent) upserts into Chroma.
+#
+#   python -m sync.parallel_ingest --workers 16
+#   python -m sync.parallel_ingest --benchmark 1,2,4,8,16 --limit 20000
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List, Optional, Tuple
+
+from database.chroma_store import CHROMA_PATH, resolve_collection_name
+from database.pool import connection
+
+PARALLEL_INGEST_WORKERS = int(os.getenv("PARALLEL_INGEST_WORKERS", "1"))
+PARALLEL_CHUNK_SIZE = int(os.getenv("PARALLEL_CHUNK_SIZE", "1000"))
+
+_worker = {}
+
+
+def shard_ranges(chunk_size: int, limit: Optional[int] = None) -> List[Tuple[int, int]]:
+    """Inclusive employee_id ranges of ~chunk_size rows each, balanced with ntile()."""
+    with connection() as conn:
+        with conn.cursor() as cur:
+            if limit:
+                cur.execute("SELECT count(*) FROM (SELECT 1 FROM employees LIMIT %s) t", (limit,))
+            else:
+                cur.execute("SELECT count(*) FROM employees")
+            total = cur.fetchone()[0]
+            if not total:
+                return []
+            shards = max(1, -(-total // chunk_size))
+            cur.execute("""
+                SELECT MIN(employee_id), MAX(employee_id)
+                FROM (
+                    SELECT employee_id, ntile(%s) OVER (ORDER BY employee_id) AS shard
+                    FROM (SELECT employee_id FROM employees ORDER BY employee_id LIMIT %s) ids
+                ) t
+                GROUP BY shard
+                ORDER BY shard
+            """, (shards, total))
+            return [(lo, hi) for lo, hi in cur.fetchall()]
+
+
+def _init_worker(num_threads: int):
+    # Runs once per worker process (spawned, so no pool or model state is inherited)
+    from sync.embedding_cache import get_embedding_cache
+    from sync.embedding_service import EmbeddingService
+
+    _worker["embedder"] = EmbeddingService(
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "64")),
+        device=os.getenv("EMBEDDING_DEVICE") or None,
+        num_threads=num_threads,
+        backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+        onnx_file=os.getenv("EMBEDDING_ONNX_FILE") or None,
+    )
+    _worker["cache"] = get_embedding_cache()
+
+
+def _embed_shard(id_range: Tuple[int, int]):
+    from sync.pg_extract import iter_employee_documents
+    from sync.vector_ingest import embed_documents
+
+    start = time.perf_counter()
+    docs = list(iter_employee_documents(id_range=id_range))
+    if not docs:
+        return None, 0.0
+    result = embed_documents(_worker["embedder"], docs, _worker["cache"])
+    return result, time.perf_counter() - start
+
+
+def parallel_ingest(
+    workers: int = PARALLEL_INGEST_WORKERS,
+    chunk_size: int = PARALLEL_CHUNK_SIZE,
+    persist_dir: str = CHROMA_PATH,
+    collection_name: Optional[str] = None,
+    dry_run: bool = False,
+    limit: Optional[int] = None,
+) -> dict:
+    """
+    Returns {"rows_processed", "seconds", "docs_per_sec"}. dry_run skips the Chroma writes
+    (used by the benchmark). Not resumable; interrupted runs simply start over.
+    """
+    from sync.vector_ingest import VectorDB, insert_into_chroma
+
+    ranges = shard_ranges(chunk_size, limit)
+    print(f"[PARALLEL INGEST] {len(ranges)} shards across {workers} workers")
+
+    collection = None
+    if not dry_run:
+        db = VectorDB(persist_dir=persist_dir)
+        db.get_or_create_collection(collection_name or resolve_collection_name(persist_dir))
+        collection = db.collection
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    ctx = multiprocessing.get_context("spawn")
+    written = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(threads,)) as pool:
+        pending = set()
+        todo = iter(ranges)
+        # Keep a bounded number of shards in flight so results can't pile up in the parent
+        max_in_flight = workers * 2
+
+        def refill():
+            for id_range in todo:
+                pending.add(pool.submit(_embed_shard, id_range))
+                if len(pending) >= max_in_flight:
+                    break
+
+        refill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                result, _elapsed = future.result()
+                if result is None:
+                    continue
+                ids, contents, metadatas, embeddings = result
+                if collection is not None:
+                    insert_into_chroma(collection, ids, contents, metadatas, embeddings)
+                written += len(ids)
+            refill()
+            elapsed = time.perf_counter() - start
+            print(f"[PARALLEL INGEST] {written} documents ({written / elapsed:.1f} docs/sec)")
+
+    seconds = time.perf_counter() - start
+    return {
+        "rows_processed": written,
+        "seconds": seconds,
+        "docs_per_sec": written / seconds if seconds else 0.0,
+    }
+
+
+def benchmark(worker_counts: List[int], chunk_size: int, limit: Optional[int]):
+    """Extract + encode throughput per worker count; nothing is written to Chroma."""
+    rows = []
+    for workers in worker_counts:
+        result = parallel_ingest(workers=workers, chunk_size=chunk_size, dry_run=True, limit=limit)
+        rows.append((workers, result))
+
+    base = rows[0][1]["docs_per_sec"] or 1.0
+    print("\nworkers  docs  seconds  docs/sec  per-worker  speedup")
+    for workers, r in rows:
+        print(f"{workers:>7}  {r['rows_processed']:>4}  {r['seconds']:>7.1f}  {r['docs_per_sec']:>8.1f}"
+              f"  {r['docs_per_sec'] / workers:>10.1f}  {r['docs_per_sec'] / base:>6.2f}x")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel full re-ingest of employees into Chroma")
+    parser.add_argument("--workers", type=int, default=max(PARALLEL_INGEST_WORKERS, os.cpu_count() or 1))
+    parser.add_argument("--chunk-size", type=int, default=PARALLEL_CHUNK_SIZE)
+    parser.add_argument("--benchmark", help="comma-separated worker counts, e.g. 1,2,4,8 (dry run)")
+    parser.add_argument("--limit", type=int, help="only the first N employees (benchmarking)")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark([int(w) for w in args.benchmark.split(",")], args.chunk_size, args.limit)
+        return
+
+    from database.chroma_store import mark_collection_updated
+    from database.watermarks import fetch_table_watermarks
+    from sync.sync_state import get_state_store
+
+    with connection() as conn:
+        start_watermarks = fetch_table_watermarks(conn)
+    result = parallel_ingest(workers=args.workers, chunk_size=args.chunk_size, limit=args.limit)
+    mark_collection_updated(CHROMA_PATH)
+    if not args.limit:
+        # The sync service continues incrementally from here
+        get_state_store().save(start_watermarks)
+    print(f"Ingested {result['rows_processed']} documents in {result['seconds']:.1f}s "
+          f"({result['docs_per_sec']:.1f} docs/sec)")
+
+
+if __name__ == "__main__":
+    main()
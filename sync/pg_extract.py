@@ -1,24 +1,20 @@
 # pg_extract.py
 import os
-import json
 import psycopg2
 import psycopg2.extras
 from datetime import datetime
 from typing import List, Dict, Any
-from dotenv import load_dotenv
 from datetime import date, datetime
 from decimal import Decimal
 
-load_dotenv()
+from database.hybrid_search import flatten_metadata
+from database.pool import connection
+from sync.embedding_cache import content_hash
 
-def get_connection():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
-        database=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD")
-    )
+
+def get_connection(**kwargs):
+    """Pooled connection shared with the main server; use as a context manager."""
+    return connection(**kwargs)
 
 def make_json_safe(obj):
     if isinstance(obj, dict):
@@ -42,24 +38,103 @@ def make_json_safe(obj):
     else:
         return obj
     
-def fetch_employees(conn):
-    sql = """
-        SELECT * FROM employees;
-    """
-    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute(sql)
-        return [dict(r) for r in cur.fetchall()]
-
-def fetch_employee_skills(conn, emp_id):
-    sql = """
-        SELECT es.skill_id, es.updated_at, es.proficiency, s.name AS skill_name, s.updated_at AS skill_updated_at
+EXTRACT_ITERSIZE = int(os.getenv("EXTRACT_ITERSIZE", "2000"))
+
+# One set-based query per extract: the employee row plus role, department, skills and
+# projects aggregated server-side. {emp_filter}/{link_filter} narrow it to a set of ids.
+EMPLOYEE_DOCUMENT_SQL = """
+    SELECT e.*,
+           r.name AS role_name,
+           d.name AS department_name,
+           COALESCE(sk.skills, '[]'::json) AS skills,
+           COALESCE(pr.projects, '[]'::json) AS projects
+    FROM employees e
+    LEFT JOIN roles r ON r.role_id = e.role_id
+    LEFT JOIN departments d ON d.department_id = e.department_id
+    LEFT JOIN (
+        SELECT es.employee_id,
+               json_agg(json_build_object(
+                   'skill_id', es.skill_id,
+                   'updated_at', es.updated_at,
+                   'proficiency', es.proficiency,
+                   'skill_name', s.name,
+                   'skill_updated_at', s.updated_at
+               ) ORDER BY s.name) AS skills
         FROM employee_skills es
         JOIN skills s ON s.skill_id = es.skill_id
-        WHERE es.employee_id = %s;
+        {link_filter}
+        GROUP BY es.employee_id
+    ) sk ON sk.employee_id = e.employee_id
+    LEFT JOIN (
+        SELECT ep.employee_id,
+               json_agg(json_build_object(
+                   'project_id', p.project_id,
+                   'name', p.name,
+                   'domain', p.domain,
+                   'role', ep.role
+               ) ORDER BY p.name) AS projects
+        FROM employee_projects ep
+        JOIN projects p ON p.project_id = ep.project_id
+        {project_filter}
+        GROUP BY ep.employee_id
+    ) pr ON pr.employee_id = e.employee_id
+    {emp_filter}
+    ORDER BY e.employee_id
+"""
+
+def _employee_document_sql(conditions) -> str:
+    """conditions are fragments on the employee_id column, written as "{col} > %(after_id)s"."""
+    def where(col):
+        if not conditions:
+            return ""
+        return "WHERE " + " AND ".join(c.format(col=col) for c in conditions)
+
+    return EMPLOYEE_DOCUMENT_SQL.format(
+        link_filter=where("es.employee_id"),
+        project_filter=where("ep.employee_id"),
+        emp_filter=where("e.employee_id"),
+    )
+
+def iter_employee_rows(conn, employee_ids=None, itersize: int = EXTRACT_ITERSIZE, after_id=None, id_range=None):
     """
-    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-        cur.execute(sql, (emp_id,))
-        return [dict(r) for r in cur.fetchall()]
+    Stream joined employee rows through a server-side (named) cursor so the table is
+    never fully materialized in Python. Each row carries 'skills' and 'projects' lists.
+    Rows come back ordered by employee_id. Filters: an explicit id set, a resume point
+    (after_id), or an inclusive (lo, hi) id range for sharded ingests.
+    """
+    conditions, params = [], {}
+    if employee_ids is not None:
+        conditions.append("{col} = ANY(%(ids)s)")
+        params["ids"] = list(employee_ids)
+    if after_id is not None:
+        conditions.append("{col} > %(after_id)s")
+        params["after_id"] = after_id
+    if id_range is not None:
+        conditions.append("{col} BETWEEN %(lo)s AND %(hi)s")
+        params["lo"], params["hi"] = id_range
+
+    with conn.cursor(name="employee_documents", cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.itersize = itersize
+        cur.execute(_employee_document_sql(conditions), params)
+        for row in cur:
+            yield dict(row)
+
+def document_from_row(row):
+    emp = dict(row)
+    skills = emp.pop("skills", None) or []
+    return build_employee_document(emp, skills)
+
+def fetch_employee_documents(conn, employee_ids):
+    """Documents for a set of employee ids in one round-trip; missing ids are skipped."""
+    if not employee_ids:
+        return []
+    return [document_from_row(row) for row in iter_employee_rows(conn, employee_ids)]
+
+def iter_employee_documents(itersize: int = EXTRACT_ITERSIZE, after_id=None, id_range=None):
+    # A full extract can outlive the default per-statement timeout
+    with get_connection(statement_timeout_ms=0) as conn:
+        for row in iter_employee_rows(conn, itersize=itersize, after_id=after_id, id_range=id_range):
+            yield document_from_row(row)
 
 def build_employee_document(emp, skills):
     """
@@ -80,6 +155,12 @@ def build_employee_document(emp, skills):
     content = (
         f"Employee {full_name} (ID: {emp['employee_id']}). "
         f"Works in {emp.get('domain', 'Unknown domain')}. "
+    )
+    if emp.get("role_name"):
+        content += f"Role: {emp['role_name']}. "
+    if emp.get("department_name"):
+        content += f"Department: {emp['department_name']}. "
+    content += (
         f"Experience: {emp.get('years_experience', 'NA')} years. "
         f"Skills: {skill_text}. "
         f"Employment Type: {emp.get('employment_type')}. "
@@ -87,19 +168,22 @@ def build_employee_document(emp, skills):
         f"Location: {emp.get('location')}. "
         f"Hire Date: {emp.get('hire_date')}. "
     )
+    if emp.get("projects"):
+        project_text = ", ".join(p["name"] for p in emp["projects"] if p.get("name"))
+        content += f"Projects: {project_text}. "
 
-    safe_emp = make_json_safe(emp)
-    safe_skills = make_json_safe(skills)
-
-    # Metadata
+    # Metadata: only what Chroma filters on plus what the sync compares. The full row and
+    # skills are read from Postgres when needed (database/records.py), not copied here.
     metadata = {
         "table": "employee",
         "row_id": emp["employee_id"],
-        "updated_at": safe_emp.get("updated_at"),  
-        "skills_json": json.dumps(safe_skills),   # 👍 FIXED
-        "raw_json": json.dumps(safe_emp),         # 👍 FIXED
-        "extracted_at": datetime.utcnow().isoformat() + "Z",
+        "updated_at": make_json_safe(emp.get("updated_at")),
+        "content_hash": content_hash(content),    # unchanged hash -> skip re-embedding
+        # status, location, role, skill_<name> flags, ...: the fallback's `where` prefilters
+        **flatten_metadata(emp, skills),
     }
+    # Chroma rejects None metadata values
+    metadata = {k: v for k, v in metadata.items() if v is not None}
 
     doc = {
         "id": f"employee:{emp['employee_id']}",
@@ -112,21 +196,7 @@ def build_employee_document(emp, skills):
     return doc
 
 def extract_all_employee_documents():
-    conn = get_connection()
-    documents = []
-
-    try:
-        employees = fetch_employees(conn)
-        for emp in employees:
-            emp_id = emp["employee_id"]
-            skills = fetch_employee_skills(conn, emp_id)
-            doc = build_employee_document(emp, skills)
-            documents.append(doc)
-
-    finally:
-        conn.close()
-
-    return documents
+    return list(iter_employee_documents())
 
 if __name__ == "__main__":
     import os
@@ -0,0 +1,155 @@
+# rebuild.py
+# Blue/green rebuild: ingest into a fresh versioned collection, validate it against the live
+# one, swap the alias pointer, then drop versions that are no longer needed.
+#
+#   python -m sync.rebuild
+#   python -m sync.rebuild --force --keep 2
+import argparse
+import os
+import random
+import time
+from typing import Optional
+
+from chromadb import PersistentClient
+
+from database.chroma_store import (
+    CHROMA_PATH,
+    COLLECTION_NAME,
+    read_alias_pointer,
+    resolve_collection_name,
+    swap_alias,
+)
+from database.pool import connection
+from database.watermarks import fetch_table_watermarks
+from sync.embedding_service import get_embedding_service
+from sync.parallel_ingest import PARALLEL_INGEST_WORKERS, parallel_ingest
+from sync.pg_extract import iter_employee_documents
+from sync.sync_state import get_state_store
+from sync.vector_ingest import ingest_documents
+
+REBUILD_SAMPLE_SIZE = int(os.getenv("REBUILD_SAMPLE_SIZE", "50"))
+REBUILD_TOP_K = int(os.getenv("REBUILD_TOP_K", "10"))
+# Share of sampled documents that must find themselves in the new collection's top-k
+REBUILD_MIN_SELF_RECALL = float(os.getenv("REBUILD_MIN_SELF_RECALL", "0.95"))
+# Average top-k overlap with the live collection. Lower it when switching embedding models.
+REBUILD_MIN_LIVE_OVERLAP = float(os.getenv("REBUILD_MIN_LIVE_OVERLAP", "0.6"))
+REBUILD_KEEP_VERSIONS = int(os.getenv("REBUILD_KEEP_VERSIONS", "1"))
+
+
+class RebuildValidationError(Exception):
+    pass
+
+
+def versioned_name(alias: str = COLLECTION_NAME) -> str:
+    return f"{alias}__v{time.strftime('%Y%m%d%H%M%S')}"
+
+
+def validate_rebuild(client, live_name: Optional[str], new_name: str, embedder,
+                     sample_size: int = REBUILD_SAMPLE_SIZE, top_k: int = REBUILD_TOP_K) -> dict:
+    new = client.get_collection(new_name)
+
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM employees")
+            expected = cur.fetchone()[0]
+    count = new.count()
+    report = {"expected_count": expected, "count": count}
+    if count != expected:
+        raise RebuildValidationError(f"{new_name} has {count} vectors, employees has {expected} rows")
+    if not count:
+        return report
+
+    sample_ids = new.get(include=[])["ids"]
+    sample_ids = random.sample(sample_ids, min(sample_size, len(sample_ids)))
+    sample = new.get(ids=sample_ids, include=["documents"])
+    query_vectors = embedder.encode(sample["documents"])
+
+    new_hits = new.query(query_embeddings=query_vectors, n_results=top_k, include=[])["ids"]
+    self_recall = sum(doc_id in hits for doc_id, hits in zip(sample["ids"], new_hits)) / len(sample["ids"])
+    report["self_recall"] = self_recall
+    if self_recall < REBUILD_MIN_SELF_RECALL:
+        raise RebuildValidationError(f"self-recall@{top_k} {self_recall:.2f} < {REBUILD_MIN_SELF_RECALL}")
+
+    live = None
+    if live_name and live_name != new_name:
+        try:
+            live = client.get_collection(live_name)
+        except Exception:
+            live = None
+    if live is not None and live.count():
+        live_hits = live.query(query_embeddings=query_vectors, n_results=top_k, include=[])["ids"]
+        overlap = sum(len(set(a) & set(b)) / top_k for a, b in zip(new_hits, live_hits)) / len(new_hits)
+        report["live_overlap"] = overlap
+        if overlap < REBUILD_MIN_LIVE_OVERLAP:
+            raise RebuildValidationError(f"top-{top_k} overlap with live {overlap:.2f} < {REBUILD_MIN_LIVE_OVERLAP}")
+
+    return report
+
+
+def garbage_collect(client, chroma_path: str = CHROMA_PATH, alias: str = COLLECTION_NAME,
+                    keep: int = REBUILD_KEEP_VERSIONS) -> list:
+    """Drop old versions of the alias, keeping the active one plus `keep` previous for rollback."""
+    pointer = read_alias_pointer(chroma_path, alias)
+    protected = {pointer["collection"], *pointer.get("history", [])[:keep]}
+    dropped = []
+    for name in [c.name if hasattr(c, "name") else c for c in client.list_collections()]:
+        if (name == alias or name.startswith(f"{alias}__v")) and name not in protected:
+            client.delete_collection(name)
+            dropped.append(name)
+    if dropped:
+        print(f"[REBUILD] Dropped old collections: {', '.join(dropped)}")
+    return dropped
+
+
+def rebuild_collection(chroma_path: str = CHROMA_PATH, alias: str = COLLECTION_NAME,
+                       embedder=None, force: bool = False, keep: int = REBUILD_KEEP_VERSIONS) -> dict:
+    embedder = embedder or get_embedding_service()
+    live_name = resolve_collection_name(chroma_path, alias)
+    new_name = versioned_name(alias)
+    print(f"[REBUILD] Building {new_name} (live: {live_name})")
+
+    # Via /sync/rebuild this runs on the sync worker, so incremental syncs wait until it is done;
+    # from the CLI the service may keep syncing into the live collection. Either way, changes
+    # made after this point are replayed from here after the swap
+    with connection() as conn:
+        start_watermarks = fetch_table_watermarks(conn)
+
+    if PARALLEL_INGEST_WORKERS > 1:
+        written = parallel_ingest(persist_dir=chroma_path, collection_name=new_name)["rows_processed"]
+    else:
+        written = ingest_documents(iter_employee_documents(), persist_dir=chroma_path,
+                                   embedder=embedder, collection_name=new_name)
+
+    client = PersistentClient(path=chroma_path)
+    try:
+        report = validate_rebuild(client, live_name, new_name, embedder)
+        print(f"[REBUILD] Validation passed: {report}")
+    except RebuildValidationError as e:
+        if not force:
+            print(f"[REBUILD] Validation failed, keeping {live_name} live:", e)
+            client.delete_collection(new_name)
+            raise
+        report = {"forced": True, "error": str(e)}
+        print("[REBUILD] Validation failed but --force given:", e)
+
+    swap_alias(chroma_path, alias, new_name)
+    get_state_store().save(start_watermarks, rewind=True)
+    print(f"[REBUILD] '{alias}' now points at {new_name}")
+
+    dropped = garbage_collect(client, chroma_path, alias, keep)
+    return {"status": "REBUILD_DONE", "rows_processed": written, "collection": new_name,
+            "validation": report, "dropped": dropped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Blue/green rebuild of the employee vector collection")
+    parser.add_argument("--force", action="store_true", help="swap even if validation fails")
+    parser.add_argument("--keep", type=int, default=REBUILD_KEEP_VERSIONS,
+                        help="previous versions to keep for rollback")
+    args = parser.parse_args()
+    result = rebuild_collection(force=args.force, keep=args.keep)
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
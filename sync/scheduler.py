@@ -0,0 +1,181 @@
+# scheduler.py
+# Runs the blocking sync in a worker thread, one run at a time, on an adaptive interval.
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class SyncScheduler:
+    def __init__(
+        self,
+        run_fn: Callable[[], dict],
+        base_interval: float = 60.0,
+        min_interval: float = 5.0,
+        max_interval: float = 300.0,
+        backoff: float = 2.0,
+        backlog_rows: int = 256,
+        queue_depth_fn: Optional[Callable[[], int]] = None,
+    ):
+        self.run_fn = run_fn
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.backlog_rows = backlog_rows
+        self.queue_depth_fn = queue_depth_fn
+
+        self.interval = base_interval
+        # Single worker: a sync never runs concurrently with another one
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sync")
+        self._current: Optional[asyncio.Future] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._rerun = False
+        self._stopped = False
+
+        self._status = {
+            "running": False,
+            "runs_total": 0,
+            "errors_total": 0,
+            "coalesced_triggers_total": 0,
+            "last_started_at": None,
+            "last_finished_at": None,
+            "last_duration_seconds": None,
+            "last_result": None,
+            "last_error": None,
+            "last_rows_processed": 0,
+            "rows_processed_total": 0,
+        }
+
+    # ---------------- interval ----------------
+
+    def _adapt_interval(self, rows: int):
+        if rows >= self.backlog_rows:
+            # Big batch of changes: more are likely queued behind it
+            self.interval = self.min_interval
+        elif rows > 0:
+            self.interval = max(self.min_interval, self.interval / self.backoff)
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+
+    # ---------------- runs ----------------
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        self._status["running"] = True
+        self._status["last_started_at"] = time.time()
+        try:
+            result = await loop.run_in_executor(self._executor, self.run_fn)
+        except Exception as e:
+            self._status["errors_total"] += 1
+            self._status["last_error"] = str(e)
+            self.interval = self.base_interval
+            raise
+        else:
+            rows = (result or {}).get("rows_processed", 0)
+            self._status["last_result"] = result
+            self._status["last_error"] = None
+            self._status["last_rows_processed"] = rows
+            self._status["rows_processed_total"] += rows
+            self._adapt_interval(rows)
+            return result
+        finally:
+            self._status["running"] = False
+            self._status["runs_total"] += 1
+            self._status["last_finished_at"] = time.time()
+            self._status["last_duration_seconds"] = time.monotonic() - start
+
+    async def trigger(self, rerun_if_busy: bool = True):
+        """
+        Start a sync, or join the one already in flight. A trigger that arrives mid-run is
+        coalesced: it waits for the current run and schedules exactly one follow-up run.
+        """
+        if self._current is not None and not self._current.done():
+            self._status["coalesced_triggers_total"] += 1
+            if rerun_if_busy:
+                self._rerun = True
+                self.wake()
+            return await asyncio.shield(self._current)
+
+        self._current = asyncio.ensure_future(self._run())
+        return await asyncio.shield(self._current)
+
+    async def run_exclusive(self, fn: Callable[[], dict]):
+        """Run fn on the sync worker thread, so it never overlaps a sync (e.g. a full rebuild)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn)
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def request_run(self):
+        """Ask for a run as soon as possible (e.g. change capture has a batch ready)."""
+        if self._current is not None and not self._current.done():
+            self._rerun = True
+        self.wake()
+
+    async def run_forever(self):
+        self._wake = asyncio.Event()
+        while not self._stopped:
+            print("[SYNC SERVICE] Running background sync...")
+            self._wake.clear()
+            try:
+                await self.trigger(rerun_if_busy=False)
+            except Exception as e:
+                print("[SYNC ERROR]", e)
+
+            if self._rerun:
+                self._rerun = False
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        self._stopped = True
+        self.wake()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ---------------- reporting ----------------
+
+    def queue_depth(self) -> int:
+        depth = int(self._rerun)
+        if self.queue_depth_fn is not None:
+            depth += self.queue_depth_fn()
+        return depth
+
+    def status(self) -> dict:
+        status = dict(self._status)
+        status["interval_seconds"] = self.interval
+        status["queue_depth"] = self.queue_depth()
+        return status
+
+    def metrics(self) -> dict:
+        status = self.status()
+        return {
+            "running": status["running"],
+            "runs_total": status["runs_total"],
+            "errors_total": status["errors_total"],
+            "coalesced_triggers_total": status["coalesced_triggers_total"],
+            "last_duration_seconds": status["last_duration_seconds"] or 0.0,
+            "last_rows_processed": status["last_rows_processed"],
+            "rows_processed_total": status["rows_processed_total"],
+            "interval_seconds": status["interval_seconds"],
+            "queue_depth": status["queue_depth"],
+        }
+
+
+def scheduler_from_env(run_fn, queue_depth_fn=None) -> SyncScheduler:
+    return SyncScheduler(
+        run_fn,
+        queue_depth_fn=queue_depth_fn,
+        base_interval=float(os.getenv("SYNC_INTERVAL", "60")),
+        min_interval=float(os.getenv("SYNC_MIN_INTERVAL", "5")),
+        max_interval=float(os.getenv("SYNC_MAX_INTERVAL", "300")),
+        backoff=float(os.getenv("SYNC_BACKOFF", "2")),
+        backlog_rows=int(os.getenv("SYNC_BACKLOG_ROWS", os.getenv("SYNC_BATCH_SIZE", "256"))),
+    )
@@ -1,141 +1,268 @@
-import json
 import os
-from datetime import datetime
-from sync.pg_extract import (
-    get_connection,
-    fetch_employees,
-    fetch_employee_skills,
-    build_employee_document,
-    extract_all_employee_documents
-)
-from sentence_transformers import SentenceTransformer
+from datetime import datetime, timedelta, timezone
+from sync.pg_extract import fetch_employee_documents
 from chromadb import PersistentClient
 from sync.db import get_db_connection
-from sync.vector_ingest import ingest_documents
-
-
-SYNC_FILE = "sync_state.json"
-
-
-def load_last_sync_time():
-    if not os.path.exists(SYNC_FILE):
-        return None
-    with open(SYNC_FILE, "r") as f:
-        data = json.load(f)
-        return data.get("last_sync_time")
-
-def save_last_sync_time(timestamp: str):
-    with open(SYNC_FILE, "w") as f:
-        json.dump({"last_sync_time": timestamp}, f, indent=4)
-
-def get_updated_employee_ids(conn, last_sync):
-    updated_ids = set()
-
-    # 1. Employee table updated
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT employee_id FROM employees
+from sync.vector_ingest import (
+    ingest_all_employees,
+    chunked,
+    embed_documents,
+    insert_into_chroma,
+    stored_metadatas,
+    checkpoint_watermarks,
+)
+from sync.embedding_service import get_embedding_service
+from sync.embedding_cache import get_embedding_cache
+from sync.sync_state import get_state_store
+from sync.parallel_ingest import PARALLEL_INGEST_WORKERS, parallel_ingest
+from database.chroma_store import CHROMA_PATH, mark_collection_updated, resolve_collection_name
+from database.watermarks import fetch_table_watermarks, watermarked_tables
+from database.hybrid_search import clear_stale_fields
+
+
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "256"))
+# Re-scan this many seconds below the watermark to catch rows from transactions that
+# committed after a later updated_at was seen; with a strict `>` they would be skipped for
+# good. Re-processing is cheap (content hashes). Keep it above the longest write transaction.
+SYNC_WATERMARK_OVERLAP = float(os.getenv("SYNC_WATERMARK_OVERLAP", "300"))
+
+
+def _since(watermark):
+    if watermark is None:
+        return "-infinity"
+    if SYNC_WATERMARK_OVERLAP:
+        # A naive watermark (timestamp without time zone) stays naive, so Postgres compares
+        # it to the column as-is rather than through the session TimeZone
+        return _parse_ts(watermark) - timedelta(seconds=SYNC_WATERMARK_OVERLAP)
+    return watermark
+
+def _parse_ts(value):
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return value
+
+def _order_key(value):
+    # Only for picking the later of two values; legacy state stored naive UTC
+    value = _parse_ts(value)
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+def _max(current, candidate):
+    if candidate is None:
+        return current
+    if current is None:
+        return candidate
+    return candidate if _order_key(candidate) > _order_key(current) else current
+
+# table -> (employee_id, updated_at) for rows changed since %s. Lookup tables fan out to
+# every employee referencing the changed row.
+CHANGED_EMPLOYEES_SQL = {
+    "employees": """
+        SELECT employee_id, updated_at FROM employees
         WHERE updated_at > %s
-    """, (last_sync,))
-    updated_ids.update([row[0] for row in cur.fetchall()])
-
-    # 2. Employee-skills updated
-    cur.execute("""
-        SELECT DISTINCT employee_id FROM employee_skills
+    """,
+    "employee_skills": """
+        SELECT employee_id, MAX(updated_at) FROM employee_skills
         WHERE updated_at > %s
-    """, (last_sync,))
-    updated_ids.update([row[0] for row in cur.fetchall()])
-
-    # 3. Skills updated → update ALL employees having that skill
-    cur.execute("""
-        SELECT DISTINCT es.employee_id
+        GROUP BY employee_id
+    """,
+    "skills": """
+        SELECT es.employee_id, s.updated_at
         FROM skills s
-        JOIN employee_skills es ON es.skill_id = s.skill_id
+        LEFT JOIN employee_skills es ON es.skill_id = s.skill_id
         WHERE s.updated_at > %s
-    """, (last_sync,))
-    updated_ids.update([row[0] for row in cur.fetchall()])
-
-    return list(updated_ids)
-
-def sync_vector_db(chroma_path=r"C:\Users\H A R I H A R A N\Desktop\My works\Nectar\Project\vector_db"):
+    """,
+    "roles": """
+        SELECT e.employee_id, r.updated_at
+        FROM roles r
+        LEFT JOIN employees e ON e.role_id = r.role_id
+        WHERE r.updated_at > %s
+    """,
+    "departments": """
+        SELECT e.employee_id, d.updated_at
+        FROM departments d
+        LEFT JOIN employees e ON e.department_id = d.department_id
+        WHERE d.updated_at > %s
+    """,
+    "projects": """
+        SELECT ep.employee_id, p.updated_at
+        FROM projects p
+        LEFT JOIN employee_projects ep ON ep.project_id = p.project_id
+        WHERE p.updated_at > %s
+    """,
+    "employee_projects": """
+        SELECT employee_id, MAX(updated_at) FROM employee_projects
+        WHERE updated_at > %s
+        GROUP BY employee_id
+    """,
+}
+
+def get_updated_employee_ids(conn, watermarks):
+    """
+    Employees touched since the per-table watermarks, plus the new watermarks: the max
+    updated_at actually seen in each table (never the wall clock). Tables without an
+    updated_at column are skipped; change capture covers them.
+    """
+    updated_ids = set()
+    observed = dict(watermarks)
+
+    with conn.cursor() as cur:
+        for table in watermarked_tables(conn):
+            cur.execute(CHANGED_EMPLOYEES_SQL[table], (_since(watermarks.get(table)),))
+            for emp_id, updated_at in cur.fetchall():
+                if emp_id is not None:
+                    updated_ids.add(emp_id)
+                observed[table] = _max(observed.get(table), updated_at)
+
+    return list(updated_ids), observed
+
+def split_unchanged(collection, docs):
+    """
+    Partition docs into (changed, unchanged, stored metadata by id) by comparing against the
+    stored content hash.
+    """
+    stored = stored_metadatas(collection, [d["id"] for d in docs])
+    changed, unchanged = [], []
+    for d in docs:
+        if stored.get(d["id"], {}).get("content_hash") == d["metadata"]["content_hash"]:
+            unchanged.append(d)
+        else:
+            changed.append(d)
+    return changed, unchanged, stored
+
+def sync_employee_ids(conn, collection, embedder, employee_ids, batch_size: int = SYNC_BATCH_SIZE) -> int:
+    """
+    Re-embed a set of employees in batches: one = ANY(...) fetch, one encode and one upsert
+    per batch. Upsert on the stable "employee:{id}" id replaces the old vector in place.
+    Rows whose embedded text did not change (e.g. salary edits) only get a metadata update.
+    """
+    cache = get_embedding_cache()
+    processed = 0
+    reembedded = 0
+    for batch in chunked(sorted(employee_ids), batch_size):
+        docs = fetch_employee_documents(conn, batch)
+        if docs:
+            changed, unchanged, stored = split_unchanged(collection, docs)
+            if unchanged:
+                # update() merges too: clear skill flags/fields the row no longer has
+                collection.update(
+                    ids=[d["id"] for d in unchanged],
+                    metadatas=[clear_stale_fields(d["metadata"], stored.get(d["id"])) for d in unchanged],
+                )
+            if changed:
+                ids, contents, metadatas, embeddings = embed_documents(embedder, changed, cache)
+                insert_into_chroma(collection, ids, contents, metadatas, embeddings, stored=stored)
+                reembedded += len(changed)
+        processed += len(docs)
+        print(f"Updated {processed}/{len(employee_ids)} employees ({reembedded} re-embedded)")
+    return processed
+
+# CDC key table -> employees referencing one of the keys
+EMPLOYEES_BY_KEY_SQL = {
+    "skills": "SELECT DISTINCT employee_id FROM employee_skills WHERE skill_id = ANY(%s)",
+    "roles": "SELECT employee_id FROM employees WHERE role_id = ANY(%s)",
+    "departments": "SELECT employee_id FROM employees WHERE department_id = ANY(%s)",
+    "projects": "SELECT DISTINCT employee_id FROM employee_projects WHERE project_id = ANY(%s)",
+}
+
+def employees_for_keys(conn, related_keys):
+    """Employees whose documents embed one of the changed skills, roles, departments or projects."""
+    ids = set()
+    with conn.cursor() as cur:
+        for table, keys in (related_keys or {}).items():
+            if keys:
+                cur.execute(EMPLOYEES_BY_KEY_SQL[table], (list(keys),))
+                ids.update(row[0] for row in cur.fetchall())
+    return ids
+
+def sync_changed_keys(employee_ids, related_keys, chroma_path=CHROMA_PATH, embedder=None):
+    """
+    Apply keys pushed by change capture (LISTEN/NOTIFY): employee ids plus {table: keys}
+    for the lookup tables. Does not move the polling watermark; the next polling pass
+    re-checks these rows cheaply via content hashes.
+    """
+    if embedder is None:
+        embedder = get_embedding_service()
+
+    with get_db_connection() as conn:
+        ids = set(employee_ids) | employees_for_keys(conn, related_keys)
+        if not ids:
+            return {"status": "NO_UPDATES", "rows_processed": 0}
+
+        print(f"[CDC] Employees requiring update: {len(ids)}")
+        client = PersistentClient(path=chroma_path)
+        collection = client.get_collection(resolve_collection_name(chroma_path))
+        processed = sync_employee_ids(conn, collection, embedder, ids)
+
+        # Keys that no longer resolve to a row were deleted upstream
+        if processed < len(ids):
+            with conn.cursor() as cur:
+                cur.execute("SELECT employee_id FROM employees WHERE employee_id = ANY(%s)", (list(ids),))
+                existing = {row[0] for row in cur.fetchall()}
+            gone = sorted(ids - existing)
+            if gone:
+                collection.delete(ids=[f"employee:{i}" for i in gone])
+                print(f"[CDC] Removed {len(gone)} deleted employees from the index")
+
+    mark_collection_updated(chroma_path)
+    return {"status": "CHANGES_APPLIED", "rows_processed": processed}
+
+def sync_vector_db(chroma_path=CHROMA_PATH, embedder=None):
     print("\n=== Starting sync ===")
+    if embedder is None:
+        embedder = get_embedding_service()
 
-    # Load last sync time
-    last_sync_time = load_last_sync_time()
-    
-    if last_sync_time is None:
-        print("No previous sync detected — running FULL INGESTION...")
-
-        docs = extract_all_employee_documents()
-        ingest_documents(docs, persist_dir=chroma_path)
-
-        # Save sync timestamp
-        now = datetime.utcnow().isoformat() + "Z"
-        save_last_sync_time(now)
-
-        print("Full ingestion complete. Sync state initialized.")
-        return "FULL_REINGEST_DONE"
+    state_store = get_state_store()
+    watermarks = state_store.load()
 
+    if watermarks is None:
+        print("No previous sync detected — running FULL INGESTION...")
 
-    print(f"Last sync: {last_sync_time}")
-
-    conn = get_db_connection()
-
-    # Fetch updated employees
-    updated_ids = get_updated_employee_ids(conn, last_sync_time)
-
-    if not updated_ids:
-        print("No updates found. Vector DB is already up-to-date.")
-        return "NO_UPDATES"
-
-    print(f"Employees requiring update: {updated_ids}")
+        # Taken before extraction starts, so rows changed during the ingest are picked up next time.
+        # A resumed ingest keeps the first attempt's watermarks: rows below the resume point
+        # that changed while it was down must be replayed too.
+        start_watermarks = None if PARALLEL_INGEST_WORKERS > 1 else checkpoint_watermarks()
+        if start_watermarks is None:
+            with get_db_connection() as conn:
+                start_watermarks = fetch_table_watermarks(conn)
 
-    # Prepare embedding model
-    model = SentenceTransformer("all-MiniLM-L6-v2")
+        if PARALLEL_INGEST_WORKERS > 1:
+            written = parallel_ingest(persist_dir=chroma_path)["rows_processed"]
+        else:
+            written = ingest_all_employees(persist_dir=chroma_path, embedder=embedder,
+                                           start_watermarks=start_watermarks)
+        mark_collection_updated(chroma_path)
 
-    # Connect to Chroma
-    client = PersistentClient(path=chroma_path)
-    collection = client.get_collection("employee_collection")
+        state_store.save(start_watermarks)
 
-    # Process employees
-    for emp_id in updated_ids:
-        print(f"Updating employee {emp_id}")
+        print("Full ingestion complete. Sync state initialized.")
+        return {"status": "FULL_REINGEST_DONE", "rows_processed": written}
 
-        # Fetch employee row
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM employees WHERE employee_id = %s", (emp_id,))
-        emp_row = cur.fetchone()
-        if not emp_row:
-            continue
 
-        columns = [desc[0] for desc in cur.description]
-        emp = dict(zip(columns, emp_row))
+    print(f"Watermarks: {watermarks}")
 
-        # Fetch skills for that employee
-        skills = fetch_employee_skills(conn, emp_id)
+    with get_db_connection() as conn:
+        # Fetch updated employees
+        updated_ids, observed = get_updated_employee_ids(conn, watermarks)
 
-        # Rebuild document
-        doc = build_employee_document(emp, skills)
+        if not updated_ids:
+            if observed != watermarks:
+                state_store.save(observed)
+            print("No updates found. Vector DB is already up-to-date.")
+            return {"status": "NO_UPDATES", "rows_processed": 0}
 
-        # Delete old vector
-        collection.delete(where={"row_id": emp_id})
+        print(f"Employees requiring update: {len(updated_ids)}")
 
-        # Re-embed
-        emb = model.encode([doc["content"]]).tolist()
+        # Connect to Chroma
+        client = PersistentClient(path=chroma_path)
+        collection = client.get_collection(resolve_collection_name(chroma_path))
 
-        # Reinsert
-        collection.upsert(
-            ids=[doc["id"]],
-            embeddings=emb,
-            metadatas=[doc["metadata"]],
-            documents=[doc["content"]],
-        )
+        processed = sync_employee_ids(conn, collection, embedder, updated_ids)
 
-        print(f"Employee {emp_id} updated.")
+    # Tell readers (main server) to reopen their Chroma handle
+    mark_collection_updated(chroma_path)
 
-    # Save new sync time
-    now = datetime.utcnow().isoformat() + "Z"
-    save_last_sync_time(now)
+    # Advance only after everything up to these watermarks is in Chroma
+    state_store.save(observed)
 
     print("Sync complete.")
-    return "SYNC_COMPLETE"
+    return {"status": "SYNC_COMPLETE", "rows_processed": processed}
@@ -0,0 +1,127 @@
+# sync_state.py
+# Per-table sync watermarks: the max updated_at the sync has actually processed.
+#
+# Two backends:
+#   file      sync_state.json, written via temp file + fsync + rename (never half-written)
+#   postgres  a vector_sync_state table, so several sync replicas share one watermark
+import json
+import os
+from datetime import date, datetime
+from typing import Dict, Optional
+
+from database.pool import connection
+from database.watermarks import TRACKED_TABLES
+
+SYNC_FILE = os.getenv("SYNC_STATE_FILE", "sync_state.json")
+SYNC_STATE_BACKEND = os.getenv("SYNC_STATE_BACKEND", "file")
+SYNC_STATE_NAME = os.getenv("SYNC_STATE_NAME", "employee_collection")
+
+
+def _to_text(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+class FileStateStore:
+    def __init__(self, path: str = SYNC_FILE):
+        self.path = path
+
+    def load(self) -> Optional[Dict[str, Optional[str]]]:
+        """Watermarks by table, or None if no full ingest has completed yet."""
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError as e:
+            # Only possible for files written by the old non-atomic writer
+            raise RuntimeError(f"Corrupt sync state in {self.path}: {e}")
+
+        if "watermarks" in data:
+            return data["watermarks"]
+        if data.get("last_sync_time"):
+            # Legacy single wall-clock timestamp: use it for every table
+            legacy = data["last_sync_time"].rstrip("Z")
+            return {table: legacy for table in TRACKED_TABLES}
+        return None
+
+    def save(self, watermarks: Dict[str, object], rewind: bool = False):
+        payload = {
+            "watermarks": {t: _to_text(v) for t, v in watermarks.items()},
+            "saved_at": datetime.utcnow().isoformat() + "Z",
+        }
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(payload, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class PostgresStateStore:
+    def __init__(self, name: str = SYNC_STATE_NAME):
+        self.name = name
+        self._ensured = False
+
+    def _ensure_table(self, conn):
+        if self._ensured:
+            return
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS vector_sync_state (
+                    name TEXT NOT NULL,
+                    table_name TEXT NOT NULL,
+                    watermark TEXT,
+                    saved_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    PRIMARY KEY (name, table_name)
+                )
+            """)
+        conn.commit()
+        self._ensured = True
+
+    def load(self) -> Optional[Dict[str, Optional[str]]]:
+        with connection(readonly=False) as conn:
+            self._ensure_table(conn)
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT table_name, watermark FROM vector_sync_state WHERE name = %s",
+                    (self.name,),
+                )
+                rows = cur.fetchall()
+        return {table: watermark for table, watermark in rows} or None
+
+    def save(self, watermarks: Dict[str, object], rewind: bool = False):
+        # One transaction; a replica never moves a watermark backwards unless asked to
+        # (a rebuild rewinds to its start point so changes made during the build get replayed)
+        with connection(readonly=False) as conn:
+            self._ensure_table(conn)
+            with conn.cursor() as cur:
+                if rewind:
+                    cur.execute("DELETE FROM vector_sync_state WHERE name = %s", (self.name,))
+                for table, value in watermarks.items():
+                    cur.execute("""
+                        INSERT INTO vector_sync_state (name, table_name, watermark, saved_at)
+                        VALUES (%s, %s, %s, now())
+                        ON CONFLICT (name, table_name) DO UPDATE SET
+                            watermark = CASE
+                                WHEN vector_sync_state.watermark IS NULL THEN EXCLUDED.watermark
+                                WHEN EXCLUDED.watermark IS NULL THEN vector_sync_state.watermark
+                                -- Compare as timestamps but keep the stored text, so a
+                                -- naive watermark isn't rewritten with the session's offset
+                                WHEN EXCLUDED.watermark::timestamptz
+                                     > vector_sync_state.watermark::timestamptz
+                                    THEN EXCLUDED.watermark
+                                ELSE vector_sync_state.watermark
+                            END,
+                            saved_at = now()
+                    """, (self.name, table, _to_text(value)))
+            conn.commit()
+
+
+def get_state_store():
+    if SYNC_STATE_BACKEND == "postgres":
+        return PostgresStateStore()
+    return FileStateStore()
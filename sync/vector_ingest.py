@@ -1,29 +1,64 @@
+import json
+import os
+import queue
+import threading
+import time
 import chromadb
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
-from sync.pg_extract import extract_all_employee_documents
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+from sync.pg_extract import iter_employee_documents
+from database.chroma_store import CHROMA_PATH, COLLECTION_NAME, resolve_collection_name
+from llm.embeddings import EMBEDDING_MODEL_NAME
+from sync.embedding_service import get_embedding_service
+from database.hybrid_search import clear_stale_fields
+from sync.embedding_cache import encode_with_cache, get_embedding_cache
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "512"))
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "4"))
+CHECKPOINT_FILE = "ingest_checkpoint.json"
+
+_DONE = object()
 
 class VectorDB:
-    def __init__(self, persist_dir=r"C:\Users\H A R I H A R A N\Desktop\My works\Nectar\Project\vector_db"):
+    def __init__(self, persist_dir=CHROMA_PATH):
         self.client = chromadb.PersistentClient(path=persist_dir)
         self.collection = None
 
-    def get_or_create_collection(self, name="employee_collection"):
+    def get_or_create_collection(self, name=COLLECTION_NAME):
         self.collection = self.client.get_or_create_collection(
             name=name,
-            metadata={"hnsw:space": "cosine"}  # cosine similarity for MiniLM
+            # cosine similarity for MiniLM; the model name lets the query side check it matches
+            metadata={"hnsw:space": "cosine", "embedding_model": EMBEDDING_MODEL_NAME}
         )
 
-def embed_documents(model, docs: List[Dict[str, Any]]):
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+def embed_documents(model, docs: List[Dict[str, Any]], cache=None):
     contents = [d["content"] for d in docs]
     ids = [d["id"] for d in docs]
     metadatas = [d["metadata"] for d in docs]
+    hashes = [m["content_hash"] for m in metadatas]
 
-    embeddings = model.encode(contents).tolist()
+    # Chroma accepts the numpy array directly; no per-float Python list conversion
+    embeddings = encode_with_cache(model, contents, hashes, cache)
     return ids, contents, metadatas, embeddings
 
-def insert_into_chroma(collection, ids, contents, metadatas, embeddings):
+def stored_metadatas(collection, ids) -> Dict[str, dict]:
+    stored = collection.get(ids=list(ids), include=["metadatas"])
+    return {i: m or {} for i, m in zip(stored.get("ids", []), stored.get("metadatas") or [])}
+
+def insert_into_chroma(collection, ids, contents, metadatas, embeddings, stored=None):
+    """Upsert; fields and skill flags the previous version had are written as cleared values."""
+    if stored is None:
+        stored = stored_metadatas(collection, ids)
+    metadatas = [clear_stale_fields(m, stored.get(i)) for i, m in zip(ids, metadatas)]
     collection.upsert(
         ids=ids,
         embeddings=embeddings,
@@ -31,29 +66,174 @@ def insert_into_chroma(collection, ids, contents, metadatas, embeddings):
         metadatas=metadatas,
     )
 
-def ingest_documents(docs: List[Dict[str, Any]], persist_dir=r"C:\Users\H A R I H A R A N\Desktop\My works\Nectar\Project\vector_db"):
-    # Load embedding model only once
-    model = SentenceTransformer("all-MiniLM-L6-v2")
+# ---------------- checkpointing ----------------
+
+def load_checkpoint(path: str = CHECKPOINT_FILE) -> Optional[dict]:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def save_checkpoint(state: dict, path: str = CHECKPOINT_FILE):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=4, default=str)
+    os.replace(tmp, path)
+
+def clear_checkpoint(path: str = CHECKPOINT_FILE):
+    if os.path.exists(path):
+        os.remove(path)
+
+# ---------------- pipeline ----------------
+
+def _put(q: queue.Queue, item, stop: threading.Event):
+    # Bounded put that gives up once the pipeline is being torn down
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _drain(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        yield item
+
+def _stage(fn, source, outbox, stop, errors):
+    items = _drain(source, stop) if isinstance(source, queue.Queue) else source
+    try:
+        for item in items:
+            if stop.is_set() or not _put(outbox, fn(item), stop):
+                return
+        _put(outbox, _DONE, stop)
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+
+def ingest_documents(
+    docs: Iterable[Dict[str, Any]],
+    persist_dir=CHROMA_PATH,
+    embedder=None,
+    chunk_size: int = INGEST_CHUNK_SIZE,
+    on_chunk=None,
+    collection_name: Optional[str] = None,
+):
+    """
+    Streaming extract -> embed -> upsert. Extraction and embedding run in their own threads and
+    hand chunks over bounded queues, so at most INGEST_QUEUE_DEPTH chunks are held in memory
+    per stage and Chroma writes start as soon as the first chunk is embedded.
+    on_chunk(ids, metadatas) is called after each chunk has been written.
+    """
+    # Reuse the resident model instead of loading a new one per ingest
+    model = embedder or get_embedding_service()
+    # Vectors for unchanged content are reused from the local cache
+    cache = get_embedding_cache()
 
     # Build vector DB
     print("Connecting to ChromaDB...")
     db = VectorDB(persist_dir=persist_dir)
-    db.get_or_create_collection("employee_collection")
+    # Default: whatever collection the alias currently points at
+    db.get_or_create_collection(collection_name or resolve_collection_name(persist_dir))
+
+    stop = threading.Event()
+    errors = []
+    extracted = queue.Queue(maxsize=INGEST_QUEUE_DEPTH)
+    embedded = queue.Queue(maxsize=INGEST_QUEUE_DEPTH)
+
+    workers = [
+        threading.Thread(target=_stage, args=(lambda c: c, chunked(docs, chunk_size), extracted, stop, errors),
+                         name="ingest-extract", daemon=True),
+        threading.Thread(target=_stage, args=(lambda c: embed_documents(model, c, cache), extracted, embedded, stop, errors),
+                         name="ingest-embed", daemon=True),
+    ]
+    for w in workers:
+        w.start()
+
+    print("Embedding and inserting documents...")
+    written = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            try:
+                item = embedded.get(timeout=0.5)
+            except queue.Empty:
+                if stop.is_set():
+                    break
+                continue
+            if item is _DONE:
+                break
+            ids, contents, metadatas, embeddings = item
+            insert_into_chroma(db.collection, ids, contents, metadatas, embeddings)
+            written += len(ids)
+            if on_chunk is not None:
+                on_chunk(ids, metadatas)
 
-    # Prepare data
-    print("Embedding documents...")
-    ids, contents, metadatas, embeddings = embed_documents(model, docs)
+            elapsed = time.perf_counter() - start
+            print(f"[INGEST] {written} documents written ({written / elapsed:.1f} docs/sec)")
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        stop.set()
+        for w in workers:
+            w.join(timeout=5)
+        if hasattr(docs, "close") and not workers[0].is_alive():
+            # Returns the extraction connection to the pool if we stopped early
+            docs.close()
 
-    # Insert
-    print("Inserting into ChromaDB...")
-    insert_into_chroma(db.collection, ids, contents, metadatas, embeddings)
+    if errors:
+        raise errors[0]
 
     count = db.collection.count()
-    print(f"Successfully ingested {len(ids)} documents into Chroma database.")
+    print(f"Successfully ingested {written} documents into Chroma database.")
     print(f"Total documents in collection: {count}")
     print(f"Database persisted at: {persist_dir}")
+    return written
+
+def checkpoint_watermarks(checkpoint_path: str = CHECKPOINT_FILE) -> Optional[dict]:
+    """Table watermarks taken when the interrupted ingest first started, if one is pending."""
+    state = load_checkpoint(checkpoint_path)
+    return state.get("start_watermarks") if state else None
+
+def ingest_all_employees(persist_dir=CHROMA_PATH, embedder=None, resume: bool = True,
+                         checkpoint_path: str = CHECKPOINT_FILE, collection_name: Optional[str] = None,
+                         start_watermarks: Optional[dict] = None):
+    """
+    Full re-ingest of the employees table. Progress is checkpointed after every written chunk
+    (rows stream in employee_id order), so a restarted process continues from the last chunk.
+    start_watermarks are kept in the checkpoint: rows below the resume point that changed
+    while the ingest was down are only caught if the sync restarts from the first attempt's
+    watermarks (checkpoint_watermarks), not from fresh ones.
+    """
+    state = load_checkpoint(checkpoint_path) if resume else None
+    after_id = state.get("last_row_id") if state else None
+    written_before = state.get("written", 0) if state else 0
+    if after_id is not None:
+        print(f"[INGEST] Resuming after employee_id {after_id} ({written_before} already written)")
+    if state and state.get("start_watermarks") is not None:
+        start_watermarks = state["start_watermarks"]
+
+    progress = {"last_row_id": after_id, "written": written_before, "started_at": time.time(),
+                "start_watermarks": start_watermarks}
+
+    def on_chunk(ids, metadatas):
+        progress["last_row_id"] = max(m["row_id"] for m in metadatas)
+        progress["written"] += len(ids)
+        save_checkpoint(progress, checkpoint_path)
+
+    docs = iter_employee_documents(after_id=after_id)
+    ingest_documents(docs, persist_dir=persist_dir, embedder=embedder, on_chunk=on_chunk,
+                     collection_name=collection_name)
+    clear_checkpoint(checkpoint_path)
+    return progress["written"]
 
 if __name__ == "__main__":
-    docs = extract_all_employee_documents()
-    print(docs)
-    ingest_documents(docs)
+    ingest_all_employees()
@@ -1,28 +1,92 @@
 # uvicorn sync_server:app --host 0.0.0.0 --port 9001
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 import asyncio
-from sync.sync import sync_vector_db
+import os
+from sync.sync import sync_vector_db, sync_changed_keys
+from sync.rebuild import rebuild_collection
+from sync.embedding_service import get_embedding_service
+from sync.scheduler import scheduler_from_env
+from sync.change_capture import install_triggers, listener_from_env, make_sync_runner
+from database.pool import close_pool, pool_metrics
+from database.metrics import render_metrics
 
 app = FastAPI(title="Vector Sync Service")
 
+def _enabled(name, default="false"):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+# Optional LISTEN/NOTIFY change capture; polling becomes a periodic reconcile pass
+CDC_ENABLED = _enabled("SYNC_CDC_ENABLED")
+RECONCILE_INTERVAL = float(os.getenv("SYNC_RECONCILE_INTERVAL", "600"))
+
+_loop = None
+
+def _on_changes_ready():
+    # Called from the listener thread
+    if _loop is not None:
+        _loop.call_soon_threadsafe(scheduler.request_run)
+
+listener = listener_from_env(_on_changes_ready) if CDC_ENABLED else None
+
+# Syncs run in a worker thread, one at a time; overlapping triggers join the running sync
+scheduler = scheduler_from_env(
+    make_sync_runner(listener, sync_vector_db, sync_changed_keys, RECONCILE_INTERVAL),
+    queue_depth_fn=listener.pending if listener else None,
+)
+
 async def sync_loop():
-    while True:
-        print("[SYNC SERVICE] Running background sync...")
-        try:
-            sync_vector_db()
-        except Exception as e:
-            print("[SYNC ERROR]", e)
-        await asyncio.sleep(1 * 60) 
+    await scheduler.run_forever()
 
 @app.on_event("startup")
 async def start_background_sync():
+    # Load the model once for the lifetime of the service
+    embedder = await asyncio.to_thread(get_embedding_service)
+    if os.getenv("EMBEDDING_BENCHMARK_ON_STARTUP", "true").lower() in ("1", "true", "yes"):
+        await asyncio.to_thread(embedder.benchmark, int(os.getenv("EMBEDDING_BENCHMARK_DOCS", "256")))
+
+    global _loop
+    _loop = asyncio.get_running_loop()
+    if listener is not None:
+        if _enabled("SYNC_CDC_INSTALL_TRIGGERS", "true"):
+            await asyncio.to_thread(install_triggers)
+        listener.start()
+
     asyncio.create_task(sync_loop())
 
+@app.on_event("shutdown")
+def shutdown():
+    if listener is not None:
+        listener.stop()
+    scheduler.stop()
+    close_pool()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return (
+        render_metrics("sync_db_pool", pool_metrics())
+        + render_metrics("sync_scheduler", scheduler.metrics())
+        + (render_metrics("sync_cdc", listener.metrics()) if listener else "")
+    )
+
+@app.get("/sync/status")
+def sync_status():
+    return scheduler.status()
+
 @app.get("/sync/manual")
-def manual_sync():
+async def manual_sync():
+    try:
+        result = await scheduler.trigger()
+        return {"status": "ok", "result": result}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+
+@app.post("/sync/rebuild")
+async def rebuild(force: bool = False):
+    # Blue/green: the live collection keeps serving queries until the validated swap
     try:
-        result = sync_vector_db()
+        result = await scheduler.run_exclusive(lambda: rebuild_collection(force=force))
         return {"status": "ok", "result": result}
     except Exception as e:
-        return {"status": "error", "error": str(e)}
\ No newline at end of file
+        return {"status": "error", "error": str(e)}